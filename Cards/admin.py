@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Hero, Monster, Skill
+from .models import CardStats, Hero, Monster, Skill
 
 
 class HeroAdmin(admin.ModelAdmin):
@@ -7,4 +7,28 @@ class HeroAdmin(admin.ModelAdmin):
 
 admin.site.register(Hero, HeroAdmin)
 admin.site.register(Monster)
-admin.site.register(Skill)
\ No newline at end of file
+admin.site.register(Skill)
+
+
+@admin.register(CardStats)
+class CardStatsAdmin(admin.ModelAdmin):
+    list_display = ('card_type', 'card_id', 'battles', 'wins', 'win_rate', 'avg_damage', 'avg_survival_rounds')
+    list_filter = ('card_type',)
+    search_fields = ('card_id',)
+    readonly_fields = ('card_type', 'card_id', 'battles', 'wins', 'damage_dealt', 'rounds_survived')
+
+    @admin.display(description='win rate')
+    def win_rate(self, obj):
+        return f'{obj.win_rate:.1%}'
+
+    @admin.display(description='avg damage')
+    def avg_damage(self, obj):
+        return round(obj.avg_damage, 1)
+
+    @admin.display(description='avg survival rounds')
+    def avg_survival_rounds(self, obj):
+        return round(obj.avg_survival_rounds, 1)
+
+    def has_add_permission(self, request):
+        # Строки пишет только архив боёв и rebuild_card_stats
+        return False
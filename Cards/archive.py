@@ -0,0 +1,185 @@
+# Cards/archive.py
+"""Архив завершенных боёв: модели Battle и BattleParticipant.
+
+Запрос только кладет бой в очередь (put не ждет базу), а фоновый поток раз в FLUSH_INTERVAL секунд
+или по набору BATCH_SIZE боёв пишет всю пачку двумя bulk_create в одной транзакции, вместе
+с приращениями статистики карт (Cards/stats.py). Настройка:
+
+    BATTLE_ARCHIVE = {
+        'BATCH_SIZE': 500,
+        'FLUSH_INTERVAL': 1.0,  # None - без фонового потока, пишет только flush()
+        'RETRIES': 3,           # повторы записи пачки при ошибке базы
+        'RETRY_DELAY': 0.5,     # пауза перед первым повтором, секунды; дальше удваивается
+    }
+
+Повторная запись того же боя игнорируется (ключ боя - его id из хранилища боёв). Пачка, которую
+не удалось записать и после повторов, возвращается в очередь (errors - число таких неудач), так что
+бои не теряются, пока жив процесс.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import stats
+from .battle_state import BattleState, CardType
+from .models import Battle, BattleParticipant
+
+logger = logging.getLogger(__name__)
+
+Item = Tuple[str, BattleState, object]
+
+
+def winner(battle_state: BattleState) -> CardType:
+    return CardType.HERO if any(hero.health > 0 for hero in battle_state.heroes) else CardType.MONSTER
+
+
+def build_rows(items: List[Item]) -> Tuple[List[Battle], List[BattleParticipant]]:
+    battles, participants = [], []
+    for battle_id, battle_state, finished_at in items:
+        side = winner(battle_state)
+        battle = Battle(
+            id=battle_id,
+            finished_at=finished_at,
+            winner=side,
+            rounds=battle_state.round,
+            events=len(battle_state.log),
+            seed=battle_state.seed,
+            cards=[card.to_dict() for card in battle_state.heroes + battle_state.monsters],
+        )
+        battle.set_events(battle_state.log)
+        battles.append(battle)
+        participants.extend(
+            BattleParticipant(battle_id=battle.id, card_type=card.is_character_type, card_id=card.id,
+                              name=card.name, health=card.health, won=card.is_character_type == side,
+                              finished_at=finished_at)
+            for card in battle_state.participants
+        )
+    return battles, participants
+
+
+def write(items: List[Item]):
+    with transaction.atomic():
+        # Уже записанные бои (и повторы в пачке) пропускаем, чтобы не учесть их в статистике дважды
+        pending = {}
+        for item in items:
+            pending.setdefault(uuid.UUID(item[0]), item)
+        known = set(Battle.objects.filter(id__in=list(pending)).values_list('id', flat=True))
+        items = [item for battle_id, item in pending.items() if battle_id not in known]
+        battles, participants = build_rows(items)
+        Battle.objects.bulk_create(battles, ignore_conflicts=True)
+        BattleParticipant.objects.bulk_create(participants, ignore_conflicts=True)
+        deltas = {}
+        for battle_id, battle_state, _ in items:
+            cards = [(card.is_character_type, card.id, card.health) for card in battle_state.participants]
+            stats.merge(deltas, stats.battle_deltas(cards, battle_state.log, battle_state.round, winner(battle_state)))
+        stats.apply_deltas(deltas)
+
+
+class BattleArchive:
+    def __init__(self, batch_size: int = 500, flush_interval: Optional[float] = 1.0, retries: int = 3,
+                 retry_delay: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # Пачки, не записанные и после всех повторов (они вернулись в очередь)
+        self.errors = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, battle_id: str, battle_state: BattleState):
+        """Ставит завершенный бой в очередь на запись. battle_state после этого менять нельзя."""
+        self._queue.put((battle_id, battle_state, timezone.now()))
+        if self.flush_interval is not None and self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='battle-archive', daemon=True)
+                self._thread.start()
+                # Остаток очереди дописываем при остановке процесса
+                atexit.register(self.flush)
+
+    def _collect(self) -> List[Item]:
+        """Пачка для фонового потока: ждет первый бой, затем добирает до BATCH_SIZE, но не дольше FLUSH_INTERVAL."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self) -> List[Item]:
+        batch = []
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch: List[Item]) -> bool:
+        """Пишет пачку с повторами; при неудаче возвращает ее в очередь и отвечает False."""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                write(batch)
+                return True
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception('Не удалось записать в архив %d боёв, пачка возвращена в очередь', len(batch))
+                    break
+                logger.warning('Ошибка записи в архив %d боёв, повтор через %.1f с', len(batch), delay, exc_info=True)
+                time.sleep(delay)
+                delay *= 2
+                close_old_connections()
+        self.errors += 1
+        for item in batch:
+            self._queue.put(item)
+        return False
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            close_old_connections()
+            if not self._write(batch):
+                # База недоступна: не крутим очередь впустую
+                time.sleep(self.flush_interval)
+
+    def flush(self) -> bool:
+        """Синхронно пишет все, что сейчас в очереди. False - часть боёв записать не удалось, они остались в очереди."""
+        while batch := self._drain():
+            if not self._write(batch):
+                return False
+        return True
+
+
+@receiver(setting_changed)
+def reset_battle_archive(setting, **kwargs):
+    if setting == 'BATTLE_ARCHIVE':
+        get_battle_archive.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_battle_archive() -> BattleArchive:
+    config = getattr(settings, 'BATTLE_ARCHIVE', {})
+    return BattleArchive(batch_size=config.get('BATCH_SIZE', 500), flush_interval=config.get('FLUSH_INTERVAL', 1.0),
+                         retries=config.get('RETRIES', 3), retry_delay=config.get('RETRY_DELAY', 0.5))
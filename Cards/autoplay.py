@@ -0,0 +1,95 @@
+# Cards/autoplay.py
+"""Автоматическая игра за героев: бой доигрывается до конца в памяти (POST /battle/{id}/resolve/).
+
+Политика героя - функция (бой, герой, rng) -> (id цели, действие, индекс скила), как pick_hero_action
+в Cards/simulation.py. Политики регистрируются в HERO_POLICIES декоратором register_policy.
+Монстры ходят как обычно - с уровнем ИИ боя. Случайность политики выводится из зерна боя и длины
+журнала, поэтому доигрывание одного и того же боя дает один и тот же исход.
+"""
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .battle_state import BattleState, CardState, CardType
+from .monster_ai import best_option
+
+HeroMove = Tuple[int, str, Optional[int]]
+Policy = Callable[[BattleState, CardState, random.Random], HeroMove]
+
+HERO_POLICIES: Dict[str, Policy] = {}
+DEFAULT_POLICY = 'focus'
+# Предел ходов героев за одно доигрывание (бой без урона иначе не кончится)
+MAX_RESOLVE_TURNS = 10_000
+
+
+def register_policy(name: str):
+    def decorator(policy: Policy) -> Policy:
+        HERO_POLICIES[name] = policy
+        return policy
+    return decorator
+
+
+def _strongest(hero: CardState, target: CardState) -> HeroMove:
+    action, skill_index, _ = best_option(hero)
+    return target.id, action, skill_index
+
+
+@register_policy('random')
+def random_policy(battle_state: BattleState, hero: CardState, rng: random.Random) -> HeroMove:
+    """Случайный живой монстр и случайное действие (атака или один из скилов)."""
+    targets = battle_state.alive(CardType.MONSTER)
+    target = targets[rng.randrange(len(targets))]
+    choice = rng.randrange(1 + len(hero.skills))
+    if choice == 0:
+        return target.id, 'attack', None
+    return target.id, 'skill', choice - 1
+
+
+@register_policy('focus')
+def focus_policy(battle_state: BattleState, hero: CardState, rng: random.Random) -> HeroMove:
+    """Самое сильное действие по самому слабому живому монстру - добиваем по одному."""
+    return _strongest(hero, min(battle_state.alive(CardType.MONSTER), key=lambda card: card.health))
+
+
+@register_policy('threat')
+def threat_policy(battle_state: BattleState, hero: CardState, rng: random.Random) -> HeroMove:
+    """Самое сильное действие по монстру с самым сильным ударом."""
+    return _strongest(hero, max(battle_state.alive(CardType.MONSTER), key=lambda card: best_option(card)[2]))
+
+
+def resolve(battle_state: BattleState, policy: str = DEFAULT_POLICY, max_turns: int = MAX_RESOLVE_TURNS) -> Dict:
+    """Доигрывает бой политикой policy (не больше max_turns ходов героев). Возвращает сводку доигранной части."""
+    choose = HERO_POLICIES[policy]
+    rng = random.Random(f'{battle_state.seed}:{len(battle_state.log)}')
+    first_event, first_round = len(battle_state.log), battle_state.round
+    alive_before = {card.key for card in battle_state.participants if card.health > 0}
+    turns = 0
+    while turns < max_turns and not battle_state.is_battle_over():
+        hero = battle_state.get_active_participant()
+        target_id, action, skill_index = choose(battle_state, hero, rng)
+        error = battle_state.hero_turn(hero.id, target_id, action, skill_index)
+        if error:
+            raise ValueError(f'Политика {policy} выбрала недопустимый ход: {error}')
+        turns += 1
+    return summarize(battle_state, first_event, first_round, alive_before, turns)
+
+
+def summarize(battle_state: BattleState, first_event: int, first_round: int, alive_before, turns: int) -> Dict:
+    """Сводка событий с first_event: ходы и урон сторон, павшие карты и исход."""
+    damage = {CardType.HERO: 0, CardType.MONSTER: 0}
+    moves = {CardType.HERO: 0, CardType.MONSTER: 0}
+    for event in battle_state.log.events(first_event):
+        damage[event.actor_type] += event.damage
+        moves[event.actor_type] += 1
+    fallen: List[Dict] = [{'type': card.is_character_type, 'id': card.id}
+                          for card in battle_state.participants if card.key in alive_before and card.health <= 0]
+    over = battle_state.is_battle_over()
+    return {
+        'hero_turns': turns,
+        'events': len(battle_state.log) - first_event,
+        'moves': moves,
+        'damage': damage,
+        'rounds': [first_round, battle_state.round],
+        'fallen': fallen,
+        'over': over,
+        'winner': (CardType.HERO if battle_state.alive(CardType.HERO) else CardType.MONSTER) if over else None,
+    }
@@ -0,0 +1,130 @@
+# Cards/battle_events.py
+"""Журнал боя: типизированные события в компактном буфере только на добавление.
+
+Каждое событие - шесть int64 подряд в array('q'): раунд, тип ходящего, id ходящего, id цели,
+индекс скила (ATTACK для обычной атаки) и урон. Текст на русском собирается только при выводе
+(describe_event), сам журнал имён не хранит. В байтах (tobytes/frombytes) журнал всегда little-endian,
+независимо от машины.
+"""
+import json
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+ATTACK = -1
+EVENT_FIELDS = 6
+CHARACTER_TYPES = ('HERO', 'MONSTER')
+_TYPE_CODES = {character_type: code for code, character_type in enumerate(CHARACTER_TYPES)}
+EVENT_TYPECODE = 'q'
+_SWAP = sys.byteorder != 'little'
+
+
+class BattleEvent(NamedTuple):
+    round: int
+    actor_type: str
+    actor_id: int
+    target_id: int
+    skill: int
+    damage: int
+
+    @property
+    def target_type(self) -> str:
+        # Герои бьют монстров, монстры - героев
+        return 'MONSTER' if self.actor_type == 'HERO' else 'HERO'
+
+    def to_dict(self) -> Dict:
+        return {**self._asdict(), 'target_type': self.target_type}
+
+
+class BattleLog:
+    __slots__ = ('_data', 'persisted')
+
+    def __init__(self, data: Iterable[int] = ()):
+        self._data = array(EVENT_TYPECODE, data)
+        # Сколько событий уже записано в постоянное хранилище (см. Cards/battle_store.py)
+        self.persisted = 0
+
+    def append(self, event: BattleEvent):
+        self._data.extend((event.round, _TYPE_CODES[event.actor_type], event.actor_id, event.target_id,
+                           event.skill, event.damage))
+
+    def extend(self, events: Iterable[BattleEvent]):
+        codes = _TYPE_CODES
+        self._data.extend([value for event in events for value in (
+            event.round, codes[event.actor_type], event.actor_id, event.target_id, event.skill, event.damage)])
+
+    def __len__(self) -> int:
+        return len(self._data) // EVENT_FIELDS
+
+    def __bool__(self) -> bool:
+        return bool(self._data)
+
+    def _event(self, index: int) -> BattleEvent:
+        offset = index * EVENT_FIELDS
+        round_, actor_type, actor_id, target_id, skill, damage = self._data[offset:offset + EVENT_FIELDS]
+        return BattleEvent(round_, CHARACTER_TYPES[actor_type], actor_id, target_id, skill, damage)
+
+    def events(self, start: int = 0, stop: int = None) -> List[BattleEvent]:
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return [self._event(index) for index in range(start, stop)]
+
+    def __iter__(self) -> Iterator[BattleEvent]:
+        return iter(self.events())
+
+    def tail(self, count: int) -> List[BattleEvent]:
+        """Последние count событий."""
+        return self.events(max(len(self) - count, 0)) if count > 0 else []
+
+    def streak(self, actor_type: str) -> int:
+        """Сколько последних событий подряд - ходы стороны actor_type."""
+        code, data = _TYPE_CODES[actor_type], self._data
+        count = len(self)
+        while count and data[(count - 1) * EVENT_FIELDS + 1] == code:
+            count -= 1
+        return len(self) - count
+
+    def page(self, offset: int, limit: int) -> List[BattleEvent]:
+        return self.events(offset, offset + limit)
+
+    @property
+    def values(self) -> array:
+        """Сам буфер (по EVENT_FIELDS значений на событие), без копирования - только для чтения."""
+        return self._data
+
+    def to_list(self) -> List[int]:
+        return self._data.tolist()
+
+    def tobytes(self, start: int = 0) -> bytes:
+        data = self._data[start * EVENT_FIELDS:]
+        if _SWAP:
+            data.byteswap()
+        return data.tobytes()
+
+    @classmethod
+    def frombytes(cls, data: bytes) -> "BattleLog":
+        log = cls()
+        log._data.frombytes(data)
+        if _SWAP:
+            log._data.byteswap()
+        return log
+
+    def to_jsonl(self) -> str:
+        return ''.join(json.dumps(list(event), separators=(',', ':')) + '\n' for event in self)
+
+    @classmethod
+    def from_jsonl(cls, text: str) -> "BattleLog":
+        log = cls()
+        for line in text.splitlines():
+            if line:
+                log.append(BattleEvent(*json.loads(line)))
+        return log
+
+
+def describe_event(event: BattleEvent, cards: Dict[Tuple[str, int], object]) -> str:
+    """Текст события для журнала. cards - карты боя по ключу (тип, id)."""
+    actor = cards[event.actor_type, event.actor_id]
+    target = cards[event.target_type, event.target_id]
+    if event.skill == ATTACK:
+        return f"{actor.name} атаковал {target.name} и нанес {event.damage} урона."
+    skill = actor.skills[event.skill]
+    return f"{actor.name} использовал скил {skill.name} на {target.name} и нанес {event.damage} урона."
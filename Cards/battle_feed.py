@@ -0,0 +1,49 @@
+# Cards/battle_feed.py
+"""Оповещения об изменении боёв для потоков server-sent events (см. battle_events в Cards/views.py).
+
+Ход записывается в хранилище в рабочем потоке, а подписчики ждут в цикле событий ASGI, поэтому
+publish будит их через call_soon_threadsafe. Оповещения работают только внутри процесса: подписчик
+другого процесса увидит ход, когда сам перечитает бой по таймауту ожидания.
+"""
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, Set, Tuple
+
+Waiter = Tuple[asyncio.AbstractEventLoop, asyncio.Event]
+
+
+class BattleFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[Waiter]] = {}
+
+    def publish(self, battle_id: str):
+        """Будит всех подписчиков боя. Можно вызывать из любого потока."""
+        with self._lock:
+            waiters = list(self._waiters.get(battle_id, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл событий уже закрыт - подписчик отпишется сам
+                pass
+
+    @contextmanager
+    def subscribe(self, battle_id: str):
+        """Событие, которое выставляется при каждом изменении боя. Только внутри работающего цикла событий."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(battle_id, set()).add(waiter)
+        try:
+            yield waiter[1]
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(battle_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[battle_id]
+
+
+battle_feed = BattleFeed()
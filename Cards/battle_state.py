@@ -1,10 +1,25 @@
 # Cards/battle_state.py
 from dataclasses import dataclass, field
-from typing import List, Dict
+from enum import StrEnum
+from typing import Any, Callable, Iterable, List, Dict, NamedTuple, Optional, Tuple
 import random
 
+from .battle_events import ATTACK, BattleEvent, BattleLog, describe_event
+from .monster_ai import AI_LEVELS, DEFAULT_AI, MonsterPlanner
+from .scheduler import InitiativeScheduler
 
-@dataclass
+
+def new_seed() -> int:
+    return random.getrandbits(63)
+
+
+class CardType(StrEnum):
+    """Тип карты в бою. Члены перечисления - единственные экземпляры, и при этом равны строкам 'HERO'/'MONSTER'."""
+    HERO = 'HERO'
+    MONSTER = 'MONSTER'
+
+
+@dataclass(slots=True)
 class SkillState:
     name: str
     damage: int
@@ -13,8 +28,11 @@ class SkillState:
     def from_dict(cls, data) -> "SkillState":
         return cls(**data)
 
+    def to_dict(self) -> Dict:
+        return {'name': self.name, 'damage': self.damage}
+
 
-@dataclass
+@dataclass(slots=True)
 class CardState:
     id: int
     name: str
@@ -22,9 +40,17 @@ class CardState:
     attack: int
     initiative: int
     active: bool
-    is_character_type: str
+    is_character_type: CardType
     skills: List[SkillState] = field(default_factory=list)
 
+    def __post_init__(self):
+        self.is_character_type = CardType(self.is_character_type)
+
+    @property
+    def key(self) -> Tuple[CardType, int]:
+        # id героев и монстров берутся из разных таблиц и могут совпадать
+        return self.is_character_type, self.id
+
     @classmethod
     def from_dict(cls, data) -> "CardState":
         skills_data = data.get('skills', [])
@@ -36,7 +62,7 @@ class CardState:
             attack=data.get('attack'),
             initiative=data.get('initiative'),
             active=data.get('active'),
-            is_character_type=data.get('is_character_type', 'HERO'),
+            is_character_type=data.get('is_character_type', CardType.HERO),
             skills=skills
         )
 
@@ -49,14 +75,148 @@ class CardState:
             'initiative': self.initiative,
             'active': self.active,
             'is_character_type': self.is_character_type,
-            'skills': [skill.__dict__ for skill in self.skills]
+            'skills': [skill.to_dict() for skill in self.skills]
         }
 
 
-@dataclass
+def copy_roster(roster: Iterable[CardState]) -> List[CardState]:
+    """Копия карт, чтобы бой не менял шаблоны состава."""
+    return [
+        CardState(
+            id=card.id,
+            name=card.name,
+            health=card.health,
+            attack=card.attack,
+            initiative=card.initiative,
+            active=card.active,
+            is_character_type=card.is_character_type,
+            skills=[SkillState(name=skill.name, damage=skill.damage) for skill in card.skills],
+        ) for card in roster
+    ]
+
+
+class Action(NamedTuple):
+    """Действие карты: check(actor, arg) - текст ошибки или None, resolve(actor, arg) - (индекс скила, урон)."""
+    check: Callable[[CardState, Any], Optional[str]]
+    resolve: Callable[[CardState, Any], Tuple[int, int]]
+
+
+# Таблица действий: ход героя и ход монстра разрешаются через нее, новое действие - новая запись
+ACTIONS: Dict[str, Action] = {}
+
+
+def _no_check(actor: CardState, arg) -> Optional[str]:
+    return None
+
+
+def register_action(name: str, check: Callable[[CardState, Any], Optional[str]] = _no_check):
+    """Декоратор: регистрирует resolve действия name в ACTIONS."""
+    def decorator(resolve):
+        ACTIONS[name] = Action(check, resolve)
+        return resolve
+    return decorator
+
+
+@register_action('attack')
+def _attack(actor: CardState, arg) -> Tuple[int, int]:
+    return ATTACK, actor.attack
+
+
+def _check_skill(actor: CardState, arg) -> Optional[str]:
+    try:
+        if 0 <= int(arg) < len(actor.skills):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return 'Некорректный скил'
+
+
+@register_action('skill', check=_check_skill)
+def _skill(actor: CardState, arg) -> Tuple[int, int]:
+    skill_index = int(arg)
+    return skill_index, actor.skills[skill_index].damage
+
+
+@dataclass(slots=True)
 class BattleState:
     participants: List[CardState] = field(default_factory=list)
-    battle_log: str = ""
+    log: BattleLog = field(default_factory=BattleLog)
+    round: int = 1
+    # Зерно боя: случайность каждой фазы монстров выводится из (seed, число событий в журнале),
+    # поэтому бой воспроизводим и для сохранения достаточно зерна (см. Cards/replay.py)
+    seed: Optional[int] = None
+    # Уровень ИИ монстров, см. Cards/monster_ai.py
+    ai: str = DEFAULT_AI
+    # Внешний поток случайных чисел вместо зерна - для симуляций, где им же пользуется политика героев
+    rng: Any = field(default=None, repr=False, compare=False)
+    scheduler: InitiativeScheduler = field(init=False, repr=False, compare=False)
+    # Индексы, которые поддерживаются по ходу боя: карта по (тип, id), карты каждой стороны
+    # в порядке хода и живые карты каждой стороны (тоже в порядке хода)
+    _index: Dict[Tuple[CardType, int], CardState] = field(init=False, repr=False, compare=False)
+    _sides: Dict[CardType, List[CardState]] = field(init=False, repr=False, compare=False)
+    _alive: Dict[CardType, List[CardState]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.seed is None:
+            self.seed = new_seed()
+        if self.ai not in AI_LEVELS:
+            raise ValueError(f'Уровень ИИ монстров - один из {AI_LEVELS}')
+        self.update_participants()
+
+    @classmethod
+    def start(cls, participants: List[CardState], seed: Optional[int] = None, ai: str = DEFAULT_AI) -> "BattleState":
+        """Новый бой: если первыми по инициативе ходят монстры, их ходы проводятся сразу."""
+        battle_state = cls(participants=participants, seed=seed, ai=ai)
+        battle_state.handle_monster_turns()
+        return battle_state
+
+    @property
+    def heroes(self) -> List[CardState]:
+        return self._sides[CardType.HERO]
+
+    @property
+    def monsters(self) -> List[CardState]:
+        return self._sides[CardType.MONSTER]
+
+    @property
+    def cards(self) -> Dict[Tuple[CardType, int], CardState]:
+        """Карты боя по ключу (тип, id) - id героев и монстров могут совпадать."""
+        return self._index
+
+    def turn_rng(self, offset: int = 0):
+        """Генератор для хода монстра, событие которого встанет в журнал на позицию len(log) + offset."""
+        if self.rng is not None:
+            return self.rng
+        # Новый поток на каждую позицию журнала: состояние генератора хранить не нужно, а ход зависит
+        # только от позиции - неважно, проводится фаза целиком или по одному ходу
+        return random.Random(self.seed << 32 | (len(self.log) + offset))
+
+    def alive(self, character_type) -> List[CardState]:
+        """Живые карты стороны в порядке хода. Список поддерживается боем - менять его нельзя."""
+        return self._alive[CardType(character_type)]
+
+    def get_card(self, character_type, card_id) -> Optional[CardState]:
+        return self._index.get((character_type, int(card_id)))
+
+    def _apply_damage(self, target: CardState, damage: int):
+        was_alive = target.health > 0
+        target.health -= damage
+        if was_alive != (target.health > 0):
+            side = target.is_character_type
+            if was_alive:
+                self._alive[side].remove(target)
+            else:
+                # Карта ожила (отрицательный урон) - восстанавливаем порядок хода
+                self._alive[side] = [card for card in self._sides[side] if card.health > 0]
+
+    def describe(self, events: List[BattleEvent]) -> List[str]:
+        cards = self.cards
+        return [describe_event(event, cards) for event in events]
+
+    @property
+    def battle_log(self) -> str:
+        """Весь журнал боя текстом. Для вывода лучше брать хвост: describe(log.tail(k))."""
+        return ''.join(f"\n{line}" for line in self.describe(self.log.events()))
 
     @classmethod
     def from_dict(cls, data) -> "BattleState":
@@ -66,27 +226,42 @@ class BattleState:
             CardState.from_dict(monster_data) for monster_data in monsters_data]
         return cls(
             participants=participants,
-            battle_log=data.get('battle_log', '')
+            log=BattleLog(data.get('events', [])),
+            round=data.get('round', 1),
+            seed=data.get('seed'),
+            ai=data.get('ai', DEFAULT_AI),
         )
 
-    def to_dict(self) -> Dict:
-        return {
-            'heroes': [p.to_dict() for p in self.participants if p.is_character_type == 'HERO'],
-            'monsters': [p.to_dict() for p in self.participants if p.is_character_type == 'MONSTER'],
-            'battle_log': self.battle_log,
+    def to_dict(self, with_events=True) -> Dict:
+        data = {
+            'heroes': [p.to_dict() for p in self.heroes],
+            'monsters': [p.to_dict() for p in self.monsters],
+            'round': self.round,
+            'seed': self.seed,
+            'ai': self.ai,
         }
+        if with_events:
+            data['events'] = self.log.to_list()
+        return data
 
     def update_participants(self):
-        self.participants = sorted(
-            [p for p in self.participants if p.active and p.health > 0],
-            key=lambda p: p.initiative, reverse=True
-        )
+        """Полностью пересобирает порядок ходов. Нужен, только если карты меняли в обход методов боя."""
+        # Порядок ходов - по убыванию инициативы, при равенстве герои идут первыми, а внутри стороны
+        # сохраняется исходный порядок (сортировка стабильная). Так порядок не зависит от того, как
+        # перемешаны стороны во входном списке, и не меняется после from_dict/decode.
+        # Походившие и погибшие карты остаются в составе боя, иначе их нельзя вернуть в следующем раунде.
+        self.participants.sort(key=lambda p: (-p.initiative, p.is_character_type is CardType.MONSTER))
+        self.scheduler = InitiativeScheduler(self.participants)
+        self._index = {p.key: p for p in self.participants}
+        self._sides = {character_type: [] for character_type in CardType}
+        self._alive = {character_type: [] for character_type in CardType}
+        for p in self.participants:
+            self._sides[p.is_character_type].append(p)
+            if p.health > 0:
+                self._alive[p.is_character_type].append(p)
 
     def get_active_participant(self):
-        for p in self.participants:
-            if p.active:
-                return p
-        return None
+        return self.scheduler.peek()
 
     def get_next_participant(self):
         active = self.get_active_participant()
@@ -95,70 +270,130 @@ class BattleState:
             return None
 
         active.active = False
-        self.update_participants()
+        return self.get_active_participant()
 
-        for p in self.participants:
-            if p.active:
-                return p
+    def validate_hero_turn(self, hero_id, target_id, action, skill_index=None) -> Optional[str]:
+        """Текст ошибки, если герой hero_id не может сейчас так сходить, иначе None."""
+        if self.is_battle_over():
+            return 'Бой окончен'
+        try:
+            hero_key = (CardType.HERO, int(hero_id))
+            target = self.get_card(CardType.MONSTER, target_id)
+        except (TypeError, ValueError):
+            return 'Некорректный id героя или цели'
+        active = self.get_active_participant()
+        if active is None or active.key != hero_key:
+            return 'Сейчас ход другого участника'
+        if target is None or target.health <= 0:
+            return 'Цель недоступна'
+        handler = ACTIONS.get(action)
+        if handler is None:
+            return f'Неизвестное действие: {action}'
+        return handler.check(active, skill_index)
+
+    def hero_turn(self, hero_id, target_id, action, skill_index=None) -> Optional[str]:
+        """Ход героя с проверкой и ответные ходы монстров. Текст ошибки (бой не меняется) или None."""
+        error = self.validate_hero_turn(hero_id, target_id, action, skill_index)
+        if error:
+            return error
+        self.process_hero_turn(hero_id, target_id, action, skill_index)
+        self.handle_monster_turns()
         return None
 
     def process_hero_turn(self, hero_id, target_id, action, skill_index=None):
-        hero = next((h for h in self.participants if h.id == int(hero_id)), None)
-        target = None
-        if target_id:
-            target = next((m for m in self.participants if m.id == int(target_id)), None)
-
-        if action == 'attack' and target:
-            damage = hero.attack
-            target.health -= damage
-            self.battle_log += f"\n{hero.name} атаковал {target.name} и нанес {damage} урона."
-        elif action == 'skill' and skill_index is not None and target:
-            if hero.skills:
-                skill = hero.skills[int(skill_index)]
-                damage = skill.damage
-                target.health -= damage
-                self.battle_log += f"\n{hero.name} использовал скил {skill.name} на {target.name} и нанес {damage} урона."
-
+        """Ход героя без проверки очереди хода. Недопустимое действие - пропуск хода."""
+        hero = self.get_card(CardType.HERO, hero_id)
+        target = self.get_card(CardType.MONSTER, target_id) if target_id else None
+        handler = ACTIONS.get(action)
+        if target is not None and handler is not None and handler.check(hero, skill_index) is None:
+            self.log.append(self._strike(hero, target, handler, skill_index))
         hero.active = False
-        self.update_participants()
+
+    def _strike(self, actor: CardState, target: CardState, handler: Action, arg) -> BattleEvent:
+        skill_index, damage = handler.resolve(actor, arg)
+        self._apply_damage(target, damage)
+        return BattleEvent(self.round, actor.is_character_type, actor.id, target.id, skill_index, damage)
 
     def handle_monster_turns(self):
-        next_participant = self.get_next_participant()
-        while next_participant and next_participant.is_character_type == 'MONSTER':
-            self.process_monster_turn()
-            next_participant = self.get_next_participant()
+        """Проводит ходы монстров (переходя в новый раунд при необходимости), пока не настанет ход героя."""
+        self.resolve_monster_phase()
+
+    def resolve_monster_phase(self) -> int:
+        """Все ходы монстров подряд до хода героя за один проход. Возвращает число ходов.
+
+        События те же, что у цикла из process_monster_turn: генератор каждого хода выводится из его позиции
+        в журнале (turn_rng), цели берутся из поддерживаемого списка живых героев, события дописываются
+        в журнал пачкой.
+        """
+        planner = None
+        events = []
+        while not self.is_battle_over():
+            monster = self.scheduler.peek()
+            if monster is None:
+                self.start_new_round()
+                continue
+            if monster.is_character_type is not CardType.MONSTER:
+                break
+            if planner is None:
+                planner = self.monster_planner()
+            events.append(self._monster_strike(monster, len(events), planner))
+        self.log.extend(events)
+        return len(events)
+
+    def monster_planner(self) -> Optional[MonsterPlanner]:
+        """Планировщик ходов монстров на одну фазу (до хода героя); None для случайных ходов.
+
+        Монстры, походившие в фазе до него, - ходы монстров в конце журнала: от их числа зависит бюджет хода.
+        """
+        if self.ai == DEFAULT_AI:
+            return None
+        return MonsterPlanner(self.participants, self.round, self.ai, acted=self.log.streak(CardType.MONSTER))
+
+    def _monster_strike(self, monster: CardState, pending: int = 0,
+                        planner: Optional[MonsterPlanner] = None) -> BattleEvent:
+        """Ход монстра: цель выбирает planner, без него - случайный живой герой (из живых в порядке хода).
+
+        pending - сколько событий фазы еще не дописано в журнал: от него зависит позиция хода для turn_rng.
+        """
+        if planner is not None:
+            target, action, arg = planner.choose(monster)
+            event = self._strike(monster, target, ACTIONS[action], arg)
+        else:
+            rng = self.turn_rng(pending)
+            target = rng.choice(self._alive[CardType.HERO])
+            if monster.skills:
+                event = self._strike(monster, target, ACTIONS['skill'], rng.randint(0, len(monster.skills) - 1))
+            else:
+                event = self._strike(monster, target, ACTIONS['attack'], None)
+        monster.active = False
+        return event
+
+    def monster_turn(self) -> Optional[str]:
+        """Ход текущего монстра с проверкой очереди. Текст ошибки или None."""
+        active = self.get_active_participant()
+        if self.is_battle_over() or active is None or active.is_character_type is not CardType.MONSTER:
+            return 'Сейчас не ход монстра'
+        self.process_monster_turn()
+        return None
 
     def process_monster_turn(self):
         active_monster = self.get_active_participant()
 
-        if not active_monster or active_monster.is_character_type != 'MONSTER':
+        if not active_monster or active_monster.is_character_type is not CardType.MONSTER:
             return
 
-        available_heroes = [hero for hero in self.participants if
-                            hero.health > 0 and hero.active and hero.is_character_type == 'HERO']
-        if available_heroes:
-            target = random.choice(available_heroes)
-            if active_monster.skills:
-                skill_index = random.randint(0, len(active_monster.skills) - 1)
-                skill = active_monster.skills[skill_index]
-                damage = skill.damage
-                target.health -= damage
-                self.battle_log += f"\n{active_monster.name} использовал скил {skill.name} на {target.name} и нанес {damage} урона."
-            else:
-                damage = active_monster.attack
-                target.health -= damage
-                self.battle_log += f"\n{active_monster.name} атаковал {target.name} и нанес {damage} урона."
+        # Живые герои поддерживаются боем, а не собираются заново на каждый ход монстра
+        if self._alive[CardType.HERO]:
+            self.log.append(self._monster_strike(active_monster, planner=self.monster_planner()))
 
         active_monster.active = False
-        self.update_participants()
 
     def start_new_round(self):
+        self.round += 1
         for p in self.participants:
             if p.health > 0:
                 p.active = True
-        self.update_participants()
+        self.scheduler.reset(self.participants)
 
     def is_battle_over(self):
-        heroes_alive = any(p.health > 0 for p in self.participants if p.is_character_type == 'HERO')
-        monsters_alive = any(p.health > 0 for p in self.participants if p.is_character_type == 'MONSTER')
-        return not heroes_alive or not monsters_alive
\ No newline at end of file
+        return not self._alive[CardType.HERO] or not self._alive[CardType.MONSTER]
\ No newline at end of file
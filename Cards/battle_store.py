@@ -0,0 +1,395 @@
+# Cards/battle_store.py
+"""Хранилище состояний боёв на стороне сервера.
+
+В сессии лежит только id боя, само состояние - здесь: в памяти процесса (LRU) поверх постоянного
+уровня (SQLite или каталог с файлами). Бэкенд выбирается настройкой BATTLE_STORE:
+
+    BATTLE_STORE = {
+        'BACKEND': 'Cards.battle_store.SQLiteBattleStore',
+        'LOCATION': BASE_DIR / 'battles.sqlite3',
+        'LRU_SIZE': 1024,               # боёв в памяти процесса
+        'LRU_MAX_BYTES': 64 * 2 ** 20,  # и не больше стольких байт записей (None - без предела)
+        'IDLE_TIMEOUT': 600,            # бой без обращений дольше стольких секунд уходит из памяти
+        'TTL': 7 * 24 * 3600,           # брошенные бои старше стольких секунд удаляет purge_battles
+    }
+
+Параллельные запросы к одному бою упорядочивает версия боя (compare-and-swap в save), общей
+блокировки на все бои нет. При нескольких процессах-воркерах LRU лучше отключить (LRU_SIZE = 0):
+записи он не испортит, но чтения могут вернуть устаревшую копию до первого конфликта.
+
+Журнал событий пишется отдельно и только дописывается: при сохранении уходят лишь события,
+появившиеся после прошлой записи, так что размер записи не растет вместе с длиной боя. События лежат
+в формате BattleLog.tobytes (int64, little-endian).
+"""
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import codec
+from .battle_events import BattleLog
+from .battle_state import BattleState
+from .metrics import phase
+
+# Запись в хранилище: (снимок без событий, все события, версия)
+Record = Tuple[bytes, bytes, int]
+
+
+class BattleConflict(Exception):
+    """Бой успели изменить с тех пор, как была прочитана его версия."""
+
+
+class BattleStore:
+    """Базовый интерфейс хранилища.
+
+    У каждого боя есть версия: 0 при создании, +1 при каждой записи. save(..., version=v) - атомарный
+    compare-and-swap: запись проходит, только если в хранилище все еще версия v, иначе BattleConflict.
+    Наследники реализуют _read, _write и delete.
+    """
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def create(self, battle_state: BattleState) -> str:
+        battle_id = self.new_id()
+        self.save(battle_id, battle_state)
+        return battle_id
+
+    def load(self, battle_id: str) -> Optional[Tuple[BattleState, int]]:
+        """Бой и его версия или None."""
+        with phase('store_read'):
+            record = self._read(battle_id)
+        if record is None:
+            return None
+        data, events, version = record
+        with phase('decode'):
+            return self.decode(data, events), version
+
+    def get(self, battle_id: str) -> Optional[BattleState]:
+        loaded = self.load(battle_id)
+        return loaded[0] if loaded else None
+
+    def save(self, battle_id: str, battle_state: BattleState, version: Optional[int] = None) -> int:
+        """Записывает бой и возвращает его новую версию. version=None - запись без проверки версии."""
+        log = battle_state.log
+        # Дописываем только события, которых еще нет в хранилище
+        with phase('encode'):
+            data, events = self.encode(battle_state), log.tobytes(log.persisted)
+        with phase('store_write'):
+            new_version = self._write(battle_id, data, log.persisted, events, version)
+        log.persisted = len(log)
+        return new_version
+
+    def delete(self, battle_id: str):
+        raise NotImplementedError
+
+    def purge(self, older_than: float) -> List[str]:
+        """Удаляет бои, которые не записывались дольше older_than секунд. Возвращает их id."""
+        raise NotImplementedError
+
+    def _read(self, battle_id: str) -> Optional[Record]:
+        raise NotImplementedError
+
+    def _write(self, battle_id: str, data: bytes, seq: int, events: bytes, version: Optional[int]) -> int:
+        """Атомарно записывает снимок и события, начиная с события номер seq. Возвращает новую версию."""
+        raise NotImplementedError
+
+    @staticmethod
+    def encode(battle_state: BattleState) -> bytes:
+        return codec.encode(battle_state, with_events=False)
+
+    @staticmethod
+    def decode(data: bytes, events: bytes = b'') -> BattleState:
+        battle_state = codec.decode(data)
+        battle_state.log = BattleLog.frombytes(events)
+        battle_state.log.persisted = len(battle_state.log)
+        return battle_state
+
+
+class SQLiteBattleStore(BattleStore):
+    def __init__(self, location):
+        self.location = str(location)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS battles ('
+                               'id TEXT PRIMARY KEY, data BLOB NOT NULL, version INTEGER NOT NULL DEFAULT 0, '
+                               'updated_at REAL NOT NULL DEFAULT 0)')
+            connection.execute('CREATE TABLE IF NOT EXISTS battle_events ('
+                               'battle_id TEXT NOT NULL, seq INTEGER NOT NULL, data BLOB NOT NULL, '
+                               'PRIMARY KEY (battle_id, seq))')
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.location, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _read(self, battle_id):
+        connection = self._connection()
+        # Снимок и события читаем в одной транзакции, чтобы не увидеть события более новой версии
+        connection.execute('BEGIN')
+        try:
+            row = connection.execute('SELECT data, version FROM battles WHERE id = ?', (battle_id,)).fetchone()
+            if not row:
+                return None
+            chunks = connection.execute('SELECT data FROM battle_events WHERE battle_id = ? ORDER BY seq',
+                                        (battle_id,))
+            return row[0], b''.join(chunk for chunk, in chunks), row[1]
+        finally:
+            connection.commit()
+
+    def _write(self, battle_id, data, seq, events, version):
+        with self._connection() as connection:
+            if version is None:
+                connection.execute('INSERT INTO battles (id, data, updated_at) VALUES (?, ?, ?) ON CONFLICT (id) '
+                                   'DO UPDATE SET data = excluded.data, version = version + 1, '
+                                   'updated_at = excluded.updated_at', (battle_id, data, time.time()))
+                new_version, = connection.execute('SELECT version FROM battles WHERE id = ?',
+                                                  (battle_id,)).fetchone()
+            else:
+                # Проверка версии и запись - один UPDATE, поэтому из двух параллельных записей пройдет одна
+                cursor = connection.execute('UPDATE battles SET data = ?, version = version + 1, updated_at = ? '
+                                            'WHERE id = ? AND version = ?', (data, time.time(), battle_id, version))
+                if not cursor.rowcount:
+                    raise BattleConflict(battle_id)
+                new_version = version + 1
+            if events:
+                connection.execute('INSERT OR REPLACE INTO battle_events (battle_id, seq, data) VALUES (?, ?, ?)',
+                                   (battle_id, seq, events))
+        return new_version
+
+    def delete(self, battle_id):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM battles WHERE id = ?', (battle_id,))
+            connection.execute('DELETE FROM battle_events WHERE battle_id = ?', (battle_id,))
+
+    def purge(self, older_than):
+        with self._connection() as connection:
+            # Бой, записанный между выборкой и удалением, не трогаем: условие по времени повторяется в DELETE
+            purged = [battle_id for battle_id, in connection.execute(
+                'DELETE FROM battles WHERE updated_at < ? RETURNING id', (time.time() - older_than,))]
+            connection.executemany('DELETE FROM battle_events WHERE battle_id = ?',
+                                   [(battle_id,) for battle_id in purged])
+        return purged
+
+
+class FileBattleStore(BattleStore):
+    """Файлы боя в каталоге LOCATION: снимок (.battle, начинается с версии боя, u64) и журнал (.events).
+
+    Записи одного боя упорядочены блокировкой внутри процесса, поэтому каталог не должен
+    использоваться несколькими процессами одновременно.
+    """
+    _VERSION = struct.Struct('<Q')
+
+    def __init__(self, location, stripes: int = 64):
+        self.location = str(location)
+        os.makedirs(self.location, exist_ok=True)
+        # Блокировки по хэшу id: бои из разных полос не ждут друг друга
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock(self, battle_id) -> threading.Lock:
+        return self._locks[hash(battle_id) % len(self._locks)]
+
+    def _path(self, battle_id, suffix='battle'):
+        # id приходит из сессии, пропускаем только hex, чтобы не выйти за пределы каталога
+        if not battle_id.isalnum():
+            raise ValueError(f'Некорректный id боя: {battle_id!r}')
+        return os.path.join(self.location, f'{battle_id}.{suffix}')
+
+    def _read_file(self, battle_id, suffix) -> Optional[bytes]:
+        try:
+            with open(self._path(battle_id, suffix), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _read(self, battle_id):
+        with self._lock(battle_id):
+            data = self._read_file(battle_id, 'battle')
+            if data is None:
+                return None
+            version, = self._VERSION.unpack_from(data)
+            return data[self._VERSION.size:], self._read_file(battle_id, 'events') or b'', version
+
+    def _write(self, battle_id, data, seq, events, version):
+        path = self._path(battle_id)
+        with self._lock(battle_id):
+            current = self._read_file(battle_id, 'battle')
+            current = self._VERSION.unpack_from(current)[0] if current is not None else None
+            if version is not None and version != current:
+                raise BattleConflict(battle_id)
+            new_version = 0 if current is None else current + 1
+            if events:
+                with open(self._path(battle_id, 'events'), 'ab') as f:
+                    f.write(events)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self._VERSION.pack(new_version) + data)
+            os.replace(tmp_path, path)
+        return new_version
+
+    def delete(self, battle_id):
+        with self._lock(battle_id):
+            self._delete_files(battle_id)
+
+    def _delete_files(self, battle_id):
+        for suffix in ('battle', 'events'):
+            try:
+                os.remove(self._path(battle_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def purge(self, older_than):
+        # Время последней записи - mtime файла снимка: каждая запись заменяет его целиком
+        cutoff = time.time() - older_than
+        purged = []
+        for entry in os.scandir(self.location):
+            battle_id, suffix = os.path.splitext(entry.name)
+            if suffix != '.battle' or entry.stat().st_mtime >= cutoff:
+                continue
+            with self._lock(battle_id):
+                try:
+                    if os.stat(entry.path).st_mtime >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                self._delete_files(battle_id)
+            purged.append(battle_id)
+        return purged
+
+
+class LRUBattleStore(BattleStore):
+    """Недавние бои в памяти процесса поверх постоянного хранилища (write-through).
+
+    Хранятся байты записи, а не живые объекты: каждый запрос получает свою копию боя, и проигравший
+    в гонке запрос не портит чужое состояние. Проверку версии делает постоянное хранилище; при конфликте
+    запись вытесняется из памяти, чтобы повторная попытка прочитала свежую версию.
+
+    Память ограничена числом боёв (max_size) и суммарным размером записей (max_bytes), а бой, к которому
+    не обращались idle_timeout секунд, вытесняется. Каждая запись уже лежит в постоянном хранилище,
+    поэтому вытесненный бой ничего не теряет - следующее обращение прочитает его с диска.
+    """
+
+    def __init__(self, backend: BattleStore, max_size: int = 1024, max_bytes: Optional[int] = None,
+                 idle_timeout: Optional[float] = None):
+        self.backend = backend
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        # id боя -> (запись, время последнего обращения); порядок - от давних обращений к недавним
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(record: Record) -> int:
+        return len(record[0]) + len(record[1])
+
+    def _get(self, battle_id) -> Optional[Record]:
+        entry = self._cache.get(battle_id)
+        return entry[0] if entry is not None else None
+
+    def _forget(self, battle_id):
+        entry = self._cache.pop(battle_id, None)
+        if entry is not None:
+            self._bytes -= self._size(entry[0])
+
+    def _remember(self, battle_id, record: Record):
+        self._forget(battle_id)
+        self._cache[battle_id] = (record, time.monotonic())
+        self._bytes += self._size(record)
+        self._evict()
+
+    def _evict(self):
+        # Вытесняем с головы: там и самые давние обращения, и самые давно простаивающие бои
+        deadline = time.monotonic() - self.idle_timeout if self.idle_timeout is not None else None
+        while self._cache:
+            oldest_id, (oldest, touched) = next(iter(self._cache.items()))
+            if (len(self._cache) <= self.max_size and (self.max_bytes is None or self._bytes <= self.max_bytes)
+                    and (deadline is None or touched >= deadline)):
+                break
+            self._forget(oldest_id)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    def _read(self, battle_id):
+        with self._lock:
+            self._evict()
+            record = self._get(battle_id)
+            if record is not None:
+                self._cache[battle_id] = (record, time.monotonic())
+                self._cache.move_to_end(battle_id)
+                return record
+        record = self.backend._read(battle_id)
+        if record is not None:
+            with self._lock:
+                cached = self._get(battle_id)
+                if cached is None or cached[2] < record[2]:
+                    self._remember(battle_id, record)
+        return record
+
+    def _write(self, battle_id, data, seq, events, version):
+        try:
+            new_version = self.backend._write(battle_id, data, seq, events, version)
+        except BattleConflict:
+            with self._lock:
+                self._forget(battle_id)
+            raise
+        with self._lock:
+            cached = self._get(battle_id)
+            if cached is not None and cached[2] == new_version - 1:
+                self._remember(battle_id, (data, cached[1] + events, new_version))
+            elif seq == 0 and (cached is None or cached[2] < new_version):
+                self._remember(battle_id, (data, events, new_version))
+            else:
+                # Не знаем всех событий боя - пусть следующее чтение сходит в хранилище
+                self._forget(battle_id)
+        return new_version
+
+    def delete(self, battle_id):
+        with self._lock:
+            self._forget(battle_id)
+        self.backend.delete(battle_id)
+
+    def purge(self, older_than):
+        purged = self.backend.purge(older_than)
+        with self._lock:
+            for battle_id in purged:
+                self._forget(battle_id)
+        return purged
+
+
+@receiver(setting_changed)
+def reset_battle_store(setting, **kwargs):
+    if setting == 'BATTLE_STORE':
+        get_battle_store.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_battle_store() -> BattleStore:
+    config = getattr(settings, 'BATTLE_STORE', {})
+    backend_class = import_string(config.get('BACKEND', 'Cards.battle_store.SQLiteBattleStore'))
+    backend = backend_class(config.get('LOCATION', os.path.join(settings.BASE_DIR, 'battles.sqlite3')))
+    lru_size = config.get('LRU_SIZE', 1024)
+    if lru_size:
+        return LRUBattleStore(backend, max_size=lru_size, max_bytes=config.get('LRU_MAX_BYTES'),
+                              idle_timeout=config.get('IDLE_TIMEOUT'))
+    return backend
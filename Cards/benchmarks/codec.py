@@ -0,0 +1,59 @@
+# Cards/benchmarks/codec.py
+"""Микро-бенчмарк: бинарный формат (Cards/codec.py) против to_dict/from_dict + JSON.
+
+    python -m Cards.benchmarks.codec
+"""
+import json
+import timeit
+
+from .. import codec
+from ..battle_state import BattleState
+from .fixtures import make_battle
+
+
+def dict_encode(battle_state):
+    return json.dumps(battle_state.to_dict(), separators=(',', ':')).encode('latin-1')
+
+
+def dict_decode(data):
+    return BattleState.from_dict(json.loads(data))
+
+
+def measure(func, arg, number):
+    return min(timeit.repeat(lambda: func(arg), number=number, repeat=5)) / number
+
+
+def run(sizes=((6, 50), (100, 1000), (1000, 5000))):
+    rows = []
+    for n_cards, n_turns in sizes:
+        battle_state = make_battle(n_cards, n_turns)
+        as_dict, as_codec = dict_encode(battle_state), codec.encode(battle_state)
+        assert codec.decode(as_codec).to_dict() == battle_state.to_dict()
+        number = max(10, 20000 // n_cards)
+        rows.append({
+            'cards': n_cards,
+            'events': len(battle_state.log),
+            'dict_bytes': len(as_dict),
+            'codec_bytes': len(as_codec),
+            'dict_encode_us': measure(dict_encode, battle_state, number) * 1e6,
+            'codec_encode_us': measure(codec.encode, battle_state, number) * 1e6,
+            'dict_decode_us': measure(dict_decode, as_dict, number) * 1e6,
+            'codec_decode_us': measure(codec.decode, as_codec, number) * 1e6,
+        })
+    return rows
+
+
+def main():
+    header = ('cards', 'events', 'dict_bytes', 'codec_bytes', 'dict_encode_us', 'codec_encode_us',
+              'dict_decode_us', 'codec_decode_us')
+    print(' '.join(f'{name:>15}' for name in header))
+    for row in run():
+        print(' '.join(f'{row[name]:>15.1f}' if isinstance(row[name], float) else f'{row[name]:>15}'
+                       for name in header))
+        print(f"{'':>15} размер меньше в {row['dict_bytes'] / row['codec_bytes']:.1f} раз, "
+              f"кодирование быстрее в {row['dict_encode_us'] / row['codec_encode_us']:.1f}, "
+              f"декодирование - в {row['dict_decode_us'] / row['codec_decode_us']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# Cards/benchmarks/fixtures.py
+import random
+from typing import List
+
+from ..battle_state import BattleState, CardState, CardType, SkillState
+
+
+def make_roster(n_cards: int, seed: int = 0) -> List[CardState]:
+    """Синтетический состав: поровну героев и монстров, у каждого 1-3 скила."""
+    rng = random.Random(seed)
+    roster = []
+    for i in range(n_cards):
+        character_type = CardType.HERO if i % 2 == 0 else CardType.MONSTER
+        roster.append(CardState(
+            id=i // 2 + 1,
+            name=f'{"Герой" if character_type is CardType.HERO else "Монстр"} {i // 2 + 1}',
+            health=rng.randint(500, 1500),
+            attack=rng.randint(5, 20),
+            initiative=rng.randint(1, 10),
+            active=True,
+            is_character_type=character_type,
+            skills=[SkillState(name=f'Скил {rng.randint(1, 20)}', damage=rng.randint(5, 30))
+                    for _ in range(rng.randint(1, 3))],
+        ))
+    return roster
+
+
+def make_battle(n_cards: int, n_turns: int = 0, seed: int = 0) -> BattleState:
+    """Бой на n_cards карт, в котором уже сыграно до n_turns ходов (герои бьют случайного живого монстра)."""
+    rng = random.Random(seed)
+    roster = make_roster(n_cards, seed)
+    battle_state = BattleState(
+        participants=[card for card in roster if card.is_character_type is CardType.HERO] +
+                     [card for card in roster if card.is_character_type is CardType.MONSTER],
+        seed=seed,
+        rng=rng,
+    )
+    battle_state.handle_monster_turns()
+    while len(battle_state.log) < n_turns and not battle_state.is_battle_over():
+        hero = battle_state.get_active_participant()
+        target = rng.choice([monster for monster in battle_state.monsters if monster.health > 0])
+        battle_state.process_hero_turn(hero.id, target.id, 'attack')
+        battle_state.handle_monster_turns()
+    return battle_state
@@ -0,0 +1,69 @@
+# Cards/benchmarks/monster_phase.py
+"""Микро-бенчмарк: фаза монстров одним проходом (resolve_monster_phase) против пошагового цикла.
+
+    python -m Cards.benchmarks.monster_phase
+"""
+import random
+import timeit
+
+from ..battle_state import BattleState, CardType
+from .fixtures import make_roster
+
+
+def make_pack(n_heroes: int, n_monsters: int) -> BattleState:
+    """Бой, в котором герои уже походили и дальше ходит вся стая монстров."""
+    roster = make_roster(2 * max(n_heroes, n_monsters))
+    heroes = [card for card in roster if card.is_character_type is CardType.HERO][:n_heroes]
+    monsters = [card for card in roster if card.is_character_type is CardType.MONSTER][:n_monsters]
+    for hero in heroes:
+        hero.active = False
+        hero.health = 10 ** 9
+    return BattleState(participants=heroes + monsters, rng=random.Random(0))
+
+
+def turn_by_turn(battle_state: BattleState):
+    while not battle_state.is_battle_over():
+        active = battle_state.get_active_participant()
+        if active is None:
+            battle_state.start_new_round()
+        elif active.is_character_type is CardType.MONSTER:
+            battle_state.process_monster_turn()
+        else:
+            break
+
+
+def batched(battle_state: BattleState):
+    battle_state.resolve_monster_phase()
+
+
+def measure(func, n_heroes, n_monsters, repeat):
+    # Каждый замер - на свежем бою, сборка боя в замер не входит
+    packs = []
+    timer = timeit.Timer(lambda: func(packs.pop()), setup=lambda: packs.append(make_pack(n_heroes, n_monsters)))
+    return min(timer.repeat(number=1, repeat=repeat))
+
+
+def run(sizes=((5, 50), (50, 500), (200, 5000))):
+    rows = []
+    for n_heroes, n_monsters in sizes:
+        repeat = max(5, 20000 // n_monsters)
+        rows.append({
+            'heroes': n_heroes,
+            'monsters': n_monsters,
+            'turn_by_turn_us': measure(turn_by_turn, n_heroes, n_monsters, repeat) * 1e6,
+            'batched_us': measure(batched, n_heroes, n_monsters, repeat) * 1e6,
+        })
+    return rows
+
+
+def main():
+    header = ('heroes', 'monsters', 'turn_by_turn_us', 'batched_us')
+    print(' '.join(f'{name:>15}' for name in header))
+    for row in run():
+        print(' '.join(f'{row[name]:>15.1f}' if isinstance(row[name], float) else f'{row[name]:>15}'
+                       for name in header),
+              f"  быстрее в {row['turn_by_turn_us'] / row['batched_us']:.1f} раз")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Cards/benchmarks/render.py
+"""Бенчмарк отрисовки списка карт боя: все карты заново против кэша фрагментов (card_list).
+
+    python -m Cards.benchmarks.render
+
+cold - кэш фрагментов пуст, warm - после хода, изменившего одну карту, page - вся страница game_play.html
+с кэшем фрагментов.
+"""
+import os
+import timeit
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Config.settings')
+    django.setup()
+
+
+def run(sizes=(10, 100, 1000)):
+    from django.core.cache import caches
+    from django.template.loader import get_template, render_to_string
+    from django.test import RequestFactory
+
+    from ..templatetags.battle_tags import CARD_TEMPLATE, FRAGMENT_CACHE, card_list
+    from .fixtures import make_battle
+
+    cache = caches[FRAGMENT_CACHE]
+    request = RequestFactory().get('/card/game_play/')
+    card_template = get_template(CARD_TEMPLATE)
+    rows = []
+    for n_cards in sizes:
+        battle_state = make_battle(n_cards, n_turns=n_cards)
+        cards = battle_state.participants
+        repeat = max(5, 2000 // n_cards)
+
+        def render_all():
+            return ''.join(card_template.render({'card': card}) for card in cards)
+
+        def cold():
+            cache.clear()
+            card_list(cards)
+
+        def warm():
+            cards[0].health -= 1
+            card_list(cards)
+
+        def page():
+            cards[0].health -= 1
+            render_to_string('Cards/game_play.html', {'battle': battle_state, 'participants': cards,
+                                                      'current_participant': None}, request=request)
+
+        card_list(cards)
+        rows.append({
+            'cards': n_cards,
+            'render_all_us': min(timeit.repeat(render_all, number=1, repeat=repeat)) * 1e6,
+            'cold_us': min(timeit.repeat(cold, number=1, repeat=repeat)) * 1e6,
+            'warm_us': min(timeit.repeat(warm, number=1, repeat=repeat)) * 1e6,
+            'page_us': min(timeit.repeat(page, number=1, repeat=repeat)) * 1e6,
+        })
+    return rows
+
+
+def main():
+    setup()
+    header = ('cards', 'render_all_us', 'cold_us', 'warm_us', 'page_us')
+    print(' '.join(f'{name:>15}' for name in header))
+    for row in run():
+        print(' '.join(f'{row[name]:>15.1f}' if isinstance(row[name], float) else f'{row[name]:>15}'
+                       for name in header),
+              f"  быстрее в {row['render_all_us'] / row['warm_us']:.1f} раз")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+# Cards/benchmarks/suite.py
+"""Набор бенчмарков горячего пути игры для проверки регрессий (команда run_benchmarks).
+
+Метрики на каждый размер состава:
+
+    *_us       - время операции движка (минимум по повторам, микросекунды)
+    *_ms       - время полного запроса через тестовый клиент Django (минимум по повторам, миллисекунды)
+    *_queries  - число SQL-запросов одного такого запроса
+
+Запросы идут в тестовую базу и во временное хранилище боёв - рабочие данные не затрагиваются.
+"""
+import platform
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from ..battle_state import BattleState, CardType
+from .fixtures import make_battle, make_roster
+
+SIZES = (6, 100, 1000)
+
+
+def _best_us(func: Callable, setup: Optional[Callable] = None, repeat: int = 20) -> float:
+    """Минимальное время одного вызова func(setup()) в микросекундах; setup в замер не входит."""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        started = time.perf_counter()
+        func(arg) if setup is not None else func()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1e6
+
+
+def _repeat(n_cards: int, base: int = 2000) -> int:
+    return max(5, min(200, base // n_cards))
+
+
+def _hero_turn_ready(n_cards: int) -> Callable[[], tuple]:
+    """Фабрика боёв, в которых сейчас ход героя: (бой, id героя, id цели)."""
+    data = make_battle(n_cards, n_turns=n_cards // 2).to_dict()
+
+    def setup():
+        battle_state = BattleState.from_dict(data)
+        battle_state.rng = random.Random(0)
+        hero = battle_state.get_active_participant()
+        return battle_state, hero.id, battle_state.alive(CardType.MONSTER)[0].id
+    return setup
+
+
+def _monster_phase_ready(n_cards: int, ai: str = 'easy') -> Callable[[], BattleState]:
+    """Фабрика боёв, в которых все герои раунда уже походили."""
+    data = dict(make_battle(n_cards).to_dict(), ai=ai)
+
+    def setup():
+        battle_state = BattleState.from_dict(data)
+        battle_state.rng = random.Random(0)
+        for hero in battle_state.heroes:
+            hero.active = False
+        return battle_state
+    return setup
+
+
+def engine_metrics(n_cards: int) -> Dict[str, float]:
+    repeat = _repeat(n_cards)
+    battle_state = make_battle(n_cards, n_turns=n_cards)
+    data = battle_state.to_dict()
+
+    def hero_turn(args):
+        state, hero_id, target_id = args
+        state.process_hero_turn(hero_id, target_id, 'attack')
+
+    return {
+        'to_dict_us': _best_us(battle_state.to_dict, repeat=repeat),
+        'from_dict_us': _best_us(lambda: BattleState.from_dict(data), repeat=repeat),
+        'update_participants_us': _best_us(battle_state.update_participants, repeat=repeat),
+        'process_hero_turn_us': _best_us(hero_turn, _hero_turn_ready(n_cards), repeat=repeat),
+        'handle_monster_turns_us': _best_us(lambda state: state.handle_monster_turns(),
+                                            _monster_phase_ready(n_cards), repeat=repeat),
+        'handle_monster_turns_hard_us': _best_us(lambda state: state.handle_monster_turns(),
+                                                 _monster_phase_ready(n_cards, 'hard'), repeat=min(repeat, 20)),
+    }
+
+
+def _load_roster(n_cards: int):
+    from ..models import Hero, Monster
+    from ..roster_io import clean_record, import_records
+
+    Hero.objects.all().delete()
+    Monster.objects.all().delete()
+    import_records(clean_record(line, dict(card.to_dict(), type=card.is_character_type, id=None))
+                   for line, card in enumerate(make_roster(n_cards), 1))
+
+
+def _request(client, method: str, url: str, data=None):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f'{method.upper()} {url}: {response.status_code}')
+    return elapsed * 1e3, len(queries)
+
+
+def request_metrics(n_cards: int) -> Dict[str, float]:
+    """start_game, game_play (GET) и ход героя в game_play (POST) через тестовый клиент.
+
+    start_game идет без описания состава, поэтому в бою команды по умолчанию - не больше MAX_TEAM карт
+    на сторону (Cards/teams.py): на больших составах запросы меряют бой этого размера.
+    """
+    from django.test import Client
+    from django.urls import reverse
+
+    from ..battle_store import get_battle_store
+
+    _load_roster(n_cards)
+    client = Client()
+    start, play = reverse('start_game'), reverse('game_play')
+    timings: Dict[str, List[float]] = {'start_game': [], 'game_play_get': [], 'game_play_post': []}
+    queries: Dict[str, int] = {}
+    for _ in range(_repeat(n_cards, base=200)):
+        for name, method, url, data in (('start_game', 'post', start, None), ('game_play_get', 'get', play, None)):
+            elapsed, queries[name] = _request(client, method, url, data)
+            timings[name].append(elapsed)
+        battle_state = get_battle_store().get(client.session['battle_id'])
+        hero = battle_state.get_active_participant()
+        if battle_state.is_battle_over() or hero is None:
+            continue
+        move = {'hero_id': hero.id, 'target_id': battle_state.alive(CardType.MONSTER)[0].id, 'action': 'attack'}
+        elapsed, queries['game_play_post'] = _request(client, 'post', play, move)
+        timings['game_play_post'].append(elapsed)
+
+    metrics = {}
+    for name, values in timings.items():
+        if values:
+            metrics[f'{name}_ms'] = min(values)
+            metrics[f'{name}_queries'] = queries[name]
+    return metrics
+
+
+def run(sizes=SIZES, requests: bool = True, progress: Callable[[str], None] = None) -> Dict:
+    """Все метрики по размерам состава. requests - включить запросы (нужна тестовая база, см. run_benchmarks)."""
+    from django.test import override_settings
+
+    results = {}
+    with tempfile.TemporaryDirectory() as store_dir, override_settings(BATTLE_STORE={
+            'BACKEND': 'Cards.battle_store.FileBattleStore', 'LOCATION': store_dir, 'LRU_SIZE': 1024}):
+        for n_cards in sizes:
+            if progress:
+                progress(f'Состав из {n_cards} карт')
+            metrics = engine_metrics(n_cards)
+            if requests:
+                metrics.update(request_metrics(n_cards))
+            results[str(n_cards)] = metrics
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Регрессии current относительно baseline: время выросло больше чем на threshold (доля),
+    число запросов - выросло хоть на один. Метрики, которых нет в одном из отчетов, пропускаются."""
+    regressions = []
+    for size, metrics in current['results'].items():
+        for name, value in metrics.items():
+            old = baseline['results'].get(size, {}).get(name)
+            if old is None:
+                continue
+            if name.endswith('_queries'):
+                if value > old:
+                    regressions.append(f'{size} карт, {name}: {old} -> {value}')
+            elif value > old * (1 + threshold):
+                regressions.append(f'{size} карт, {name}: {old:.1f} -> {value:.1f} (+{value / old - 1:.0%})')
+    return regressions
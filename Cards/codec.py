@@ -0,0 +1,210 @@
+# Cards/codec.py
+"""Компактный бинарный формат BattleState.
+
+Формат (все числа little-endian):
+
+    b'BS' | версия: u8 | флаги: u8 | тело (сжатое zlib, если установлен флаг _COMPRESSED)
+
+Тело:
+
+    раунд: u32 | число карт C: u32 | число скилов S: u32 | число строк N: u32 | число событий E: u32 | зерно: u64
+    уровень ИИ монстров: u8 (индекс в AI_LEVELS)
+    таблица строк: длины u16 x N, затем байты UTF-8 подряд
+    флаги карт: u8 x C (бит 0 - active, бит 1 - монстр)
+    карты: id x C, имя (индекс строки) x C, здоровье x C, атака x C, инициатива x C, число скилов x C
+    скилы: имя (индекс строки) x S, урон x S
+    события: по столбцу на каждое поле BattleEvent, по E значений
+
+Блоки карт и скилов и столбцы событий - целочисленные массивы с кодом типа array впереди
+('b', 'h', 'i' или 'q'): берется самый узкий тип, в который помещаются все значения. Имена карт и скилов хранятся один раз в таблице строк.
+Читается только текущая VERSION: бой другой версии отклоняется, а не достраивается (новое зерно
+сломало бы воспроизведение боя).
+decode(encode(battle_state)) восстанавливает то же состояние, что и from_dict(to_dict()).
+"""
+import base64
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List
+
+from .battle_events import EVENT_FIELDS, EVENT_TYPECODE, BattleLog
+from .battle_state import BattleState, CardState, CardType, SkillState
+from .monster_ai import AI_LEVELS
+
+MAGIC = b'BS'
+VERSION = 3
+_HEADER = struct.Struct('<2sBB')
+_COUNTS = struct.Struct('<IIIII')
+_SEED = struct.Struct('<Q')
+_AI = struct.Struct('<B')
+_COMPRESSED = 1
+# Тело короче этого не сжимаем: выигрыш меньше накладных расходов zlib
+_COMPRESS_MIN = 512
+_ACTIVE = 1
+_MONSTER = 2
+_SWAP = sys.byteorder != 'little'
+
+
+def _pack(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if _SWAP:
+        column.byteswap()
+    return column.tobytes()
+
+
+def _pack_column(values: list) -> bytes:
+    """Столбец целых в самом узком подходящем типе, с кодом типа впереди."""
+    for typecode in 'bhi':
+        try:
+            return typecode.encode() + _pack(typecode, values)
+        except OverflowError:
+            # array сам проверяет диапазон - это дешевле, чем min/max по всему столбцу
+            continue
+    return b'q' + _pack('q', values)
+
+
+class _Reader:
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data: bytes, offset: int = 0):
+        self.data = data
+        self.offset = offset
+
+    def raw(self, size: int) -> bytes:
+        end = self.offset + size
+        if end > len(self.data):
+            raise ValueError('Данные боя обрезаны')
+        chunk = self.data[self.offset:end]
+        self.offset = end
+        return chunk
+
+    def array(self, typecode: str, count: int) -> array:
+        column = array(typecode)
+        column.frombytes(self.raw(column.itemsize * count))
+        if _SWAP:
+            column.byteswap()
+        return column
+
+    def column(self, count: int) -> array:
+        typecode = self.raw(1).decode()
+        if typecode not in 'bhiq':
+            raise ValueError(f'Неизвестный тип столбца: {typecode!r}')
+        return self.array(typecode, count)
+
+
+def encode(battle_state: BattleState, with_events: bool = True) -> bytes:
+    strings: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    # Карты пишем в порядке to_dict (герои, затем монстры), чтобы from_dict и decode давали один и тот же порядок
+    cards = battle_state.heroes + battle_state.monsters
+    card_names = [intern(card.name) for card in cards]
+    skills = [skill for card in cards for skill in card.skills]
+    skill_names = [intern(skill.name) for skill in skills]
+    encoded_strings = [text.encode() for text in strings]
+    events = battle_state.log.values if with_events else array(EVENT_TYPECODE)
+    n_events = len(events) // EVENT_FIELDS
+
+    body = b''.join((
+        _COUNTS.pack(battle_state.round, len(cards), len(skills), len(encoded_strings), n_events),
+        _SEED.pack(battle_state.seed),
+        _AI.pack(AI_LEVELS.index(battle_state.ai)),
+        _pack('H', [len(text) for text in encoded_strings]),
+        b''.join(encoded_strings),
+        bytes((_ACTIVE if card.active else 0) | (_MONSTER if card.is_character_type is CardType.MONSTER else 0)
+              for card in cards),
+        _pack_column([card.id for card in cards] + card_names + [card.health for card in cards] +
+                     [card.attack for card in cards] + [card.initiative for card in cards] +
+                     [len(card.skills) for card in cards]),
+        _pack_column(skill_names + [skill.damage for skill in skills]),
+    ) + tuple(_pack_column(events[field::EVENT_FIELDS].tolist()) for field in range(EVENT_FIELDS)))
+
+    flags = 0
+    if len(body) >= _COMPRESS_MIN:
+        body = zlib.compress(body, 1)
+        flags |= _COMPRESSED
+    return _HEADER.pack(MAGIC, VERSION, flags) + body
+
+
+def decode(data: bytes) -> BattleState:
+    if len(data) < _HEADER.size:
+        raise ValueError('Данные боя обрезаны')
+    magic, version, flags = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Это не сериализованный BattleState')
+    if version != VERSION:
+        raise ValueError(f'Неизвестная версия формата боя: {version}')
+    body = data[_HEADER.size:]
+    if flags & _COMPRESSED:
+        body = zlib.decompress(body)
+
+    reader = _Reader(body)
+    round_, n_cards, n_skills, n_strings, n_events = _COUNTS.unpack(reader.raw(_COUNTS.size))
+    seed, = _SEED.unpack(reader.raw(_SEED.size))
+    ai_index, = _AI.unpack(reader.raw(_AI.size))
+    if ai_index >= len(AI_LEVELS):
+        raise ValueError(f'Неизвестный уровень ИИ монстров: {ai_index}')
+    ai = AI_LEVELS[ai_index]
+    lengths = reader.array('H', n_strings)
+    blob = reader.raw(sum(lengths))
+    strings: List[str] = []
+    offset = 0
+    for length in lengths:
+        strings.append(blob[offset:offset + length].decode())
+        offset += length
+
+    flags = reader.raw(n_cards)
+    cards = reader.column(6 * n_cards).tolist()
+    skills = reader.column(2 * n_skills).tolist()
+    events = array(EVENT_TYPECODE, bytes(8 * EVENT_FIELDS * n_events))
+    for field in range(EVENT_FIELDS):
+        column = reader.column(n_events)
+        events[field::EVENT_FIELDS] = column if column.typecode == EVENT_TYPECODE else array(EVENT_TYPECODE, column)
+
+    participants = []
+    skill_offset = 0
+    for i in range(n_cards):
+        skill_end = skill_offset + cards[5 * n_cards + i]
+        participants.append(CardState(
+            id=cards[i],
+            name=strings[cards[n_cards + i]],
+            health=cards[2 * n_cards + i],
+            attack=cards[3 * n_cards + i],
+            initiative=cards[4 * n_cards + i],
+            active=bool(flags[i] & _ACTIVE),
+            is_character_type=CardType.MONSTER if flags[i] & _MONSTER else CardType.HERO,
+            skills=[SkillState(name=strings[skills[j]], damage=skills[n_skills + j])
+                    for j in range(skill_offset, skill_end)],
+        ))
+        skill_offset = skill_end
+
+    return BattleState(participants=participants, log=BattleLog(events), round=round_, seed=seed, ai=ai)
+
+
+class BattleSessionSerializer:
+    """Сериализатор сессий (SESSION_SERIALIZER): JSON, но BattleState внутри сессии кодируется форматом выше."""
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), default=self._default).encode('latin-1')
+
+    def loads(self, data: bytes):
+        return json.loads(data.decode('latin-1'), object_hook=self._object_hook)
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, BattleState):
+            return {'__battle__': base64.b64encode(encode(value)).decode('ascii')}
+        raise TypeError(f'Объект типа {type(value).__name__} нельзя сохранить в сессии')
+
+    @staticmethod
+    def _object_hook(value):
+        if len(value) == 1 and '__battle__' in value:
+            return decode(base64.b64decode(value['__battle__']))
+        return value
@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from Cards.roster_io import FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгружает состав (героев, монстров и их скилы) в JSON-lines или CSV, читая карты пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Файл для выгрузки (по умолчанию - stdout)')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl', help='Формат выгрузки')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Карт в одной пачке чтения')
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['format'], chunk_size=options['chunk_size'])
+        if options['path'] is None:
+            sys.stdout.writelines(lines)
+            return
+        with open(options['path'], 'w', encoding='utf-8', newline='') as file:
+            file.writelines(lines)
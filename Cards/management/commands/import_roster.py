@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Cards.roster_io import FORMATS, RosterImportError, import_file
+
+
+class Command(BaseCommand):
+    help = ('Загружает набор карт (героев, монстров и их скилы) из файла JSON-lines или CSV пачками '
+            'через bulk_create/bulk_update. Весь файл загружается в одной транзакции')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу набора карт')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию - по расширению)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Карт в одной пачке')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rpartition('.')[2].lower()
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as file:
+                counts = import_file(file, file_format, chunk_size=options['chunk_size'])
+        except (OSError, RosterImportError) as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(f"Создано карт: {counts['created']}, обновлено: {counts['updated']} "
+                          f"за {time.perf_counter() - started:.2f} с")
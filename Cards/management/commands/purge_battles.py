@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Cards.battle_store import get_battle_store
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из хранилища боёв брошенные бои - те, что не менялись дольше BATTLE_STORE["TTL"] секунд. '
+            'Запускайте по расписанию (cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=float, default=None,
+                            help='Возраст последней записи боя в секундах (по умолчанию BATTLE_STORE["TTL"])')
+
+    def handle(self, *args, **options):
+        ttl = options['ttl']
+        if ttl is None:
+            ttl = getattr(settings, 'BATTLE_STORE', {}).get('TTL', DEFAULT_TTL)
+        if ttl <= 0:
+            raise CommandError('TTL должен быть положительным')
+        purged = get_battle_store().purge(ttl)
+        self.stdout.write(f'Удалено боёв: {len(purged)}')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Cards.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает статистику карт (CardStats) по архиву боёв, читая бои пачками. '
+            'Бои, записанные в архив во время пересчета, могут не попасть в итог - запускайте в тихое время')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Боёв в одной пачке чтения')
+
+    def handle(self, *args, **options):
+        def progress(count):
+            self.stdout.write(f'Боёв обработано: {count}')
+
+        started = time.perf_counter()
+        count = rebuild(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(f'Статистика пересчитана по {count} боям за {time.perf_counter() - started:.2f} с')
@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from Cards.benchmarks import suite
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарки горячего пути (движок боя и запросы start_game / game_play) на составах разного размера. '
+            'Запросы идут в отдельную тестовую базу. С --compare сравнивает с прошлым отчетом и падает при регрессии')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(suite.SIZES), help='Размеры составов')
+        parser.add_argument('--output', help='Сохранить отчет в JSON-файл')
+        parser.add_argument('--compare', help='JSON-отчет, с которым сравнивать')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Допустимый рост времени (доля, 0.25 = +25%%); рост числа запросов недопустим')
+        parser.add_argument('--engine-only', action='store_true', help='Только движок, без запросов и базы')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Не удалось прочитать {options["compare"]}: {exc}')
+
+        report = self.measure(options['sizes'], not options['engine_only'])
+        for size, metrics in report['results'].items():
+            self.stdout.write(f'{size} карт:')
+            for name, value in metrics.items():
+                old = baseline['results'].get(size, {}).get(name) if baseline else None
+                change = f'  (было {old:g})' if old is not None else ''
+                self.stdout.write(f'  {name:<28}{value:>12.1f}{change}' if isinstance(value, float)
+                                  else f'  {name:<28}{value:>12}{change}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if baseline is not None:
+            regressions = suite.compare(baseline, report, options['threshold'])
+            if regressions:
+                raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write(f'Регрессий нет (порог +{options["threshold"]:.0%})')
+
+    def measure(self, sizes, requests):
+        if not requests:
+            return suite.run(sizes, requests=False, progress=self.stderr.write)
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            return suite.run(sizes, progress=self.stderr.write)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
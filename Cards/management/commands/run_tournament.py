@@ -0,0 +1,52 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Cards.roster import load_roster
+
+
+class Command(BaseCommand):
+    help = 'Турнир Монте-Карло: все команды героев против всех команд монстров на нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team-size', type=int, default=1, help='Размер команды с каждой стороны')
+        parser.add_argument('--battles', type=int, default=100, help='Боёв на каждую пару команд')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--shard-size', type=int, default=64, help='Пар команд в одном шарде')
+        parser.add_argument('--workers', type=int, default=None, help='Число процессов (по умолчанию - все ядра)')
+        parser.add_argument('--results', default=None,
+                            help='JSON-lines файл с готовыми шардами; при повторном запуске турнир продолжится')
+        parser.add_argument('--fast', action='store_true', help='Векторный генератор NumPy вместо random.Random')
+        parser.add_argument('--max-turns', type=int, default=10_000)
+        parser.add_argument('--output', default=None, help='Куда записать сводный отчет (JSON)')
+
+    def handle(self, *args, **options):
+        try:
+            from Cards.tournament import Tournament
+        except ImportError as exc:
+            raise CommandError(f'Для турнира нужен NumPy (pip install "cardgame[simulation]"): {exc}')
+
+        tournament = Tournament(
+            load_roster(), team_size=options['team_size'], battles=options['battles'], seed=options['seed'],
+            shard_size=options['shard_size'], workers=options['workers'], results_path=options['results'],
+            exact=not options['fast'], max_turns=options['max_turns'],
+        )
+        if not tournament.matchups:
+            raise CommandError('Нужны хотя бы один герой и один монстр')
+
+        def progress(done, total):
+            self.stdout.write(f'Шардов готово: {done}/{total}')
+
+        started = time.perf_counter()
+        report = tournament.run(progress=progress)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Пар команд: {report['matchups_done']}/{report['matchups_total']}, "
+                          f"боёв: {report['battles']} за {elapsed:.2f} с")
+        self.stdout.write(f"Победы героев: {report['heroes_win_rate']:.1%}, "
+                          f"монстров: {report['monsters_win_rate']:.1%}, ходов в среднем: {report['mean_turns']:.1f}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчет записан в {options['output']}")
@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Cards.roster import load_roster
+
+
+class Command(BaseCommand):
+    help = 'Пакетная симуляция боёв текущего состава (векторный движок на NumPy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--battles', type=int, default=1000, help='Количество боёв')
+        parser.add_argument('--seed', type=int, default=0, help='Seed первого боя, бой i использует seed + i')
+        parser.add_argument('--max-turns', type=int, default=10_000, help='Ограничение на число ходов в бою')
+        parser.add_argument('--fast', action='store_true',
+                            help='Векторный генератор NumPy вместо random.Random на каждый бой '
+                                 '(быстрее, но не совпадает с BattleState по ходам)')
+        parser.add_argument('--verify', type=int, default=0,
+                            help='Сверить первые N боёв с BattleState (только без --fast)')
+        parser.add_argument('--json', action='store_true', help='Вывести отчет в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            from Cards import simulation
+        except ImportError as exc:
+            raise CommandError(f'Для симуляции нужен NumPy (pip install "cardgame[simulation]"): {exc}')
+
+        roster = load_roster()
+        if not roster:
+            raise CommandError('В базе нет героев и монстров')
+
+        started = time.perf_counter()
+        report = simulation.simulate(roster, options['battles'], seed=options['seed'],
+                                     exact=not options['fast'], max_turns=options['max_turns'])
+        elapsed = time.perf_counter() - started
+
+        if options['verify']:
+            if options['fast']:
+                raise CommandError('--verify работает только в точном режиме')
+            for index in range(min(options['verify'], options['battles'])):
+                expected = simulation.simulate_reference(roster, options['seed'] + index, options['max_turns'])
+                if report.battle(index) != expected:
+                    raise CommandError(f'Бой {index} расходится с BattleState: {report.battle(index)} != {expected}')
+
+        summary = report.summary()
+        summary['elapsed_seconds'] = elapsed
+        if options['json']:
+            self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"Боёв: {summary['battles']} (завершено {summary['finished']}) за {elapsed:.2f} с")
+        self.stdout.write(f"Победы героев: {summary['win_rate']['heroes']:.1%}, "
+                          f"монстров: {summary['win_rate']['monsters']:.1%}")
+        self.stdout.write(f"Ходов до конца: {summary['turns']}")
+        self.stdout.write(f"Раундов: {summary['rounds']}")
+        self.stdout.write(f"Урон героев: {summary['damage']['heroes']}")
+        self.stdout.write(f"Урон монстров: {summary['damage']['monsters']}")
+        for card in summary['damage']['per_card']:
+            self.stdout.write(f"  {card['type']} {card['name']}: {card['mean']:.1f}")
+        if options['verify']:
+            self.stdout.write(self.style.SUCCESS(f"Первые {options['verify']} боёв совпали с BattleState"))
@@ -0,0 +1,208 @@
+# Cards/metrics.py
+"""Замеры фаз запроса: заголовок Server-Timing и гистограммы в текстовом формате Prometheus.
+
+Код отмечает фазы так:
+
+    with phase('turn'):
+        ...
+
+ServerTimingMiddleware на время запроса заводит Timing (в contextvar, поэтому замеры видны и из
+sync_to_async), суммирует в нем длительность фаз и SQL-запросы и отдает их заголовком
+
+    Server-Timing: session_load;dur=0.41, decode;dur=0.12, turn;dur=0.05, ..., db;dur=0.9;desc="3 queries", total;dur=4.2
+
+Те же длительности попадают в гистограммы процесса, которые отдает metrics_view (/metrics/) -
+только адресам из METRICS['ALLOWED_IPS']. Гистограммы у каждого процесса свои.
+
+Фазы: session_load / session_save (Cards/sessions.py), store_read / store_write и decode / encode
+(хранилище боёв и его бинарный кодек), turn (ход в run_battle_action), render (шаблон), db (все SQL-запросы
+синхронного запроса) и total. При METRICS['ENABLED'] = False middleware не подключается, а phase()
+стоит одного чтения contextvar.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+# Верхние границы корзин гистограмм, секунды
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics_settings() -> Dict:
+    return {'ENABLED': False, 'ALLOWED_IPS': ('127.0.0.1', '::1'), **getattr(settings, 'METRICS', {})}
+
+
+class Timing:
+    """Замеры одного запроса: суммарная длительность каждой фазы и число SQL-запросов."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.open = set()
+        self.queries = 0
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('db', time.perf_counter() - started)
+
+    def header(self) -> str:
+        parts = []
+        for name, seconds in self.phases.items():
+            desc = f';desc="{self.queries} queries"' if name == 'db' else ''
+            parts.append(f'{name};dur={seconds * 1e3:.2f}{desc}')
+        return ', '.join(parts)
+
+
+_current: ContextVar[Optional[Timing]] = ContextVar('cards_timing', default=None)
+_NOOP = nullcontext()
+
+
+class _Phase:
+    __slots__ = ('timing', 'name', 'started')
+
+    def __init__(self, timing: Timing, name: str):
+        self.timing = timing
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        # Вложенная фаза с тем же именем (save -> create -> save у сессий) не считается дважды
+        if self.name not in self.timing.open:
+            self.timing.open.add(self.name)
+            self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.started is not None:
+            self.timing.add(self.name, time.perf_counter() - self.started)
+            self.timing.open.discard(self.name)
+
+
+def phase(name: str):
+    """Контекстный менеджер замера фазы name; вне замеряемого запроса ничего не делает."""
+    timing = _current.get()
+    return _NOOP if timing is None else _Phase(timing, name)
+
+
+class Histogram:
+    """Гистограмма Prometheus с метками label_names. Потокобезопасна."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # метки -> [счетчики корзин (+Inf последним), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            label_text = ','.join(f'{key}="{value}"' for key, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+phase_seconds = Histogram('cards_phase_seconds', 'Длительность фаз запроса', ('view', 'phase'))
+request_queries = Histogram('cards_request_queries', 'SQL-запросов на запрос', ('view',),
+                            buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+
+
+def record(view: str, timing: Timing, with_queries: bool = True):
+    for name, seconds in timing.phases.items():
+        phase_seconds.observe((view, name), seconds)
+    if with_queries:
+        request_queries.observe((view,), timing.queries)
+
+
+def render_metrics() -> str:
+    return phase_seconds.render() + request_queries.render()
+
+
+class ServerTimingMiddleware:
+    """Ставьте первым в MIDDLEWARE, чтобы в замер попали сессия и остальные middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = Timing()
+        token = _current.set(timing)
+        try:
+            with connection.execute_wrapper(timing.count_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing, with_queries=True)
+
+    async def __acall__(self, request):
+        # SQL-запросы асинхронных view идут в других потоках - их не считаем
+        timing = Timing()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing, with_queries=False)
+
+    @staticmethod
+    def finish(request, response, timing: Timing, with_queries: bool):
+        timing.add('total', time.perf_counter() - timing.started)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        if view != 'metrics':
+            record(view, timing, with_queries)
+        response['Server-Timing'] = timing.header()
+        return response
+
+
+def metrics_view(request):
+    config = metrics_settings()
+    if not config['ENABLED'] or request.META.get('REMOTE_ADDR') not in config['ALLOWED_IPS']:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:46
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cards', '0005_hero_is_character_type_monster_is_character_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='monster',
+            name='is_character_type',
+            field=models.CharField(choices=[('HERO', 'Hero'), ('MONSTER', 'Monster')], default='MONSTER', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='skill',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.CreateModel(
+            name='Battle',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('finished_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('winner', models.CharField(choices=[('HERO', 'Hero'), ('MONSTER', 'Monster')], max_length=10)),
+                ('rounds', models.PositiveIntegerField(default=1)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('seed', models.BigIntegerField(blank=True, null=True)),
+                ('cards', models.JSONField(blank=True, default=list)),
+                ('battle_log', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-finished_at'], name='battle_finished_idx'), models.Index(fields=['winner', '-finished_at'], name='battle_winner_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BattleParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('card_type', models.CharField(choices=[('HERO', 'Hero'), ('MONSTER', 'Monster')], max_length=10)),
+                ('card_id', models.IntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('health', models.IntegerField()),
+                ('won', models.BooleanField()),
+                ('finished_at', models.DateTimeField()),
+                ('battle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='Cards.battle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['card_type', 'card_id', '-finished_at'], name='participant_card_idx'), models.Index(fields=['card_type', 'card_id', 'won', '-finished_at'], name='participant_outcome_idx')],
+                'constraints': [models.UniqueConstraint(fields=('battle', 'card_type', 'card_id'), name='battle_participant_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cards', '0006_battle_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('card_type', models.CharField(choices=[('HERO', 'Hero'), ('MONSTER', 'Monster')], max_length=10)),
+                ('card_id', models.IntegerField()),
+                ('battles', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('damage_dealt', models.BigIntegerField(default=0)),
+                ('rounds_survived', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'card stats',
+                'constraints': [models.UniqueConstraint(fields=('card_type', 'card_id'), name='card_stats_unique')],
+            },
+        ),
+    ]
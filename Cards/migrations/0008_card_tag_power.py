@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:58
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cards', '0007_card_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hero',
+            name='power',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('health'), '+', django.db.models.expressions.CombinedExpression(models.F('attack'), '*', models.Value(10))), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='hero',
+            name='tag',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='monster',
+            name='power',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('health'), '+', django.db.models.expressions.CombinedExpression(models.F('attack'), '*', models.Value(10))), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='monster',
+            name='tag',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='hero',
+            index=models.Index(fields=['tag', '-power'], name='hero_tag_power_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hero',
+            index=models.Index(fields=['-power'], name='hero_power_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monster',
+            index=models.Index(fields=['tag', '-power'], name='monster_tag_power_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monster',
+            index=models.Index(fields=['-power'], name='monster_power_idx'),
+        ),
+    ]
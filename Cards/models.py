@@ -1,5 +1,10 @@
 # models.py
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
+from .battle_events import BattleLog
 
 
 class CharacterType(models.TextChoices):
@@ -7,6 +12,11 @@ class CharacterType(models.TextChoices):
     MONSTER = 'MONSTER', 'Monster'
 
 
+# Сила карты для набора команды под бюджет (Cards/teams.py): здоровье плюс вес атаки
+POWER_ATTACK_WEIGHT = 10
+POWER = models.F('health') + models.F('attack') * POWER_ATTACK_WEIGHT
+
+
 class Skill(models.Model):
     name = models.CharField(max_length=100)
     damage = models.IntegerField()
@@ -27,6 +37,15 @@ class Hero(models.Model):
         default=CharacterType.HERO
     )
     skills = models.ManyToManyField(Skill, blank=True)
+    # Метка набора карт (например, пак контента) - по ней собирается команда для боя
+    tag = models.CharField(max_length=50, blank=True, default='')
+    power = models.GeneratedField(expression=POWER, output_field=models.IntegerField(), db_persist=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tag', '-power'], name='hero_tag_power_idx'),
+            models.Index(fields=['-power'], name='hero_power_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -44,10 +63,100 @@ class Monster(models.Model):
         default=CharacterType.MONSTER
     )
     skills = models.ManyToManyField(Skill, blank=True)
+    # Метка набора карт (например, пак контента) - по ней собирается команда для боя
+    tag = models.CharField(max_length=50, blank=True, default='')
+    power = models.GeneratedField(expression=POWER, output_field=models.IntegerField(), db_persist=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tag', '-power'], name='monster_tag_power_idx'),
+            models.Index(fields=['-power'], name='monster_power_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
 class Battle(models.Model):
-    battle_log = models.TextField(blank=True, default="")
\ No newline at end of file
+    """Завершенный бой. Пишется пачками из фоновой очереди (см. Cards/archive.py)."""
+    # id боя из хранилища боёв (uuid), поэтому строки можно вставлять bulk_create без возврата ключей
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    finished_at = models.DateTimeField(default=timezone.now)
+    winner = models.CharField(max_length=10, choices=CharacterType.choices)
+    rounds = models.PositiveIntegerField(default=1)
+    events = models.PositiveIntegerField(default=0)
+    seed = models.BigIntegerField(null=True, blank=True)
+    # Карты в конце боя (CardState.to_dict)
+    cards = models.JSONField(default=list, blank=True)
+    # События боя в формате JSON-lines, по строке на событие (см. Cards/battle_events.py)
+    battle_log = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-finished_at'], name='battle_finished_idx'),
+            models.Index(fields=['winner', '-finished_at'], name='battle_winner_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} ({self.winner})'
+
+    def get_events(self) -> BattleLog:
+        return BattleLog.from_jsonl(self.battle_log)
+
+    def set_events(self, log: BattleLog):
+        self.battle_log = log.to_jsonl()
+
+
+class BattleParticipant(models.Model):
+    """Карта в завершенном бою - для выборки истории по карте.
+
+    finished_at и won повторяют данные боя, чтобы выборка по карте и исходу шла по одному индексу.
+    """
+    battle = models.ForeignKey(Battle, on_delete=models.CASCADE, related_name='participants')
+    card_type = models.CharField(max_length=10, choices=CharacterType.choices)
+    card_id = models.IntegerField()
+    name = models.CharField(max_length=100)
+    health = models.IntegerField()
+    won = models.BooleanField()
+    finished_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['battle', 'card_type', 'card_id'], name='battle_participant_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['card_type', 'card_id', '-finished_at'], name='participant_card_idx'),
+            models.Index(fields=['card_type', 'card_id', 'won', '-finished_at'], name='participant_outcome_idx'),
+        ]
+
+
+class CardStats(models.Model):
+    """Сводная статистика карты по архиву боёв. Обновляется приращениями при записи боёв (Cards/stats.py)."""
+    card_type = models.CharField(max_length=10, choices=CharacterType.choices)
+    card_id = models.IntegerField()
+    battles = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    damage_dealt = models.BigIntegerField(default=0)
+    # Сумма раундов, которые карта прожила в каждом бою (до гибели или до конца боя)
+    rounds_survived = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'card stats'
+        constraints = [
+            models.UniqueConstraint(fields=['card_type', 'card_id'], name='card_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.card_type}:{self.card_id}'
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.battles if self.battles else 0.0
+
+    @property
+    def avg_damage(self) -> float:
+        return self.damage_dealt / self.battles if self.battles else 0.0
+
+    @property
+    def avg_survival_rounds(self) -> float:
+        return self.rounds_survived / self.battles if self.battles else 0.0
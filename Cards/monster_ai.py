@@ -0,0 +1,275 @@
+# Cards/monster_ai.py
+"""ИИ монстров: уровни сложности боя (BattleState.ai).
+
+    easy    - случайный живой герой и случайный скил (прежнее поведение, расход случайных чисел тот же)
+    normal  - жадный выбор: лучший исход собственного удара (поиск глубиной 1)
+    hard    - expectimax с итеративным углублением: монстры выбирают лучший ход, ход героя - среднее
+              по его целям (при большом числе целей - по CHANCE_WIDTH равномерно выбранным)
+
+Перебор идет не по копиям CardState, а по SearchState - здоровью и отметкам хода в плоских списках.
+Ход применяется на месте (apply) и откатывается по журналу изменений (undo), поэтому узел поиска стоит
+O(1) плюс перебор живых целей. SearchState строится один раз на фазу монстров (MonsterPlanner), выбранные
+ходы применяются к нему так же, как к бою.
+
+Бюджет - только число узлов, без срока по времени: ход не зависит от загрузки машины, и бой (и Replay)
+воспроизводим. PHASE_NODES узлов фазы делятся поровну на ее монстров - походивших с последнего хода героя
+и тех, кто ходит до ближайшего героя. Доля хода зависит только от состояния боя, поэтому ход один и тот же,
+проводится ли фаза целиком (resolve_monster_phase) или по одному ходу (process_monster_turn). Жадный выбор
+(глубина 1) считается всегда и без узлов; более глубокий поиск начинается, только если следующая глубина
+по оценке укладывается в узлы хода, поэтому в рейде с сотнями монстров ходы остаются жадными.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+AI_LEVELS = ('easy', 'normal', 'hard')
+DEFAULT_AI = 'easy'
+
+# Бюджет одной фазы монстров (все ходы между ходами героев)
+PHASE_NODES = 2000
+# Если на ход приходится меньше узлов - только жадный выбор. Глубина 1 в узлы не входит
+MIN_NODES = 64
+MAX_DEPTH = 8
+# Сколько целей героя рассматривать в узле-ожидании
+CHANCE_WIDTH = 4
+WIN = 1000.0
+
+HERO_SIDE = 0
+MONSTER_SIDE = 1
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+def best_option(card) -> Tuple[str, Optional[int], int]:
+    """Самое сильное действие карты: (действие, индекс скила, урон). Других эффектов у действий нет."""
+    best = ('attack', None, card.attack)
+    for index, skill in enumerate(card.skills):
+        if skill.damage > best[2]:
+            best = ('skill', index, skill.damage)
+    return best
+
+
+class SearchState:
+    """Бой для перебора: карты в порядке хода, здоровье и раунд, в котором карта последний раз ходила."""
+    __slots__ = ('side', 'health', 'acted', 'damage', 'sides', 'hp', 'alive', 'hp0', 'alive0',
+                 'cursor', 'round', 'trail')
+
+    def __init__(self, participants: Sequence, round_: int):
+        self.side = [MONSTER_SIDE if card.is_character_type == 'MONSTER' else HERO_SIDE for card in participants]
+        self.health = [card.health for card in participants]
+        # Карта еще ходит в раунде r, если acted < r: походившие отмечены текущим раундом
+        self.acted = [round_ - 1 if card.active else round_ for card in participants]
+        self.damage = [best_option(card)[2] for card in participants]
+        self.sides = ([], [])
+        for index, side in enumerate(self.side):
+            self.sides[side].append(index)
+        self.hp = [sum(max(self.health[i], 0) for i in side) for side in self.sides]
+        self.alive = [sum(1 for i in side if self.health[i] > 0) for side in self.sides]
+        self.rebase()
+        # Все карты до cursor в этом раунде уже походили или мертвы
+        self.cursor = 0
+        self.round = round_
+        self.trail: List[tuple] = []
+
+    def rebase(self):
+        """Точка отсчета оценки - текущее здоровье и число живых карт сторон."""
+        self.hp0 = [max(1, hp) for hp in self.hp]
+        self.alive0 = [max(1, alive) for alive in self.alive]
+
+    def next_actor(self) -> Tuple[int, int]:
+        """(позиция, раунд) следующей ходящей карты, как у InitiativeScheduler; (-1, раунд), если ходить некому."""
+        health, acted, round_ = self.health, self.acted, self.round
+        for index in range(self.cursor, len(health)):
+            if health[index] > 0 and acted[index] < round_:
+                return index, round_
+        for index in range(len(health)):
+            if health[index] > 0:
+                return index, round_ + 1
+        return -1, round_
+
+    def monsters_ahead(self) -> int:
+        """Сколько ходов монстров подряд до ближайшего хода героя."""
+        health, acted, side = self.health, self.acted, self.side
+        count = 0
+        for round_, start in ((self.round, self.cursor), (self.round + 1, 0)):
+            for index in range(start, len(health)):
+                if health[index] > 0 and acted[index] < round_:
+                    if side[index] == HERO_SIDE:
+                        return count
+                    count += 1
+        return count
+
+    def targets(self, side: int) -> List[int]:
+        health = self.health
+        return [index for index in self.sides[side] if health[index] > 0]
+
+    def _set_health(self, index: int, value: int):
+        side = self.side[index]
+        old = self.health[index]
+        self.hp[side] += max(value, 0) - max(old, 0)
+        self.alive[side] += (value > 0) - (old > 0)
+        self.health[index] = value
+
+    def apply(self, actor: int, round_: int, target: int, damage: int):
+        self.trail.append((actor, self.acted[actor], self.cursor, self.round, target, self.health[target]))
+        self.acted[actor] = round_
+        self.round = round_
+        self.cursor = actor + 1
+        self._set_health(target, self.health[target] - damage)
+
+    def undo(self):
+        actor, acted, cursor, round_, target, health = self.trail.pop()
+        self._set_health(target, health)
+        self.acted[actor] = acted
+        self.cursor = cursor
+        self.round = round_
+
+    def is_over(self) -> bool:
+        return not self.alive[HERO_SIDE] or not self.alive[MONSTER_SIDE]
+
+    def evaluate(self, depth_left: int = 0) -> float:
+        """Оценка для монстров. Победу раньше (больше оставшейся глубины) ценим выше."""
+        if not self.alive[HERO_SIDE]:
+            return WIN + depth_left
+        if not self.alive[MONSTER_SIDE]:
+            return -WIN - depth_left
+        hp, hp0, alive, alive0 = self.hp, self.hp0, self.alive, self.alive0
+        return (hp[MONSTER_SIDE] / hp0[MONSTER_SIDE] - hp[HERO_SIDE] / hp0[HERO_SIDE]
+                + 0.5 * (alive[MONSTER_SIDE] / alive0[MONSTER_SIDE] - alive[HERO_SIDE] / alive0[HERO_SIDE]))
+
+
+class MonsterPlanner:
+    """Выбор ходов монстров одной фазы. participants - карты боя в порядке хода (BattleState.participants),
+    acted - сколько монстров уже походило в этой фазе (подряд после последнего хода героя).
+    """
+
+    def __init__(self, participants: Sequence, round_: int, level: str, phase_nodes: int = PHASE_NODES,
+                 acted: int = 0):
+        self.cards = participants
+        self.state = SearchState(participants, round_)
+        self.max_depth = 1 if level == 'normal' else MAX_DEPTH
+        self.phase_nodes = phase_nodes
+        self.acted = acted
+        # Монстров в фазе: acted + monsters_ahead() не меняется от хода к ходу, пока не изменится число
+        # живых героев, поэтому пересчитывается вместе со списком героев
+        self._phase = 1
+        # Статистика фазы: узлов всего и самая большая законченная глубина
+        self.searched = 0
+        self.depth_reached = 0
+        self._nodes = 0
+        self._budget = 0
+        # Живые герои для ходов фазы (состав меняется, только когда кто-то из них гибнет)
+        # и нижняя граница их здоровья: в фазе монстров здоровье героев только убывает
+        self._alive_heroes = -1
+        self._heroes: List[int] = []
+        self._weakest = 0
+
+    def choose(self, monster) -> Tuple[object, str, Optional[int]]:
+        """Ход монстра monster (он должен ходить сейчас): (цель, действие, индекс скила). Ход сразу применяется."""
+        state = self.state
+        actor, round_ = state.next_actor()
+        if actor < 0 or self.cards[actor] is not monster:
+            raise ValueError('MonsterPlanner разошелся с боем')
+        action, arg, damage = best_option(monster)
+        if self._alive_heroes != state.alive[HERO_SIDE]:
+            self._alive_heroes = state.alive[HERO_SIDE]
+            self._heroes = state.targets(HERO_SIDE)
+            self._weakest = min(map(state.health.__getitem__, self._heroes))
+            self._phase = max(1, self.acted + state.monsters_ahead())
+        # Оценка отсчитывается от позиции перед ходом, а не от начала фазы: так же, как у планировщика,
+        # созданного на один этот ход
+        state.rebase()
+        target = self._search(actor, round_, self._heroes, damage, self.phase_nodes // self._phase)
+        self.searched += self._nodes
+        self.acted += 1
+        state.apply(actor, round_, target, damage)
+        state.trail.clear()
+        self._weakest = min(self._weakest, state.health[target])
+        return self.cards[target], action, arg
+
+    def _greedy(self, targets: List[int], damage: int) -> int:
+        """Лучшая цель по оценке сразу после удара (как поиск глубиной 1), без применения ходов.
+
+        Полный удар по любой цели, которую не убить, оценивается одинаково, поэтому сравниваются лишь
+        первая такая цель и самая здоровая из тех, что умрут (за убийство - бонус оценки).
+        """
+        state = self.state
+        health = state.health
+        # Обычно убить некого, и это видно без перебора целей
+        if self._weakest > damage:
+            return targets[0]
+        killable = [target for target in targets if health[target] <= damage]
+        if not killable:
+            # Нижняя граница здоровья устарела (героя подлечили)
+            return targets[0]
+        kill = max(killable, key=health.__getitem__)
+        if len(killable) == len(targets) or state.alive[HERO_SIDE] == 1:
+            return kill
+        hp0, alive0 = state.hp0[HERO_SIDE], state.alive0[HERO_SIDE]
+        if max(health[kill], 0) / hp0 + 0.5 / alive0 > damage / hp0:
+            return kill
+        return next(target for target in targets if health[target] > damage)
+
+    def _search(self, actor: int, round_: int, targets: List[int], damage: int, budget: int) -> int:
+        best = self._greedy(targets, damage)
+        self._nodes, self._budget = 0, budget
+        if (self.max_depth == 1 or len(targets) == 1 or budget < MIN_NODES
+                or budget < len(targets) * (1 + self._branching(actor, round_, targets[0], damage))):
+            return best
+        previous = len(targets)
+        for depth in range(2, self.max_depth + 1):
+            started = self._nodes
+            try:
+                scores = [self._child(actor, round_, target, damage, depth - 1) for target in targets]
+            except _OutOfBudget:
+                # Ходы уже откатились в _child, остается результат прошлой глубины
+                break
+            best_score = max(scores)
+            best = targets[scores.index(best_score)]
+            self.depth_reached = max(self.depth_reached, depth)
+            cost = self._nodes - started
+            # Следующая глубина примерно во столько же раз дороже этой: не начинаем ее, если не уложится
+            if abs(best_score) >= WIN or self._nodes + cost * cost / max(1, previous) > budget:
+                break
+            previous = cost
+        return best
+
+    def _branching(self, actor: int, round_: int, target: int, damage: int) -> int:
+        """Сколько ходов у карты, которая ходит после этого хода (для оценки стоимости глубины 2)."""
+        state = self.state
+        state.apply(actor, round_, target, damage)
+        try:
+            if state.is_over():
+                return 0
+            following = state.next_actor()[0]
+            if state.side[following] == MONSTER_SIDE:
+                return state.alive[HERO_SIDE]
+            return min(CHANCE_WIDTH, state.alive[MONSTER_SIDE])
+        finally:
+            state.undo()
+
+    def _child(self, actor: int, round_: int, target: int, damage: int, depth: int) -> float:
+        state = self.state
+        state.apply(actor, round_, target, damage)
+        try:
+            return self._value(depth)
+        finally:
+            state.undo()
+
+    def _value(self, depth: int) -> float:
+        self._nodes += 1
+        if self._nodes > self._budget:
+            raise _OutOfBudget
+        state = self.state
+        if depth == 0 or state.is_over():
+            return state.evaluate(depth)
+        actor, round_ = state.next_actor()
+        damage = state.damage[actor]
+        if state.side[actor] == MONSTER_SIDE:
+            return max(self._child(actor, round_, target, damage, depth - 1)
+                       for target in state.targets(HERO_SIDE))
+        targets = state.targets(MONSTER_SIDE)
+        if len(targets) > CHANCE_WIDTH:
+            step = len(targets) / CHANCE_WIDTH
+            targets = [targets[int(k * step)] for k in range(CHANCE_WIDTH)]
+        return sum(self._child(actor, round_, target, damage, depth - 1) for target in targets) / len(targets)
@@ -0,0 +1,68 @@
+# Cards/replay.py
+"""Воспроизведение боя по зерну, исходному составу и ходам героев.
+
+Случайность боя задается зерном и позицией в журнале (BattleState.turn_rng), а ходы монстров
+однозначно следуют из ходов героев. Поэтому вместо снимков состояния достаточно хранить Replay:
+build() восстанавливает бой, build(turns=N) перематывает его до N-го хода героя, ничего не рендеря.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .battle_events import ATTACK, BattleLog
+from .battle_state import BattleState, CardState, CardType, copy_roster
+from .monster_ai import DEFAULT_AI
+
+# (id героя, id цели, действие 'attack' или 'skill', индекс скила)
+HeroAction = Tuple[int, int, str, Optional[int]]
+
+
+def hero_actions(log: BattleLog) -> List[HeroAction]:
+    """Ходы героев, записанные в журнале боя."""
+    return [
+        (event.actor_id, event.target_id, 'attack', None) if event.skill == ATTACK else
+        (event.actor_id, event.target_id, 'skill', event.skill)
+        for event in log if event.actor_type == CardType.HERO
+    ]
+
+
+@dataclass
+class Replay:
+    seed: int
+    roster: List[CardState]
+    actions: List[HeroAction] = field(default_factory=list)
+    ai: str = DEFAULT_AI
+
+    @classmethod
+    def record(cls, battle_state: BattleState, roster: List[CardState]) -> "Replay":
+        """Replay боя battle_state. roster - состав, с которым бой начинался (до первого хода)."""
+        return cls(seed=battle_state.seed, roster=copy_roster(roster), actions=hero_actions(battle_state.log),
+                   ai=battle_state.ai)
+
+    def build(self, turns: Optional[int] = None) -> BattleState:
+        """Бой после первых turns ходов героев (после всех, если turns не задан).
+
+        ValueError, если записанный ход героя недопустим: бой разошелся с записью.
+        """
+        battle_state = BattleState.start(copy_roster(self.roster), seed=self.seed, ai=self.ai)
+        for index, (hero_id, target_id, action, skill_index) in enumerate(self.actions[:turns]):
+            error = battle_state.hero_turn(hero_id, target_id, action, skill_index)
+            if error:
+                raise ValueError(f'Повтор боя разошелся на ходе героя {index}: {error}')
+        return battle_state
+
+    def to_dict(self) -> Dict:
+        return {
+            'seed': self.seed,
+            'roster': [card.to_dict() for card in self.roster],
+            'actions': [list(action) for action in self.actions],
+            'ai': self.ai,
+        }
+
+    @classmethod
+    def from_dict(cls, data) -> "Replay":
+        return cls(
+            seed=data['seed'],
+            roster=[CardState.from_dict(card_data) for card_data in data['roster']],
+            actions=[tuple(action) for action in data.get('actions', [])],
+            ai=data.get('ai', DEFAULT_AI),
+        )
@@ -0,0 +1,95 @@
+# Cards/roster.py
+"""Загрузка состава (героев и монстров со скилами) за постоянное число запросов.
+
+Общий слой для представлений игры, API и офлайн-инструментов: карты выбираются с only() по нужным
+полям, а скилы подтягиваются одним prefetch_related на каждую модель вместо запроса на каждую карту.
+"""
+import time
+from typing import List
+
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from .battle_state import CardState, SkillState
+from .models import Hero, Monster, Skill
+
+ROSTER_CACHE = 'roster'
+VERSION_KEY = 'roster:version'
+MODIFIED_KEY = 'roster:modified'
+CARD_FIELDS = ('id', 'name', 'health', 'attack', 'initiative', 'active', 'is_character_type', 'tag', 'power')
+
+
+def skills_prefetch() -> Prefetch:
+    return Prefetch('skills', queryset=Skill.objects.only('id', 'name', 'damage'))
+
+
+def card_queryset(model):
+    """Queryset героев или монстров, из которого можно собрать CardState без дополнительных запросов."""
+    return model.objects.only(*CARD_FIELDS).prefetch_related(skills_prefetch()).order_by('id')
+
+
+def card_state(card) -> CardState:
+    return CardState(
+        id=card.id,
+        name=card.name,
+        health=card.health,
+        attack=card.attack,
+        initiative=card.initiative,
+        active=card.active,
+        is_character_type=card.is_character_type,
+        skills=[SkillState(name=skill.name, damage=skill.damage) for skill in card.skills.all()],
+    )
+
+
+def load_roster(heroes=None, monsters=None) -> List[CardState]:
+    """Все герои и монстры из БД в виде CardState (герои первыми) - два запроса на модель."""
+    heroes = card_queryset(Hero) if heroes is None else heroes
+    monsters = card_queryset(Monster) if monsters is None else monsters
+    return [card_state(card) for card in heroes] + [card_state(card) for card in monsters]
+
+
+def roster_version() -> int:
+    """Версия состава. Увеличивается при любом изменении героев, монстров и скилов (см. Cards/signals.py)."""
+    cache = caches[ROSTER_CACHE]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Начинаем со времени, а не с 1: если ключ версии вытеснят из кэша, старые снимки не подхватятся
+        cache.add(VERSION_KEY, time.time_ns())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def roster_modified() -> float:
+    """Время (unix) последнего изменения состава, насколько о нем знает кэш, - для Last-Modified."""
+    cache = caches[ROSTER_CACHE]
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        # Время потеряно вместе с кэшем: честнее сказать "только что", чем отдать слишком старую дату
+        cache.add(MODIFIED_KEY, time.time(), None)
+        modified = cache.get(MODIFIED_KEY)
+    return modified
+
+
+def bump_roster_version():
+    cache = caches[ROSTER_CACHE]
+    cache.set(MODIFIED_KEY, time.time(), None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        roster_version()
+
+
+def cached_roster() -> List[CardState]:
+    """Снимок состава из кэша. Каждый вызов возвращает свою копию карт, ее можно отдавать в бой.
+
+    Снимок собирается один раз на версию состава; кэш хранит его сериализованным, так что чтение
+    состава - это распаковка готового шаблона без запросов к БД. Команды боя по умолчанию кэшируются
+    так же (Cards/teams.py, default_team).
+    """
+    cache = caches[ROSTER_CACHE]
+    key = f'roster:snapshot:{roster_version()}'
+    roster = cache.get(key)
+    if roster is None:
+        roster = load_roster()
+        cache.set(key, roster, None)
+    return roster
@@ -0,0 +1,203 @@
+# Cards/roster_io.py
+"""Потоковый импорт и экспорт состава (героев, монстров и их скилов) в JSON-lines и CSV.
+
+JSON-lines - по карте на строку:
+
+    {"type": "HERO", "id": 1, "name": "Герой 1", "health": 100, "attack": 15, "initiative": 7,
+     "active": true, "tag": "", "skills": [{"name": "Мощный удар", "damage": 25}]}
+
+CSV - колонки CSV_FIELDS, скилы в одной ячейке JSON-списком, как в JSON-lines:
+'[{"name": "Мощный удар", "damage": 25}]' (кавычки и запятые экранирует модуль csv).
+
+Файл читается и пишется пачками по chunk_size карт, поэтому память не зависит от его размера.
+Скил определяется парой (имя, урон), как в create_initial_data. Карта с id существующей карты
+того же типа обновляется (и ее скилы заменяются), остальные создаются заново - id из файла
+для новых карт не используется.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.db import transaction
+
+from .models import CharacterType, Hero, Monster, Skill
+from .roster import bump_roster_version, card_queryset
+
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = ('type', 'id', 'name', 'health', 'attack', 'initiative', 'active', 'tag', 'skills')
+CARD_MODELS = {CharacterType.HERO: Hero, CharacterType.MONSTER: Monster}
+CARD_FIELDS = ('name', 'health', 'attack', 'initiative', 'active', 'tag')
+
+
+class RosterImportError(ValueError):
+    pass
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('', '0', 'false', 'no')
+
+
+def clean_record(line: int, data: Dict) -> Dict:
+    """Проверенная карта: type, id (или None), поля карты и skills - список пар (имя, урон)."""
+    try:
+        card_type = CharacterType(str(data.get('type', CharacterType.HERO)).upper())
+        skills = data.get('skills') or []
+        if isinstance(skills, str):
+            # Ячейка CSV
+            skills = json.loads(skills) if skills.strip() else []
+        card_id = data.get('id')
+        return {
+            'type': card_type,
+            'id': int(card_id) if card_id not in (None, '') else None,
+            'name': str(data['name'])[:100],
+            'health': int(data['health']),
+            'attack': int(data['attack']),
+            'initiative': int(data['initiative']),
+            'active': _parse_bool(data.get('active', True)),
+            'tag': str(data.get('tag') or '')[:50],
+            'skills': [(str(skill['name'])[:100], int(skill['damage'])) for skill in skills],
+        }
+    except (KeyError, TypeError, ValueError) as exc:
+        raise RosterImportError(f'Строка {line}: некорректная карта ({exc!r})') from exc
+
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[Dict]:
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            raise RosterImportError(f'Строка {line_no}: не JSON ({exc})') from exc
+        yield clean_record(line_no, data)
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Dict]:
+    reader = csv.DictReader(lines)
+    for data in reader:
+        yield clean_record(reader.line_num, data)
+
+
+def read_records(lines: Iterable[str], file_format: str) -> Iterator[Dict]:
+    if file_format not in FORMATS:
+        raise RosterImportError(f'Неизвестный формат {file_format!r}, нужен один из {FORMATS}')
+    return read_csv(lines) if file_format == 'csv' else read_jsonl(lines)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _skill_ids(keys) -> Dict[Tuple[str, int], int]:
+    """id скилов по парам (имя, урон); недостающие скилы создаются одним bulk_create."""
+    ids = {}
+    for skill_id, name, damage in (Skill.objects.filter(name__in={name for name, _ in keys})
+                                   .order_by('-id').values_list('id', 'name', 'damage')):
+        ids[name, damage] = skill_id
+    missing = [Skill(name=name, damage=damage) for name, damage in keys if (name, damage) not in ids]
+    for skill in Skill.objects.bulk_create(missing):
+        ids[skill.name, skill.damage] = skill.pk
+    return ids
+
+
+def _import_chunk(records: List[Dict], counts: Dict[str, int]):
+    skill_ids = _skill_ids({skill for record in records for skill in record['skills']})
+    for card_type, model in CARD_MODELS.items():
+        typed = [record for record in records if record['type'] == card_type]
+        if not typed:
+            continue
+        known = set(model.objects.filter(id__in=[r['id'] for r in typed if r['id'] is not None])
+                    .values_list('id', flat=True))
+        updates = [record for record in typed if record['id'] in known]
+        creates = [record for record in typed if record['id'] not in known]
+
+        cards = model.objects.bulk_create([
+            model(is_character_type=card_type, **{field: record[field] for field in CARD_FIELDS})
+            for record in creates
+        ])
+        if any(card.pk is None for card in cards):
+            raise RosterImportError('База не вернула id созданных карт - импорт скилов невозможен')
+        model.objects.bulk_update([
+            model(id=record['id'], **{field: record[field] for field in CARD_FIELDS}) for record in updates
+        ], CARD_FIELDS)
+
+        through = model.skills.through
+        card_field = f'{model._meta.model_name}_id'
+        # У обновленных карт скилы заменяются целиком
+        through.objects.filter(**{f'{card_field}__in': [record['id'] for record in updates]}).delete()
+        card_ids = [card.pk for card in cards] + [record['id'] for record in updates]
+        through.objects.bulk_create([
+            through(**{card_field: card_id, 'skill_id': skill_ids[skill]})
+            for card_id, record in zip(card_ids, creates + updates) for skill in record['skills']
+        ], ignore_conflicts=True)
+
+        counts['created'] += len(creates)
+        counts['updated'] += len(updates)
+
+
+def import_records(records: Iterable[Dict], chunk_size: int = 1000) -> Dict[str, int]:
+    """Импортирует карты пачками в одной транзакции. Возвращает число созданных и обновленных карт."""
+    counts = {'created': 0, 'updated': 0}
+    with transaction.atomic():
+        for chunk in chunked(records, chunk_size):
+            _import_chunk(chunk, counts)
+        # bulk-операции не отправляют сигналы, поэтому снимок состава сбрасываем сами
+        transaction.on_commit(bump_roster_version)
+    return counts
+
+
+def import_file(binary_file, file_format: str, chunk_size: int = 1000) -> Dict[str, int]:
+    lines = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        return import_records(read_records(lines, file_format), chunk_size=chunk_size)
+    finally:
+        # Файл закрывает владелец, а не обертка
+        lines.detach()
+
+
+def card_record(card) -> Dict:
+    return {
+        'type': card.is_character_type,
+        'id': card.id,
+        'name': card.name,
+        'health': card.health,
+        'attack': card.attack,
+        'initiative': card.initiative,
+        'active': card.active,
+        'tag': card.tag,
+        'skills': [{'name': skill.name, 'damage': skill.damage} for skill in card.skills.all()],
+    }
+
+
+def export_records(chunk_size: int = 1000) -> Iterator[Dict]:
+    for model in CARD_MODELS.values():
+        # iterator(chunk_size) с prefetch_related подгружает скилы на каждую пачку карт
+        for card in card_queryset(model).iterator(chunk_size=chunk_size):
+            yield card_record(card)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_lines(file_format: str, chunk_size: int = 1000) -> Iterator[str]:
+    """Состав построчно в формате file_format - для StreamingHttpResponse и записи в файл."""
+    if file_format not in FORMATS:
+        raise RosterImportError(f'Неизвестный формат {file_format!r}, нужен один из {FORMATS}')
+    records = export_records(chunk_size)
+    if file_format == 'jsonl':
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for record in records:
+        record['skills'] = json.dumps(record['skills'], ensure_ascii=False)
+        yield writer.writerow([record[field] for field in CSV_FIELDS])
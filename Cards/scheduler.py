@@ -0,0 +1,34 @@
+# Cards/scheduler.py
+import heapq
+from typing import Iterable, Optional
+
+
+class InitiativeScheduler:
+    """Очередь ходов текущего раунда.
+
+    Куча по ключу (-инициатива, позиция в составе), поэтому порядок тот же, что и у стабильной сортировки
+    состава по убыванию инициативы. Походившие (active=False) и погибшие карты не удаляются сразу,
+    а выбрасываются, когда оказываются на вершине кучи: следующий ходящий и удаление - O(log n).
+    """
+    __slots__ = ('_heap',)
+
+    def __init__(self, cards: Iterable = ()):
+        self.reset(cards)
+
+    def reset(self, cards: Iterable):
+        """Новый раунд: в очередь попадают все активные живые карты."""
+        self._heap = [(-card.initiative, order, card) for order, card in enumerate(cards)
+                      if card.active and card.health > 0]
+        heapq.heapify(self._heap)
+
+    def peek(self) -> Optional[object]:
+        heap = self._heap
+        while heap:
+            card = heap[0][2]
+            if card.active and card.health > 0:
+                return card
+            heapq.heappop(heap)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._heap)
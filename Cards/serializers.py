@@ -1,15 +1,28 @@
 # serializers.py
 from rest_framework import serializers
-from .models import Hero, Monster, Skill
+from .models import Battle, BattleParticipant, CardStats, Hero, Monster, Skill
 
 
-class SkillSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """?fields=a,b в запросе - в ответе только перечисленные поля (неизвестные имена игнорируются)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request is not None else None
+        if fields:
+            wanted = set(fields.split(','))
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class SkillSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Skill
         fields = '__all__'
 
 
-class HeroSerializer(serializers.ModelSerializer):
+class HeroSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     skills = SkillSerializer(many=True, read_only=True)
 
     class Meta:
@@ -17,9 +30,49 @@ class HeroSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class MonsterSerializer(serializers.ModelSerializer):
+class MonsterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     skills = SkillSerializer(many=True, read_only=True)
 
     class Meta:
         model = Monster
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class BattleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Battle
+        fields = ('id', 'finished_at', 'winner', 'rounds', 'events', 'seed', 'cards')
+
+
+class BattleDetailSerializer(BattleSerializer):
+    log = serializers.SerializerMethodField()
+
+    class Meta(BattleSerializer.Meta):
+        fields = BattleSerializer.Meta.fields + ('log',)
+
+    def get_log(self, battle):
+        return [event.to_dict() for event in battle.get_events()]
+
+
+class BattleParticipantHistorySerializer(serializers.ModelSerializer):
+    """Бой из истории карты: поля боя и исход для этой карты."""
+    id = serializers.UUIDField(source='battle_id')
+    winner = serializers.CharField(source='battle.winner')
+    rounds = serializers.IntegerField(source='battle.rounds')
+    events = serializers.IntegerField(source='battle.events')
+    seed = serializers.IntegerField(source='battle.seed')
+    cards = serializers.JSONField(source='battle.cards')
+
+    class Meta:
+        model = BattleParticipant
+        fields = ('id', 'finished_at', 'winner', 'rounds', 'events', 'seed', 'cards', 'won', 'health')
+
+
+class CardStatsSerializer(serializers.ModelSerializer):
+    win_rate = serializers.FloatField(read_only=True)
+    avg_damage = serializers.FloatField(read_only=True)
+    avg_survival_rounds = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = CardStats
+        fields = ('card_type', 'card_id', 'battles', 'wins', 'win_rate', 'avg_damage', 'avg_survival_rounds')
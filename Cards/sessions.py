@@ -0,0 +1,15 @@
+# Cards/sessions.py
+"""Сессии в базе (как django.contrib.sessions.backends.db) с замером загрузки и записи, см. Cards/metrics.py."""
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+
+from .metrics import phase
+
+
+class SessionStore(DBSessionStore):
+    def load(self):
+        with phase('session_load'):
+            return super().load()
+
+    def save(self, must_create=False):
+        with phase('session_save'):
+            return super().save(must_create=must_create)
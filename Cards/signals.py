@@ -0,0 +1,23 @@
+# Cards/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Hero, Monster, Skill
+from .roster import bump_roster_version
+
+
+@receiver(post_save, sender=Hero)
+@receiver(post_save, sender=Monster)
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Hero)
+@receiver(post_delete, sender=Monster)
+@receiver(post_delete, sender=Skill)
+def invalidate_roster(sender, **kwargs):
+    bump_roster_version()
+
+
+@receiver(m2m_changed, sender=Hero.skills.through)
+@receiver(m2m_changed, sender=Monster.skills.through)
+def invalidate_roster_skills(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_roster_version()
@@ -0,0 +1,247 @@
+# Cards/simulation.py
+"""Безголовый пакетный симулятор боёв.
+
+N боёв с одним и тем же составом хранятся как структура массивов (здоровье, атака, инициатива,
+маска активности, матрица урона скилов) и продвигаются на один ход одновременно средствами NumPy.
+
+Это отдельный движок, а не BattleState: правила боя в нем записаны заново на массивах. Он повторяет
+только базовые правила - ходы по убыванию инициативы, новый раунд, когда все живые карты походили,
+монстр бьёт случайного живого героя случайным скилом (или обычной атакой, если скилов нет), то есть
+уровень ИИ 'easy'. Таблицу действий ACTIONS (register_action) и уровни ИИ монстров (Cards/monster_ai.py)
+он не знает. Меняя правила хода в BattleState, меняйте и step(); расхождение ловит
+SimulationTests в Cards/tests.py.
+
+Героями управляет политика pick_hero_action. В точном режиме у каждого боя свой random.Random(seed + i),
+и случайные числа берутся в том же порядке, что и у BattleState, поэтому результат боя i совпадает
+с simulate_reference(roster, seed + i) - эталоном, который играет тот же бой через BattleState.
+"""
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .battle_state import BattleState, CardState, copy_roster
+
+HEROES_WIN = 1
+MONSTERS_WIN = 0
+NOT_FINISHED = -1
+
+
+def turn_order(roster: Sequence[CardState]) -> List[CardState]:
+    """Карты в том порядке, в котором их держит BattleState (герои, затем монстры, по инициативе)."""
+    heroes = [card for card in roster if card.is_character_type == 'HERO']
+    monsters = [card for card in roster if card.is_character_type == 'MONSTER']
+    return BattleState(participants=heroes + monsters).participants
+
+
+def pick_hero_action(battle_state: BattleState, hero: CardState, rng) -> Tuple[int, str, int]:
+    """Политика героя для симуляций: случайный живой монстр и случайное действие (атака или один из скилов)."""
+    targets = [p for p in battle_state.participants if p.health > 0 and p.is_character_type == 'MONSTER']
+    target = targets[rng.randrange(len(targets))]
+    choice = rng.randrange(1 + len(hero.skills))
+    if choice == 0:
+        return target.id, 'attack', None
+    return target.id, 'skill', choice - 1
+
+
+def simulate_reference(roster: Sequence[CardState], seed: int, max_turns: int = 10_000) -> Dict:
+    """Один бой через BattleState - эталон для проверки векторного движка."""
+    rng = random.Random(seed)
+    battle_state = BattleState(participants=copy_roster(turn_order(roster)), rng=rng)
+    damage_dealt = {card.key: 0 for card in battle_state.participants}
+    turns, rounds = 0, 1
+
+    while not battle_state.is_battle_over() and turns < max_turns:
+        actor = battle_state.get_active_participant()
+        if actor is None:
+            battle_state.start_new_round()
+            rounds += 1
+            continue
+        health_before = sum(p.health for p in battle_state.participants)
+        if actor.is_character_type == 'HERO':
+            target_id, action, skill_index = pick_hero_action(battle_state, actor, rng)
+            battle_state.process_hero_turn(actor.id, target_id, action, skill_index)
+        else:
+            battle_state.process_monster_turn()
+        damage_dealt[actor.key] += health_before - sum(p.health for p in battle_state.participants)
+        turns += 1
+
+    if battle_state.is_battle_over():
+        winner = HEROES_WIN if any(h.health > 0 for h in battle_state.heroes) else MONSTERS_WIN
+    else:
+        winner = NOT_FINISHED
+    return {
+        'winner': winner,
+        'turns': turns,
+        'rounds': rounds,
+        'health': {p.key: p.health for p in battle_state.participants},
+        'damage_dealt': damage_dealt,
+    }
+
+
+class BatchBattle:
+    """N одновременных боёв одного состава в виде структуры массивов."""
+
+    def __init__(self, roster: Sequence[CardState], n_battles: int, seed: int = 0, exact: bool = True):
+        # Столбцы упорядочены по очереди хода, поэтому следующий ходящий - первый готовый столбец
+        self.cards = turn_order(roster)
+        self.n_battles = n_battles
+        self.seed = seed
+        self.exact = exact
+
+        self.is_hero = np.array([card.is_character_type == 'HERO' for card in self.cards], dtype=bool)
+        self.attack = np.array([card.attack for card in self.cards], dtype=np.int64)
+        self.initiative = np.array([card.initiative for card in self.cards], dtype=np.int64)
+        self.skill_count = np.array([len(card.skills) for card in self.cards], dtype=np.int64)
+        self.skill_damage = np.zeros((len(self.cards), max(int(self.skill_count.max(initial=0)), 1)), dtype=np.int64)
+        for column, card in enumerate(self.cards):
+            for skill_index, skill in enumerate(card.skills):
+                self.skill_damage[column, skill_index] = skill.damage
+
+        self.health = np.tile(np.array([card.health for card in self.cards], dtype=np.int64), (n_battles, 1))
+        self.active = np.tile(np.array([bool(card.active) for card in self.cards], dtype=bool), (n_battles, 1))
+        self.damage_dealt = np.zeros((n_battles, len(self.cards)), dtype=np.int64)
+        self.turns = np.zeros(n_battles, dtype=np.int64)
+        self.rounds = np.ones(n_battles, dtype=np.int64)
+        self.winner = np.full(n_battles, NOT_FINISHED, dtype=np.int64)
+        self.finished = np.zeros(n_battles, dtype=bool)
+
+        if exact:
+            self._rngs = [random.Random(seed + i) for i in range(n_battles)]
+        else:
+            self._np_rng = np.random.default_rng(seed)
+        self._check_finished(np.arange(n_battles))
+
+    def _check_finished(self, rows):
+        alive = self.health[rows] > 0
+        heroes_alive = (alive & self.is_hero).any(axis=1)
+        monsters_alive = (alive & ~self.is_hero).any(axis=1)
+        done = ~heroes_alive | ~monsters_alive
+        self.winner[rows[done]] = np.where(heroes_alive[done], HEROES_WIN, MONSTERS_WIN)
+        self.finished[rows[done]] = True
+
+    def _draw(self, rows, n_targets, n_choices, draws_choice):
+        if not self.exact:
+            target_pick = (self._np_rng.random(len(rows)) * n_targets).astype(np.int64)
+            choice_pick = (self._np_rng.random(len(rows)) * n_choices).astype(np.int64)
+            return target_pick, np.where(draws_choice, choice_pick, 0)
+
+        # Точный режим: на каждый бой свой поток, порядок вызовов как в BattleState
+        target_pick = np.empty(len(rows), dtype=np.int64)
+        choice_pick = np.zeros(len(rows), dtype=np.int64)
+        rngs = self._rngs
+        for i, (row, targets, choices, draw) in enumerate(
+                zip(rows.tolist(), n_targets.tolist(), n_choices.tolist(), draws_choice.tolist())):
+            rng = rngs[row]
+            target_pick[i] = rng.randrange(targets)
+            if draw:
+                choice_pick[i] = rng.randrange(choices)
+        return target_pick, choice_pick
+
+    def step(self) -> int:
+        """Один ход во всех незавершённых боях. Возвращает число боёв, в которых был сделан ход."""
+        rows = np.flatnonzero(~self.finished)
+        if not len(rows):
+            return 0
+
+        alive = self.health[rows] > 0
+        ready = self.active[rows] & alive
+        new_round = ~ready.any(axis=1)
+        if new_round.any():
+            self.active[rows[new_round]] = alive[new_round]
+            self.rounds[rows[new_round]] += 1
+            ready[new_round] = alive[new_round]
+
+        actor = ready.argmax(axis=1)
+        actor_is_hero = self.is_hero[actor]
+        actor_skills = self.skill_count[actor]
+
+        # Цели - живые карты противоположной стороны в порядке хода
+        candidates = alive & (self.is_hero[None, :] != actor_is_hero[:, None])
+        n_targets = candidates.sum(axis=1)
+        # Герой выбирает из обычной атаки и скилов, монстр - только скил (если скилы есть)
+        n_choices = np.where(actor_is_hero, 1 + actor_skills, np.maximum(actor_skills, 1))
+        draws_choice = actor_is_hero | (actor_skills > 0)
+        target_pick, choice_pick = self._draw(rows, n_targets, n_choices, draws_choice)
+
+        target = (np.cumsum(candidates, axis=1) > target_pick[:, None]).argmax(axis=1)
+        uses_skill = np.where(actor_is_hero, choice_pick > 0, actor_skills > 0)
+        skill_index = np.where(actor_is_hero, choice_pick - 1, choice_pick).clip(min=0)
+        damage = np.where(uses_skill, self.skill_damage[actor, skill_index], self.attack[actor])
+
+        self.health[rows, target] -= damage
+        self.active[rows, actor] = False
+        self.damage_dealt[rows, actor] += damage
+        self.turns[rows] += 1
+        self._check_finished(rows)
+        return len(rows)
+
+    def run(self, max_turns: int = 10_000) -> "SimulationReport":
+        for _ in range(max_turns):
+            if not self.step():
+                break
+        return SimulationReport(self)
+
+
+def _distribution(values) -> Dict:
+    if not len(values):
+        return {}
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        'mean': float(np.mean(values)),
+        'p10': float(p10),
+        'p50': float(p50),
+        'p90': float(p90),
+        'max': int(np.max(values)),
+    }
+
+
+@dataclass
+class SimulationReport:
+    batch: BatchBattle
+
+    def summary(self) -> Dict:
+        batch = self.batch
+        finished = batch.finished
+        n_finished = int(finished.sum())
+        hero_damage = batch.damage_dealt[:, batch.is_hero].sum(axis=1)
+        monster_damage = batch.damage_dealt[:, ~batch.is_hero].sum(axis=1)
+        return {
+            'battles': batch.n_battles,
+            'finished': n_finished,
+            'seed': batch.seed,
+            'exact': batch.exact,
+            'win_rate': {
+                'heroes': float((batch.winner == HEROES_WIN).sum() / max(n_finished, 1)),
+                'monsters': float((batch.winner == MONSTERS_WIN).sum() / max(n_finished, 1)),
+            },
+            'turns': _distribution(batch.turns[finished]),
+            'rounds': _distribution(batch.rounds[finished]),
+            'damage': {
+                'heroes': _distribution(hero_damage),
+                'monsters': _distribution(monster_damage),
+                'per_card': [
+                    {'id': card.id, 'name': card.name, 'type': card.is_character_type,
+                     'mean': float(batch.damage_dealt[:, column].mean())}
+                    for column, card in enumerate(batch.cards)
+                ],
+            },
+        }
+
+    def battle(self, index: int) -> Dict:
+        """Результат одного боя в формате simulate_reference."""
+        batch = self.batch
+        return {
+            'winner': int(batch.winner[index]),
+            'turns': int(batch.turns[index]),
+            'rounds': int(batch.rounds[index]),
+            'health': {card.key: int(batch.health[index, column]) for column, card in enumerate(batch.cards)},
+            'damage_dealt': {card.key: int(batch.damage_dealt[index, column]) for column, card in
+                             enumerate(batch.cards)},
+        }
+
+
+def simulate(roster: Sequence[CardState], n_battles: int, seed: int = 0, exact: bool = True,
+             max_turns: int = 10_000) -> SimulationReport:
+    return BatchBattle(roster, n_battles, seed=seed, exact=exact).run(max_turns=max_turns)
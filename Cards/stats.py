@@ -0,0 +1,114 @@
+# Cards/stats.py
+"""Статистика карт (модель CardStats): победы, средний урон и сколько раундов карта живет.
+
+Статистика не считается по журналам на каждый запрос. Когда архив записывает пачку завершенных
+боёв (Cards/archive.py), вклад каждого боя - один проход по его журналу - прибавляется к строкам
+CardStats. rebuild() пересчитывает таблицу по всему архиву потоково, пачками боёв.
+"""
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .battle_events import BattleLog
+from .models import Battle, CardStats
+
+STATS_CACHE = 'default'
+STATS_VERSION_KEY = 'card_stats:version'
+# Другие процессы не видят сброса версии в кэше в памяти, поэтому ответы живут недолго
+STATS_TIMEOUT = 60
+DELTA_FIELDS = ('battles', 'wins', 'damage_dealt', 'rounds_survived')
+
+Key = Tuple[str, int]
+
+
+def battle_deltas(cards: Iterable[Tuple[str, int, int]], log: BattleLog, rounds: int, winner: str) -> Dict[Key, List[int]]:
+    """Вклад одного боя: {(тип, id): [боёв, побед, урон, раундов прожито]}. cards - (тип, id, здоровье в конце)."""
+    damage = defaultdict(int)
+    last_hit = {}
+    for event in log:
+        damage[event.actor_type, event.actor_id] += event.damage
+        last_hit[event.target_type, event.target_id] = event.round
+    deltas = {}
+    for card_type, card_id, health in cards:
+        key = (card_type, card_id)
+        # Погибшая карта прожила до раунда последнего попадания по ней - после гибели ее не атакуют
+        survived = rounds if health > 0 else last_hit.get(key, rounds)
+        deltas[key] = [1, int(card_type == winner), damage[key], survived]
+    return deltas
+
+
+def merge(total: Dict[Key, List[int]], deltas: Dict[Key, List[int]]):
+    for key, values in deltas.items():
+        current = total.setdefault(key, [0] * len(DELTA_FIELDS))
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+def archived_deltas(battle: Battle) -> Dict[Key, List[int]]:
+    cards = [(card['is_character_type'], card['id'], card['health']) for card in battle.cards]
+    return battle_deltas(cards, battle.get_events(), battle.rounds, battle.winner)
+
+
+def apply_deltas(deltas: Dict[Key, List[int]]):
+    """Прибавляет приращения к CardStats. Вызывать внутри транзакции, в которой пишутся сами бои."""
+    if not deltas:
+        return
+    CardStats.objects.bulk_create([CardStats(card_type=card_type, card_id=card_id) for card_type, card_id in deltas],
+                                  ignore_conflicts=True)
+    for (card_type, card_id), values in deltas.items():
+        CardStats.objects.filter(card_type=card_type, card_id=card_id).update(
+            **{field: F(field) + value for field, value in zip(DELTA_FIELDS, values)})
+    transaction.on_commit(bump_stats_version)
+
+
+def rebuild(chunk_size: int = 2000, progress=None) -> int:
+    """Пересчитывает CardStats по архиву, читая бои пачками по chunk_size. Возвращает число боёв."""
+    battles = Battle.objects.only('id', 'rounds', 'winner', 'cards', 'battle_log').order_by('pk')
+    total, count = {}, 0
+    # Итог копится в памяти (строк столько, сколько карт), а журналы читаются курсором и не задерживаются
+    for battle in battles.iterator(chunk_size=chunk_size):
+        merge(total, archived_deltas(battle))
+        count += 1
+        if progress and count % chunk_size == 0:
+            progress(count)
+    with transaction.atomic():
+        CardStats.objects.all().delete()
+        CardStats.objects.bulk_create(
+            [CardStats(card_type=card_type, card_id=card_id, **dict(zip(DELTA_FIELDS, values)))
+             for (card_type, card_id), values in total.items()],
+            batch_size=chunk_size,
+        )
+        transaction.on_commit(bump_stats_version)
+    return count
+
+
+def stats_version() -> int:
+    cache = caches[STATS_CACHE]
+    version = cache.get(STATS_VERSION_KEY)
+    if version is None:
+        cache.add(STATS_VERSION_KEY, time.time_ns())
+        version = cache.get(STATS_VERSION_KEY)
+    return version
+
+
+def bump_stats_version():
+    cache = caches[STATS_CACHE]
+    try:
+        cache.incr(STATS_VERSION_KEY)
+    except ValueError:
+        stats_version()
+
+
+def cached_stats(name: str, build) -> object:
+    """Ответ со статистикой из кэша; build() строит его заново после каждого обновления CardStats."""
+    cache = caches[STATS_CACHE]
+    key = f'card_stats:{name}:{stats_version()}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, STATS_TIMEOUT)
+    return data
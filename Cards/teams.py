@@ -0,0 +1,161 @@
+# Cards/teams.py
+"""Состав боя: явные команды или выборка карт по id, метке и бюджету силы.
+
+    {"heroes": {"ids": [1, 2, 3]}, "monsters": {"tag": "лес", "budget": 5000}, "mode": "raid"}
+
+Сторона без описания - это TeamQuery() с пределом стороны: самые сильные карты, не больше предела.
+Такая команда собирается один раз на версию состава и хранится в кэше состава, как и его снимок,
+так что бой без описания создается без запросов к БД. Для описанной стороны карты
+выбираются отфильтрованными запросами по индексам (tag, -power) и (-power): при бюджете сначала читаются
+только (id, сила) кандидатов по убыванию силы и жадно набирается команда, а со скилами загружаются
+лишь выбранные карты. Сила карты - Hero.power / Monster.power.
+
+В рейде (mode="raid") монстров может быть до MAX_RAID_MONSTERS, в обычном бою - до MAX_TEAM на сторону.
+Уровень ИИ монстров - ключ "ai" (Cards/monster_ai.py), см. battle_ai.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import caches
+
+from .battle_state import CardState
+from .models import Hero, Monster
+from .monster_ai import AI_LEVELS, DEFAULT_AI
+from .roster import ROSTER_CACHE, card_queryset, card_state, roster_version
+
+MAX_TEAM = 50
+MAX_RAID_MONSTERS = 1000
+MODES = ('battle', 'raid')
+
+
+class TeamError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class TeamQuery:
+    ids: Optional[Tuple[int, ...]] = None
+    tag: Optional[str] = None
+    budget: Optional[int] = None
+    limit: int = MAX_TEAM
+
+    @classmethod
+    def from_dict(cls, data: Dict, max_limit: int = MAX_TEAM) -> "TeamQuery":
+        if not isinstance(data, dict):
+            raise TeamError('Команда задается объектом {ids, tag, budget, limit}')
+        ids = data.get('ids')
+        if ids is not None and not isinstance(ids, (list, tuple)):
+            raise TeamError('ids - список id карт')
+        try:
+            ids = tuple(int(card_id) for card_id in ids) if ids is not None else None
+            budget = data.get('budget')
+            budget = int(budget) if budget is not None else None
+            limit = int(data.get('limit') or max_limit)
+        except (TypeError, ValueError) as exc:
+            raise TeamError('ids, budget и limit - целые числа') from exc
+        tag = data.get('tag')
+        if not 0 < limit <= max_limit:
+            raise TeamError(f'Размер команды - от 1 до {max_limit}')
+        if ids is not None and len(ids) > limit:
+            raise TeamError(f'В команде больше {limit} карт')
+        return cls(ids=ids, tag=str(tag) if tag is not None else None, budget=budget, limit=limit)
+
+    def candidates(self, model):
+        queryset = model.objects.all()
+        if self.ids is not None:
+            queryset = queryset.filter(id__in=self.ids)
+        if self.tag is not None:
+            queryset = queryset.filter(tag=self.tag)
+        return queryset.order_by('-power', 'id')
+
+    def chosen_ids(self, model) -> List[int]:
+        candidates = self.candidates(model)
+        if self.budget is None:
+            return list(candidates.values_list('id', flat=True)[:self.limit])
+        chosen, remaining = [], self.budget
+        # Жадно по убыванию силы: берем каждую карту, которая еще помещается в бюджет
+        for card_id, power in candidates.filter(power__lte=remaining).values_list('id', 'power').iterator():
+            if power <= remaining:
+                chosen.append(card_id)
+                remaining -= power
+            if len(chosen) == self.limit or remaining <= 0:
+                break
+        return chosen
+
+    def select(self, model) -> List[CardState]:
+        ids = self.chosen_ids(model)
+        if self.ids is not None and len(ids) < len(set(self.ids)) and self.budget is None:
+            missing = sorted(set(self.ids) - set(ids))
+            raise TeamError(f'Нет карт с id {missing}')
+        if not ids:
+            raise TeamError('Под условия не подошла ни одна карта')
+        return [card_state(card) for card in card_queryset(model).filter(id__in=ids)]
+
+
+def check_spec(spec) -> Dict:
+    """Описание боя как словарь (None - пустое описание)."""
+    if spec is None:
+        return {}
+    if not isinstance(spec, dict):
+        raise TeamError('Описание боя задается объектом {heroes, monsters, mode, ai}')
+    return spec
+
+
+def load_participants(spec: Optional[Dict] = None) -> List[CardState]:
+    """Участники боя по описанию состава; сторона без описания - до предела стороны самых сильных карт."""
+    spec = check_spec(spec)
+    mode = spec.get('mode', 'battle')
+    if mode not in MODES:
+        raise TeamError(f'Режим боя - один из {MODES}')
+    sides = []
+    for key, model, max_limit in (('heroes', Hero, MAX_TEAM),
+                                  ('monsters', Monster, MAX_RAID_MONSTERS if mode == 'raid' else MAX_TEAM)):
+        if spec.get(key) is not None:
+            sides.append(TeamQuery.from_dict(spec[key], max_limit).select(model))
+            continue
+        sides.append(default_team(model, max_limit))
+    return sides[0] + sides[1]
+
+
+def default_team(model, limit: int) -> List[CardState]:
+    """Команда стороны без описания - TeamQuery(limit=limit), из кэша состава (свой снимок на версию)."""
+    cache = caches[ROSTER_CACHE]
+    key = f'roster:team:{model.__name__}:{limit}:{roster_version()}'
+    team = cache.get(key)
+    if team is None:
+        try:
+            team = TeamQuery(limit=limit).select(model)
+        except TeamError:
+            # Пустая сторона - не ошибка: бой без карт одной из сторон сразу окончен
+            team = []
+        cache.set(key, team, None)
+    return team
+
+
+def battle_ai(spec: Optional[Dict] = None) -> str:
+    """Уровень ИИ монстров из описания боя."""
+    ai = check_spec(spec).get('ai') or DEFAULT_AI
+    if ai not in AI_LEVELS:
+        raise TeamError(f'Уровень ИИ монстров - один из {AI_LEVELS}')
+    return ai
+
+
+def spec_from_form(data) -> Optional[Dict]:
+    """Описание состава из формы начала игры: hero_ids / monster_ids через запятую, tag, budget, raid, ai."""
+    spec = {}
+    for key, ids_field, budget_field in (('heroes', 'hero_ids', 'hero_budget'),
+                                         ('monsters', 'monster_ids', 'monster_budget')):
+        team = {}
+        if data.get(ids_field):
+            team['ids'] = [card_id for card_id in data[ids_field].replace(' ', '').split(',') if card_id]
+        if data.get('tag'):
+            team['tag'] = data['tag']
+        if data.get(budget_field):
+            team['budget'] = data[budget_field]
+        if team:
+            spec[key] = team
+    if data.get('raid'):
+        spec['mode'] = 'raid'
+    if data.get('ai'):
+        spec['ai'] = data['ai']
+    return spec or None
@@ -0,0 +1,43 @@
+import zlib
+
+from django import template
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+FRAGMENT_CACHE = 'fragments'
+CARD_TEMPLATE = 'Cards/card.html'
+
+
+@register.filter
+def log_tail(battle, count=50):
+    """Текст последних count событий боя. Строки собираются только здесь, при выводе."""
+    return battle.describe(battle.log.tail(int(count)))
+
+
+def card_fragment_key(card) -> str:
+    # В бою меняются только здоровье и активность; имя и инициатива входят в ключ на случай смены состава
+    name = zlib.crc32(card.name.encode())
+    return (f'card:{card.is_character_type}:{card.id}:{card.health}:{int(card.active)}:'
+            f'{card.initiative}:{name:08x}')
+
+
+@register.simple_tag
+def card_list(cards):
+    """Карты боя, отрисованные по CARD_TEMPLATE. Заново рисуются только карты, чье состояние изменилось.
+
+    Фрагменты берутся из кэша одним get_many и дописываются одним set_many.
+    """
+    cache = caches[FRAGMENT_CACHE]
+    keys = [card_fragment_key(card) for card in cards]
+    fragments = cache.get_many(keys)
+    missing = {}
+    card_template = get_template(CARD_TEMPLATE)
+    for key, card in zip(keys, cards):
+        if key not in fragments:
+            fragments[key] = missing[key] = card_template.render({'card': card})
+    if missing:
+        cache.set_many(missing)
+    return mark_safe(''.join(fragments[key] for key in keys))
@@ -1,3 +1,1022 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import json
+import random
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import get_template
+from django.urls import reverse
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+from . import autoplay, codec, metrics, roster_io
+from .battle_events import ATTACK, BattleEvent, BattleLog
+from .battle_state import ACTIONS, BattleState, CardState, copy_roster, register_action
+from .benchmarks import suite
+from .benchmarks.fixtures import make_battle, make_roster
+from .archive import get_battle_archive, winner as archive_winner
+from .battle_store import FileBattleStore, LRUBattleStore, SQLiteBattleStore, get_battle_store
+from .models import Battle, CardStats, Hero, Monster, Skill
+from .replay import Replay
+from .stats import STATS_CACHE, rebuild as rebuild_card_stats
+from .views import hero_action, run_battle_action
+from .roster import ROSTER_CACHE, bump_roster_version, cached_roster
+from .teams import TeamError, load_participants
+from .templatetags.battle_tags import CARD_TEMPLATE, FRAGMENT_CACHE, card_list
+
+try:
+    from . import simulation
+except ImportError:
+    simulation = None
+
+
+def create_roster(size):
+    skills = Skill.objects.bulk_create([Skill(name=f'Скил {i}', damage=10 + i % 5) for i in range(size)])
+    heroes = Hero.objects.bulk_create([
+        Hero(name=f'Герой {i}', health=100, attack=10, initiative=i % 10) for i in range(size)])
+    monsters = Monster.objects.bulk_create([
+        Monster(name=f'Монстр {i}', health=80, attack=8, initiative=i % 7) for i in range(size)])
+    Hero.skills.through.objects.bulk_create([
+        Hero.skills.through(hero_id=hero.id, skill_id=skill.id) for hero, skill in zip(heroes, skills)])
+    Monster.skills.through.objects.bulk_create([
+        Monster.skills.through(monster_id=monster.id, skill_id=skill.id) for monster, skill in zip(monsters, skills)])
+    # bulk_create не отправляет сигналы, поэтому снимок состава сбрасываем сами
+    bump_roster_version()
+
+
+class BattleStoreTestMixin:
+    def battle_store_settings(self, directory):
+        return {'BACKEND': 'Cards.battle_store.FileBattleStore', 'LOCATION': directory, 'LRU_SIZE': 16}
+
+    def setUp(self):
+        super().setUp()
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        store_settings = override_settings(BATTLE_STORE=self.battle_store_settings(store_dir.name))
+        store_settings.enable()
+        self.addCleanup(store_settings.disable)
+        caches[ROSTER_CACHE].clear()
+        caches[STATS_CACHE].clear()
+
+
+class RosterQueryCountTests(BattleStoreTestMixin, TestCase):
+    """Число запросов не должно расти вместе с размером состава."""
+
+    def count_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def assertConstantQueries(self, method, url):
+        create_roster(3)
+        small = self.count_queries(method, url)
+        create_roster(50)
+        self.assertEqual(self.count_queries(method, url), small)
+
+    def test_start_game(self):
+        self.assertConstantQueries('post', reverse('start_game'))
+
+    def test_hero_list(self):
+        self.assertConstantQueries('get', reverse('hero-list'))
+
+    def test_monster_list(self):
+        self.assertConstantQueries('get', reverse('monster-list'))
+
+
+class RosterSnapshotTests(BattleStoreTestMixin, TestCase):
+    def test_snapshot_is_cached_until_roster_changes(self):
+        create_roster(3)
+        self.assertEqual(len(cached_roster()), 6)
+        with self.assertNumQueries(0):
+            roster = cached_roster()
+        # Бой получает свою копию карт, шаблон в кэше не меняется
+        roster[0].health = 0
+        self.assertNotEqual(cached_roster()[0].health, 0)
+
+        hero = Hero.objects.first()
+        hero.name = 'Новое имя'
+        hero.save()
+        self.assertIn('Новое имя', [card.name for card in cached_roster()])
+
+        hero.skills.clear()
+        card = next(card for card in cached_roster() if card.is_character_type == 'HERO' and card.id == hero.id)
+        self.assertEqual(card.skills, [])
+
+
+class CodecTests(TestCase):
+    def test_round_trip(self):
+        for n_cards, n_turns in ((2, 0), (6, 40), (300, 2000)):
+            battle_state = make_battle(n_cards, n_turns)
+            battle_state.participants[0].name = 'Имя с юникодом ✓'
+            decoded = codec.decode(codec.encode(battle_state))
+            self.assertEqual(decoded.to_dict(), battle_state.to_dict())
+            self.assertEqual(decoded.describe(decoded.log.events()), battle_state.describe(battle_state.log.events()))
+
+    def test_other_versions_rejected(self):
+        data = codec.encode(make_battle(4, 2))
+        for version in (1, 2, codec.VERSION + 1):
+            with self.assertRaisesRegex(ValueError, 'версия'):
+                codec.decode(data[:2] + bytes([version]) + data[3:])
+
+    def test_wide_values(self):
+        # Значения, не влезающие в int32, уходят в столбец 'q'
+        battle_state = make_battle(4)
+        battle_state.participants[0].id = 2 ** 40
+        battle_state.participants[1].health = -2 ** 35
+        decoded = codec.decode(codec.encode(battle_state))
+        self.assertEqual(decoded.to_dict(), battle_state.to_dict())
+
+    def test_session_serializer(self):
+        serializer = codec.BattleSessionSerializer()
+        battle_state = make_battle(6, 10)
+        session = serializer.loads(serializer.dumps({'battle_id': 'abc', 'battle': battle_state}))
+        self.assertEqual(session['battle_id'], 'abc')
+        self.assertEqual(session['battle'].to_dict(), battle_state.to_dict())
+
+
+class BattleLogTests(BattleStoreTestMixin, TestCase):
+    events = [BattleEvent(1, 'HERO', 1, 2, ATTACK, 10), BattleEvent(1, 'MONSTER', 2, 1, 0, 2 ** 40),
+              BattleEvent(2, 'HERO', 2 ** 33, 2, 1, 7), BattleEvent(2, 'MONSTER', 2, 2 ** 33, ATTACK, -5),
+              BattleEvent(3, 'HERO', 1, 2, 2, 0)]
+
+    def test_append_only_and_paging(self):
+        log = BattleLog()
+        for count, event in enumerate(self.events, 1):
+            before = log.tobytes()
+            log.append(event)
+            # Добавление не трогает уже записанные байты
+            self.assertEqual(log.tobytes()[:len(before)], before)
+            self.assertEqual(BattleLog.frombytes(before + log.tobytes(count - 1)).events(), self.events[:count])
+        self.assertEqual(list(log), self.events)
+        self.assertEqual(log.tail(2), self.events[-2:])
+        self.assertEqual((log.tail(0), log.tail(100)), ([], self.events))
+        self.assertEqual(log.page(1, 3), self.events[1:4])
+        self.assertEqual(log.page(5, 10), [])
+        # В байтах - little-endian int64 на любой машине
+        self.assertEqual(log.tobytes(1)[5 * 8:6 * 8], (2 ** 40).to_bytes(8, 'little'))
+
+    def test_wide_events_survive_codec_and_store(self):
+        battle_state = make_battle(4, 6)
+        battle_state.log.extend(self.events)
+        self.assertEqual(codec.decode(codec.encode(battle_state)).log.to_list(), battle_state.log.to_list())
+
+        store = get_battle_store()
+        head = make_battle(4, 6)
+        battle_id = store.create(head)
+        # Начало журнала уже в хранилище, остальное дописывается
+        battle_state.log.persisted = len(head.log)
+        store.save(battle_id, battle_state, version=0)
+        self.assertEqual(FileBattleStore(store.backend.location).get(battle_id).log.to_list(),
+                         battle_state.log.to_list())
+
+    def test_log_endpoint(self):
+        self.assertEqual(self.client.get(reverse('battle-log')).status_code, 400)
+        create_roster(3)
+        self.client.post(reverse('start_game'))
+        battle_id = self.client.session['battle_id']
+        for _ in range(4):
+            battle_state = get_battle_store().get(battle_id)
+            hero = battle_state.get_active_participant()
+            target = next(monster for monster in battle_state.monsters if monster.health > 0)
+            run_battle_action(battle_id, hero_action(hero.id, target.id, 'attack'))
+        log = get_battle_store().get(battle_id).log
+        expected = [event.to_dict() for event in log]
+
+        def fetch(**params):
+            response = self.client.get(reverse('battle-log'), params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            for event in body['events']:
+                self.assertTrue(event.pop('text'))
+            return body
+
+        body = fetch(tail=3)
+        self.assertEqual((body['count'], body['offset']), (len(log), len(log) - 3))
+        self.assertEqual(body['events'], expected[-3:])
+        self.assertEqual(fetch(offset=1, limit=2)['events'], expected[1:3])
+        self.assertEqual(fetch(offset=len(log))['events'], [])
+        self.assertEqual(self.client.get(reverse('battle-log'), {'limit': 'x'}).status_code, 400)
+
+
+class ConcurrentBattleTests(BattleStoreTestMixin, TestCase):
+    """Параллельные ходы в одном бою не теряются и не применяются дважды."""
+
+    async def start_battle(self):
+        client = AsyncClient()
+        await client.post(reverse('start_game'))
+        return client
+
+    @staticmethod
+    async def state(client):
+        return (await client.get(reverse('play_state'))).json()
+
+    @staticmethod
+    async def submit(client, state, **payload):
+        monster = next(m for m in state['battle']['monsters'] if m['health'] > 0)
+        payload = dict({'hero_id': state['active']['id'], 'target_id': monster['id'], 'action': 'attack'}, **payload)
+        return await client.post(reverse('play_act'), payload, content_type='application/json')
+
+    async def play(self, client, turns):
+        """Игрок, который читает бой и ходит текущим героем с той версией, которую видел."""
+        accepted = 0
+        for _ in range(turns):
+            state = await self.state(client)
+            if state['over']:
+                break
+            response = await self.submit(client, state, version=state['version'])
+            self.assertIn(response.status_code, (200, 409))
+            accepted += response.status_code == 200
+        return accepted
+
+    async def hero_turns(self, client):
+        response = await client.get(reverse('battle-log'), {'limit': 500})
+        return sum(event['actor_type'] == 'HERO' for event in response.json()['events'])
+
+    async def test_double_submit_applies_once(self):
+        await sync_to_async(create_roster)(3)
+        client = await self.start_battle()
+        state = await self.state(client)
+        responses = await asyncio.gather(*(self.submit(client, state) for _ in range(20)))
+        self.assertEqual(sorted(response.status_code for response in responses), [200] + [409] * 19)
+        self.assertEqual((await self.state(client))['version'], state['version'] + 1)
+        self.assertEqual(await self.hero_turns(client), 1)
+
+    async def test_concurrent_players_lose_no_turns(self):
+        await sync_to_async(create_roster)(3)
+        clients = [await self.start_battle() for _ in range(2)]
+        initial = [await self.state(client) for client in clients]
+        # По четыре игрока на каждый из двух боев, все ходят одновременно
+        accepted = await asyncio.gather(*(self.play(client, 10) for client in clients for _ in range(4)))
+        for i, (client, state) in enumerate(zip(clients, initial)):
+            turns = sum(accepted[4 * i:4 * i + 4])
+            self.assertGreater(turns, 0)
+            self.assertEqual((await self.state(client))['version'], state['version'] + turns)
+            self.assertEqual(await self.hero_turns(client), turns)
+
+
+class SQLiteConcurrentBattleTests(ConcurrentBattleTests):
+    def battle_store_settings(self, directory):
+        return {'BACKEND': 'Cards.battle_store.SQLiteBattleStore',
+                'LOCATION': os.path.join(directory, 'battles.sqlite3'), 'LRU_SIZE': 16}
+
+
+class BattleFeedTests(BattleStoreTestMixin, TestCase):
+    async def test_turn_sends_only_new_events(self):
+        await sync_to_async(create_roster)(3)
+        client = AsyncClient()
+        await client.post(reverse('start_game'))
+        state = (await client.get(reverse('play_state'))).json()
+        since = state['events']
+        stream = (await client.get(reverse('play_events'), {'since': since})).streaming_content
+        # Подписчик уже ждет, когда приходит ход
+        pushed = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.1)
+        self.assertFalse(pushed.done())
+
+        monster = next(m for m in state['battle']['monsters'] if m['health'] > 0)
+        delta = (await client.post(reverse('play_act'), {
+            'hero_id': state['active']['id'], 'target_id': monster['id'], 'action': 'attack', 'since': since,
+        }, content_type='application/json')).json()
+        self.assertEqual(delta['since'], since)
+        self.assertEqual(len(delta['log']), delta['events'] - since)
+        self.assertEqual(delta['log'][0]['actor_type'], 'HERO')
+        self.assertLessEqual(len(delta['cards']), 6)
+
+        # Поток присылает то же изменение с id = числом событий боя
+        message = (await asyncio.wait_for(pushed, 5)).decode()
+        self.assertIn(f"id: {delta['events']}\n", message)
+        pushed = json.loads(message.split('data: ', 1)[1])
+        self.assertEqual(pushed['log'], delta['log'])
+        await stream.aclose()
+
+
+class MonsterPhaseTests(TestCase):
+    @staticmethod
+    def reference_phase(battle_state):
+        # Прежний пошаговый цикл
+        while not battle_state.is_battle_over():
+            active = battle_state.get_active_participant()
+            if active is None:
+                battle_state.start_new_round()
+            elif active.is_character_type == 'MONSTER':
+                battle_state.process_monster_turn()
+            else:
+                break
+
+    def test_same_events_as_turn_by_turn(self):
+        # Внешний генератор (как у симуляций) и генераторы по зерну и позиции в журнале (rng=None)
+        for (n_cards, seed), shared_rng in itertools.product(((6, 0), (60, 1), (400, 2)), (True, False)):
+            batched, reference = make_battle(n_cards, seed=seed), make_battle(n_cards, seed=seed)
+            if shared_rng:
+                batched.rng, reference.rng = random.Random(seed), random.Random(seed)
+            else:
+                batched.rng = reference.rng = None
+            for battle_state in (batched, reference):
+                # Все герои уже походили: фаза монстров длится до следующего раунда
+                for hero in battle_state.heroes:
+                    hero.active = False
+            batched.resolve_monster_phase()
+            self.reference_phase(reference)
+            self.assertEqual(batched.log.to_list(), reference.log.to_list())
+            self.assertEqual(batched.to_dict(), reference.to_dict())
+
+
+    def test_ai_levels_same_as_turn_by_turn(self):
+        # Бюджет поиска - только узлы и делится по состоянию боя, поэтому ход не зависит от способа проведения фазы
+        for (n_cards, seed), ai in itertools.product(((6, 0), (10, 1), (20, 4), (400, 2)), ('normal', 'hard')):
+            battles = []
+            for _ in range(2):
+                battle_state = make_battle(n_cards, seed=seed)
+                battle_state.rng, battle_state.ai = None, ai
+                # Слабые герои гибнут посреди фазы, и поиск идет глубже одного хода
+                for card in battle_state.participants:
+                    card.health //= 20
+                    card.active = card.is_character_type == 'MONSTER'
+                battle_state.update_participants()
+                battles.append(battle_state)
+            batched, reference = battles
+            batched.resolve_monster_phase()
+            self.reference_phase(reference)
+            with self.subTest(n_cards=n_cards, ai=ai):
+                self.assertEqual(batched.log.to_list(), reference.log.to_list())
+
+
+class SchedulerTests(TestCase):
+    @staticmethod
+    def card(character_type, card_id, initiative):
+        return CardState(id=card_id, name=f'{character_type} {card_id}', health=10, attack=1, initiative=initiative,
+                         active=True, is_character_type=character_type, skills=[])
+
+    def test_turn_order_with_ties_and_deaths(self):
+        battle_state = BattleState(participants=[
+            self.card('HERO', 1, 5), self.card('MONSTER', 1, 5), self.card('HERO', 2, 7),
+            self.card('MONSTER', 2, 5), self.card('HERO', 3, 5), self.card('MONSTER', 3, 9)])
+        # Равная инициатива: сначала герои, внутри стороны - исходный порядок
+        self.assertEqual([card.key for card in battle_state.participants],
+                         [('MONSTER', 3), ('HERO', 2), ('HERO', 1), ('HERO', 3), ('MONSTER', 1), ('MONSTER', 2)])
+
+        def expected():
+            # Эталон - первая карта состава, которая еще ходит в этом раунде
+            return next((card for card in battle_state.participants if card.active and card.health > 0), None)
+
+        deaths = {(1, 2): [('HERO', 3), ('MONSTER', 1)], (2, 1): [('HERO', 1)]}
+        order = []
+        for round_ in (1, 2):
+            for turn in itertools.count():
+                for key in deaths.get((round_, turn), ()):
+                    battle_state.get_card(*key).health = 0
+                active = battle_state.get_active_participant()
+                self.assertIs(active, expected())
+                if active is None:
+                    break
+                order.append((round_, active.key))
+                active.active = False
+            battle_state.start_new_round()
+        self.assertEqual(order, [
+            (1, ('MONSTER', 3)), (1, ('HERO', 2)), (1, ('HERO', 1)), (1, ('MONSTER', 2)),
+            (2, ('MONSTER', 3)), (2, ('HERO', 2)), (2, ('MONSTER', 2))])
+
+
+class BattleIndexTests(TestCase):
+    def assertIndexesMatchScan(self, battle_state):
+        participants = battle_state.participants
+        self.assertEqual(battle_state.cards, {card.key: card for card in participants})
+        for key, card in battle_state.cards.items():
+            self.assertIs(card, next(p for p in participants if p.key == key))
+        for side in ('HERO', 'MONSTER'):
+            scan = [card for card in participants if card.is_character_type == side]
+            self.assertEqual([id(card) for card in battle_state._sides[side]], [id(card) for card in scan])
+            self.assertEqual([id(card) for card in battle_state.alive(side)],
+                             [id(card) for card in scan if card.health > 0])
+
+    def test_indexes_follow_battle(self):
+        battle_state = BattleState.start(copy_roster(make_roster(10, seed=4)), seed=4)
+        self.assertIndexesMatchScan(battle_state)
+        rng = random.Random(0)
+        while not battle_state.is_battle_over():
+            hero = battle_state.get_active_participant()
+            target_id, action, skill_index = autoplay.focus_policy(battle_state, hero, rng)
+            self.assertIsNone(battle_state.hero_turn(hero.id, target_id, action, skill_index))
+            self.assertIndexesMatchScan(battle_state)
+            for restored in (BattleState.from_dict(battle_state.to_dict()), codec.decode(codec.encode(battle_state))):
+                self.assertIndexesMatchScan(restored)
+        self.assertGreater(battle_state.round, 1)
+        fallen = [card for card in battle_state.participants if card.health <= 0]
+        self.assertGreater(len(fallen), 1)
+        # Отрицательный урон возвращает карту на ее место в порядке хода
+        battle_state._apply_damage(fallen[-1], fallen[-1].health - 5)
+        self.assertIndexesMatchScan(battle_state)
+
+
+class ActionTableTests(TestCase):
+    def test_registered_action_drives_hero_turn(self):
+        register_action('double')(lambda actor, arg: (ATTACK, actor.attack * 2))
+        self.addCleanup(ACTIONS.pop, 'double')
+        battle_state = BattleState.start(make_roster(6), seed=1)
+        hero = battle_state.get_active_participant()
+        target = battle_state.alive('MONSTER')[0]
+        events = len(battle_state.log)
+        self.assertIsNone(battle_state.hero_turn(hero.id, target.id, 'double'))
+        self.assertEqual(battle_state.log.events(events, events + 1)[0].damage, hero.attack * 2)
+        # Неизвестное действие отклоняется у того героя, чей сейчас ход, и журнал не меняется
+        active = battle_state.get_active_participant()
+        self.assertEqual(active.is_character_type, 'HERO')
+        events = len(battle_state.log)
+        self.assertEqual(battle_state.hero_turn(active.id, target.id, 'unknown'), 'Неизвестное действие: unknown')
+        self.assertEqual(len(battle_state.log), events)
+        self.assertIs(battle_state.get_active_participant(), active)
+
+
+class MonsterAITests(BattleStoreTestMixin, TestCase):
+    def test_levels_replay_and_codec(self):
+        for ai in ('normal', 'hard'):
+            roster = make_roster(8, seed=3)
+            for card in roster:
+                card.health //= 10
+            battle_state = BattleState.start(copy_roster(roster), seed=3, ai=ai)
+            while not battle_state.is_battle_over():
+                hero = battle_state.get_active_participant()
+                self.assertIsNone(battle_state.hero_turn(hero.id, battle_state.alive('MONSTER')[0].id, 'attack'))
+            self.assertEqual(Replay.record(battle_state, roster).build().log.to_list(), battle_state.log.to_list())
+            self.assertEqual(codec.decode(codec.encode(battle_state)).ai, ai)
+
+    def test_greedy_finishes_wounded_hero(self):
+        heroes = [CardState(id=i, name=f'Герой {i}', health=health, attack=1, initiative=1, active=True,
+                            is_character_type='HERO') for i, health in ((1, 50), (2, 5))]
+        monster = CardState(id=1, name='Монстр', health=50, attack=10, initiative=9, active=True,
+                            is_character_type='MONSTER')
+        battle_state = BattleState.start(heroes + [monster], seed=0, ai='normal')
+        self.assertEqual(battle_state.log.events()[0].target_id, 2)
+
+    def test_level_in_battle_spec(self):
+        create_roster(3)
+        response = self.client.post(reverse('battle-list'), {'ai': 'hard'}, content_type='application/json')
+        self.assertEqual(response.json()['battle']['ai'], 'hard')
+        response = self.client.post(reverse('battle-list'), {'ai': 'nightmare'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipIf(simulation is None, 'нужен NumPy')
+class SimulationTests(TestCase):
+    def test_batch_matches_reference(self):
+        for roster_seed in range(4):
+            roster = make_roster(4 + 2 * roster_seed, seed=roster_seed)
+            # Монстр без скилов бьет обычной атакой
+            roster[1].skills = []
+            report = simulation.simulate(roster, 6, seed=100 * roster_seed)
+            for index in range(6):
+                with self.subTest(roster=roster_seed, battle=index):
+                    self.assertEqual(report.battle(index),
+                                     simulation.simulate_reference(roster, 100 * roster_seed + index))
+
+
+@skipIf(simulation is None, 'нужен NumPy')
+class TournamentTests(TestCase):
+    def tournament(self, results_path=None):
+        from .tournament import Tournament
+        return Tournament(make_roster(8, seed=3), team_size=2, battles=4, seed=7, shard_size=5, workers=2,
+                          results_path=results_path)
+
+    def test_resume_matches_uninterrupted_run(self):
+        expected = self.tournament().run()
+        results_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(results_dir.cleanup)
+        results_path = os.path.join(results_dir.name, 'results.jsonl')
+
+        class Interrupted(Exception):
+            pass
+
+        def stop(done, total):
+            if done == 3:
+                raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            self.tournament(results_path).run(progress=stop)
+        # Строка, оборванная при прерывании
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write('{"shard": 0, "resu')
+        progress = []
+        tournament = self.tournament(results_path)
+        self.assertEqual(tournament.run(progress=lambda done, total: progress.append(done)), expected)
+        # Готовые шарды не считаются заново
+        self.assertEqual(progress, list(range(4, len(tournament.shards) + 1)))
+
+
+class ReplayTests(TestCase):
+    def play(self, battle_state, turns, rng):
+        snapshots = []
+        while len(snapshots) < turns and not battle_state.is_battle_over():
+            hero = battle_state.get_active_participant()
+            target = rng.choice([monster for monster in battle_state.monsters if monster.health > 0])
+            if hero.skills and rng.random() < 0.5:
+                battle_state.process_hero_turn(hero.id, target.id, 'skill', rng.randrange(len(hero.skills)))
+            else:
+                battle_state.process_hero_turn(hero.id, target.id, 'attack')
+            battle_state.handle_monster_turns()
+            snapshots.append(battle_state.to_dict())
+        return snapshots
+
+    def test_replay_rebuilds_battle(self):
+        roster = make_roster(40, seed=3)
+        battle_state = BattleState.start(copy_roster(roster), seed=42)
+        # Бой переживает сохранение: зерно и журнал - все, что нужно генератору
+        battle_state = codec.decode(codec.encode(battle_state))
+        snapshots = self.play(battle_state, 60, random.Random(0))
+
+        replay = Replay.from_dict(json.loads(json.dumps(Replay.record(battle_state, roster).to_dict())))
+        self.assertEqual(replay.build().to_dict(), battle_state.to_dict())
+        for turns in (1, 17, len(snapshots)):
+            self.assertEqual(replay.build(turns).to_dict(), snapshots[turns - 1])
+        # Разошедшийся повтор не собирает молча другой бой
+        hero_id, _, action, skill_index = replay.actions[5]
+        replay.actions[5] = (hero_id, 10 ** 6, action, skill_index)
+        self.assertEqual(replay.build(5).to_dict(), snapshots[4])
+        with self.assertRaisesRegex(ValueError, 'ходе героя 5: Цель недоступна'):
+            replay.build()
+
+    def test_seed_decides_monster_turns(self):
+        roster = make_roster(40, seed=3)
+        logs = []
+        for seed in (1, 1, 2):
+            battle_state = BattleState.start(copy_roster(roster), seed=seed)
+            self.play(battle_state, 20, random.Random(0))
+            logs.append(battle_state.log.to_list())
+        self.assertEqual(logs[0], logs[1])
+        self.assertNotEqual(logs[0], logs[2])
+
+
+@override_settings(BATTLE_ARCHIVE={'BATCH_SIZE': 3, 'FLUSH_INTERVAL': None})
+class BattleArchiveTests(BattleStoreTestMixin, TestCase):
+    @staticmethod
+    def finished_battle(seed):
+        battle_state = make_battle(8, 10 ** 6, seed=seed)
+        assert battle_state.is_battle_over()
+        return battle_state
+
+    def test_finished_battle_is_archived_once(self):
+        create_roster(3)
+        self.client.post(reverse('start_game'))
+        battle_id = self.client.session['battle_id']
+        while True:
+            battle_state = get_battle_store().get(battle_id)
+            if battle_state.is_battle_over():
+                break
+            hero = battle_state.get_active_participant()
+            target = next(monster for monster in battle_state.monsters if monster.health > 0)
+            run_battle_action(battle_id, hero_action(hero.id, target.id, 'attack'))
+        # Действие после конца боя отклоняется и в архив второй раз не попадает
+        self.assertEqual(run_battle_action(battle_id, hero_action(hero.id, target.id, 'attack'))[2], 'Бой окончен')
+        # Ничего не записано, пока очередь не сброшена
+        self.assertFalse(Battle.objects.exists())
+        get_battle_archive().flush()
+
+        battle = Battle.objects.get()
+        self.assertEqual(battle.id.hex, battle_id)
+        self.assertEqual(battle.get_events().to_list(), battle_state.log.to_list())
+        self.assertEqual(battle.participants.count(), 6)
+        self.assertEqual(battle.participants.filter(won=True).count(), 3)
+
+    def test_history_filters(self):
+        archive = get_battle_archive()
+        battles = {f'{seed:032x}': self.finished_battle(seed) for seed in range(7)}
+        for battle_id, battle_state in battles.items():
+            archive.put(battle_id, battle_state)
+        archive.flush()
+        self.assertEqual(Battle.objects.count(), 7)
+
+        def fetch(**params):
+            response = self.client.get(reverse('history-list'), params)
+            self.assertEqual(response.status_code, 200)
+            return response.json()
+
+        page = fetch(page_size=5)
+        self.assertEqual(len(page['results']), 5)
+        self.assertIsNotNone(page['next'])
+
+        heroes_won = {battle_id for battle_id, battle_state in battles.items() if archive_winner(battle_state) == 'HERO'}
+        monsters_won = set(battles) - heroes_won
+        self.assertEqual({row['id'].replace('-', '') for row in fetch(winner='MONSTER')['results']}, monsters_won)
+
+        card = battles['0' * 32].heroes[0]
+        for outcome, expected in (('won', heroes_won), ('lost', monsters_won)):
+            rows = fetch(card_type='HERO', card_id=card.id, outcome=outcome)['results']
+            self.assertEqual({row['id'].replace('-', '') for row in rows}, expected)
+        self.assertEqual(len(fetch(card_type='HERO', card_id=card.id)['results']), 7)
+
+        battle_id = '0' * 32
+        detail = self.client.get(reverse('history-detail', args=[battle_id])).json()
+        self.assertEqual(len(detail['log']), len(battles[battle_id].log))
+
+    @override_settings(BATTLE_ARCHIVE={'BATCH_SIZE': 3, 'FLUSH_INTERVAL': None, 'RETRIES': 2, 'RETRY_DELAY': 0})
+    def test_failed_batch_is_retried_then_requeued(self):
+        archive = get_battle_archive()
+        for seed in range(5):
+            archive.put(f'{seed:032x}', self.finished_battle(seed))
+        # Первая попытка падает, повтор проходит
+        with mock.patch('Cards.archive.write', side_effect=[DatabaseError('locked'), None, None]) as write:
+            self.assertTrue(archive.flush())
+        self.assertEqual((write.call_count, archive.errors), (3, 0))
+        for seed in range(5):
+            archive.put(f'{seed:032x}', self.finished_battle(seed))
+        # База недоступна: пачка после всех повторов остается в очереди
+        with mock.patch('Cards.archive.write', side_effect=DatabaseError('down')) as write:
+            self.assertFalse(archive.flush())
+        self.assertEqual((write.call_count, archive.errors), (3, 1))
+        self.assertFalse(Battle.objects.exists())
+        self.assertTrue(archive.flush())
+        self.assertEqual(Battle.objects.count(), 5)
+
+
+@override_settings(BATTLE_ARCHIVE={'BATCH_SIZE': 4, 'FLUSH_INTERVAL': None})
+class CardStatsTests(BattleStoreTestMixin, TestCase):
+    def archive(self, seeds):
+        archive = get_battle_archive()
+        for seed in seeds:
+            archive.put(f'{seed:032x}', make_battle(8, 10 ** 6, seed=seed))
+        with self.captureOnCommitCallbacks(execute=True):
+            archive.flush()
+
+    @staticmethod
+    def table():
+        return sorted(CardStats.objects.values_list('card_type', 'card_id', 'battles', 'wins', 'damage_dealt',
+                                                    'rounds_survived'))
+
+    def test_incremental_matches_rebuild(self):
+        self.archive(range(6))
+        # Повторная запись тех же боёв статистику не меняет
+        self.archive(range(3))
+        incremental = self.table()
+        self.assertEqual(sum(row[2] for row in incremental), 6 * 8)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebuild_card_stats(chunk_size=4), 6)
+        self.assertEqual(self.table(), incremental)
+
+        hero = make_battle(8, 10 ** 6, seed=0).heroes[0]
+        damage = sum(event.damage for seed in range(6) for event in make_battle(8, 10 ** 6, seed=seed).log
+                     if event.actor_type == 'HERO' and event.actor_id == hero.id)
+        self.assertEqual(CardStats.objects.get(card_type='HERO', card_id=hero.id).damage_dealt, damage)
+
+    def test_stats_action_is_cached(self):
+        self.archive(range(2))
+        url = reverse('hero-stats')
+        first = self.client.get(url).json()
+        self.assertEqual({row['battles'] for row in first}, {2})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), first)
+        # Новые бои сбрасывают кэш
+        self.archive(range(2, 4))
+        self.assertEqual({row['battles'] for row in self.client.get(url).json()}, {4})
+        card = self.client.get(reverse('hero-card-stats', args=[first[0]['card_id']])).json()
+        self.assertEqual(card['battles'], 4)
+
+
+class RosterAPITests(BattleStoreTestMixin, TestCase):
+    def test_cursor_pagination_and_fields(self):
+        create_roster(5)
+        page = self.client.get(reverse('hero-list'), {'page_size': 2, 'fields': 'id,name'}).json()
+        self.assertEqual([set(row) for row in page['results']], [{'id', 'name'}] * 2)
+        ids = [row['id'] for row in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            ids += [row['id'] for row in page['results']]
+        self.assertEqual(ids, sorted(Hero.objects.values_list('id', flat=True)))
+
+    def test_unchanged_poll_is_not_modified(self):
+        create_roster(3)
+        url = reverse('monster-list')
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # Другие параметры - другое представление
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # С сессией 304 тоже обходится без запросов: сессия и пользователь не загружаются
+        self.client.force_login(User.objects.create_user('player'))
+        detail = reverse('monster-detail', args=[Monster.objects.first().id])
+        detail_etag = self.client.get(detail)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(detail, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+
+        monster = Monster.objects.first()
+        monster.health += 1
+        monster.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class RosterIOTests(BattleStoreTestMixin, TestCase):
+    def export(self, file_format):
+        response = self.client.get(reverse('roster-export-roster'), {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_export_import_round_trip(self):
+        create_roster(5)
+        Hero.objects.first().skills.add(*Skill.objects.all()[:3])
+        exported = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        csv_data = self.export('csv')
+        Hero.objects.all().delete()
+        Monster.objects.all().delete()
+
+        response = self.client.post(reverse('roster-import-roster'),
+                                    {'file': SimpleUploadedFile('pack.csv', csv_data)})
+        self.assertEqual(response.json(), {'created': 10, 'updated': 0})
+        imported = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual([{**card, 'id': None} for card in imported], [{**card, 'id': None} for card in exported])
+        # Скилы сопоставлены с уже существующими, а не созданы заново
+        self.assertEqual(Skill.objects.count(), 5)
+        self.assertEqual(len(cached_roster()), 10)
+
+        # Карта с известным id обновляется вместе со списком скилов
+        card = {**imported[0], 'health': 1, 'skills': [{'name': 'Новый', 'damage': 1}]}
+        response = self.client.post(reverse('roster-import-roster'),
+                                    {'file': SimpleUploadedFile('pack.jsonl', json.dumps(card).encode())})
+        self.assertEqual(response.json(), {'created': 0, 'updated': 1})
+        hero = Hero.objects.get(id=card['id'])
+        self.assertEqual((hero.health, [skill.name for skill in hero.skills.all()]), (1, ['Новый']))
+
+    def test_csv_skill_names_with_separators(self):
+        create_roster(1)
+        names = ['Удар; с оттяжкой', 'Яд: "змеиный", 2']
+        Hero.objects.get().skills.set([Skill.objects.create(name=name, damage=5) for name in names])
+        csv_data = self.export('csv')
+        Hero.objects.all().delete()
+        response = self.client.post(reverse('roster-import-roster'),
+                                    {'file': SimpleUploadedFile('pack.csv', csv_data)})
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1})
+        self.assertEqual(sorted(skill.name for skill in Hero.objects.get().skills.all()), sorted(names))
+
+    def test_import_queries_do_not_grow_with_chunk(self):
+        def pack(size):
+            return [roster_io.clean_record(i, {'type': card_type, 'name': f'{card_type} {i}', 'health': 10,
+                                               'attack': 1, 'initiative': i, 'skills': [{'name': f'С{i}', 'damage': i}]})
+                    for i in range(size) for card_type in ('HERO', 'MONSTER')]
+
+        with CaptureQueriesContext(connection) as small:
+            roster_io.import_records(pack(3))
+        with CaptureQueriesContext(connection) as large:
+            roster_io.import_records(pack(40))
+        self.assertEqual(len(large), len(small))
+
+    def test_bad_line_is_rejected(self):
+        response = self.client.post(reverse('roster-import-roster'),
+                                    {'file': SimpleUploadedFile('pack.jsonl', b'{"name": "X"}\n')})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Hero.objects.exists())
+
+
+class CardFragmentTests(TestCase):
+    def test_only_changed_cards_are_rendered(self):
+        caches[FRAGMENT_CACHE].clear()
+        cards = make_battle(10).participants
+        html = card_list(cards)
+        cards[3].health -= 7
+        template_class = type(get_template(CARD_TEMPLATE))
+        with mock.patch.object(template_class, 'render', autospec=True,
+                               side_effect=template_class.render) as render:
+            updated = card_list(cards)
+        self.assertEqual(render.call_count, 1)
+        self.assertNotEqual(updated, html)
+        self.assertIn(f'<span class="health">{cards[3].health}</span>', updated)
+
+
+class FileStoreTierTests(TestCase):
+    backend_class = FileBattleStore
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = directory.name
+
+    @property
+    def store_location(self):
+        return self.location
+
+    def backend(self):
+        return self.backend_class(self.store_location)
+
+    def age(self, battle_id, seconds):
+        stamp = time.time() - seconds
+        os.utime(os.path.join(self.location, f'{battle_id}.battle'), (stamp, stamp))
+
+    @staticmethod
+    def first_move(battle_state):
+        hero = battle_state.get_active_participant()
+        return hero.id, battle_state.alive('MONSTER')[0].id, 'attack'
+
+    def test_eviction_delete_and_reopen(self):
+        store = LRUBattleStore(self.backend(), max_size=2)
+        battles = [make_battle(6, n_turns=4, seed=seed) for seed in range(4)]
+        ids = [store.create(battle_state) for battle_state in battles]
+        self.assertEqual(len(store), 2)
+        # Вытесненный бой читается из постоянного уровня и снова попадает в память
+        loaded, version = store.load(ids[0])
+        self.assertEqual((loaded.to_dict(), version), (battles[0].to_dict(), 0))
+        self.assertEqual(store.load(ids[0])[0].to_dict(), battles[0].to_dict())
+
+        self.assertIsNone(loaded.hero_turn(*self.first_move(loaded)))
+        self.assertEqual(store.save(ids[0], loaded, version=0), 1)
+        store.delete(ids[1])
+        self.assertIsNone(store.load(ids[1]))
+
+        # Новый экземпляр хранилища (как после перезапуска процесса) видит те же бои
+        reopened = self.backend()
+        self.assertIsNone(reopened.load(ids[1]))
+        restored, version = reopened.load(ids[0])
+        self.assertEqual((restored.to_dict(), version), (loaded.to_dict(), 1))
+        self.assertEqual(reopened.load(ids[3])[0].to_dict(), battles[3].to_dict())
+
+    def test_purge_abandoned(self):
+        store = LRUBattleStore(self.backend(), max_size=8)
+        stale, fresh = store.create(make_battle(4, seed=1)), store.create(make_battle(4, seed=2))
+        self.age(stale, 3600)
+        self.assertEqual(store.purge(600), [stale])
+        self.assertIsNone(store.load(stale))
+        self.assertIsNone(self.backend().load(stale))
+        self.assertIsNotNone(store.load(fresh))
+
+        self.age(fresh, 3600)
+        with override_settings(BATTLE_STORE={'BACKEND': f'Cards.battle_store.{self.backend_class.__name__}',
+                                             'LOCATION': self.store_location, 'LRU_SIZE': 0}):
+            out = io.StringIO()
+            call_command('purge_battles', ttl=600, stdout=out)
+        self.assertIn('Удалено боёв: 1', out.getvalue())
+        self.assertIsNone(self.backend().load(fresh))
+
+
+class SQLiteStoreTierTests(FileStoreTierTests):
+    backend_class = SQLiteBattleStore
+
+    @property
+    def store_location(self):
+        return os.path.join(self.location, 'battles.sqlite3')
+
+    def age(self, battle_id, seconds):
+        connection = sqlite3.connect(self.store_location)
+        with connection:
+            connection.execute('UPDATE battles SET updated_at = ? WHERE id = ?', (time.time() - seconds, battle_id))
+        connection.close()
+
+
+class BattleRegistryTests(BattleStoreTestMixin, TestCase):
+    def test_memory_cap_and_idle_eviction_spill_to_backend(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = LRUBattleStore(FileBattleStore(directory.name), max_size=1000, max_bytes=4000, idle_timeout=60)
+        ids = [store.create(make_battle(6, n_turns=3, seed=seed)) for seed in range(50)]
+        self.assertLessEqual(store.memory_bytes, 4000)
+        self.assertLess(len(store), 50)
+        # Вытесненный бой читается с диска
+        self.assertEqual(store.load(ids[0])[0].to_dict(), make_battle(6, n_turns=3, seed=0).to_dict())
+
+        with mock.patch('Cards.battle_store.time.monotonic', return_value=time.monotonic() + 61):
+            store.load(ids[-1])
+        self.assertEqual(len(store), 1)
+
+    def test_battles_by_id(self):
+        create_roster(3)
+        first = self.client.post(reverse('battle-list')).json()
+        second = self.client.post(reverse('battle-list')).json()
+        self.assertEqual([battle['id'] for battle in self.client.get(reverse('battle-list')).json()],
+                         [second['id'], first['id']])
+
+        battle = self.client.get(reverse('battle-detail', args=[first['id']])).json()
+        monster = next(m for m in battle['battle']['monsters'] if m['health'] > 0)
+        response = self.client.post(reverse('battle-act', args=[first['id']]), {
+            'hero_id': battle['active']['id'], 'target_id': monster['id'], 'action': 'attack',
+            'version': battle['version'], 'since': battle['events']}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['log'][0]['actor_type'], 'HERO')
+        # Второй бой не тронут, чужой бой не виден
+        self.assertEqual(self.client.get(reverse('battle-detail', args=[second['id']])).json()['version'], 0)
+        other = self.client_class()
+        self.assertEqual(other.get(reverse('battle-detail', args=[first['id']])).status_code, 404)
+
+
+class TeamSelectionTests(BattleStoreTestMixin, TestCase):
+    def test_ids_tag_and_budget(self):
+        create_roster(10)
+        Hero.objects.filter(name__in=['Герой 1', 'Герой 2', 'Герой 3']).update(tag='пак', health=300)
+        participants = load_participants({'heroes': {'tag': 'пак', 'budget': 800},
+                                          'monsters': {'ids': [1, 2]}})
+        heroes = [card for card in participants if card.is_character_type == 'HERO']
+        # Сила героя пака 300 + 10 * 10 = 400: в бюджет 800 помещаются двое
+        self.assertEqual(len(heroes), 2)
+        self.assertTrue(all(card.name in ('Герой 1', 'Герой 2', 'Герой 3') for card in heroes))
+        self.assertEqual(sorted(card.id for card in participants if card.is_character_type == 'MONSTER'), [1, 2])
+        with self.assertRaises(TeamError):
+            load_participants({'monsters': {'ids': [1, 999]}})
+        with self.assertRaises(TeamError):
+            load_participants({'heroes': {'ids': '12'}})
+        # Сторона без описания тоже ограничена пределом стороны: самые сильные карты
+        with mock.patch('Cards.teams.MAX_TEAM', 4), mock.patch('Cards.teams.MAX_RAID_MONSTERS', 6):
+            participants = load_participants()
+            heroes = [card for card in participants if card.is_character_type == 'HERO']
+            self.assertEqual((len(heroes), len(participants)), (4, 8))
+            self.assertEqual(sorted(card.id for card in heroes),
+                             sorted(Hero.objects.order_by('-power', 'id').values_list('id', flat=True)[:4]))
+            participants = load_participants({'mode': 'raid', 'heroes': {'ids': [1]}})
+            self.assertEqual(len(participants), 7)
+        with self.assertRaises(TeamError):
+            load_participants([{'heroes': {'ids': [1]}}])
+        response = self.client.post(reverse('battle-list'), [1, 2], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_raid_with_hundreds_of_monsters(self):
+        create_roster(300)
+        spec = {'heroes': {'limit': 5}, 'monsters': {'limit': 300}}
+        self.assertEqual(self.client.post(reverse('battle-list'), spec, content_type='application/json').status_code, 400)
+        response = self.client.post(reverse('battle-list'), dict(spec, mode='raid'), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        battle = response.json()['battle']
+        self.assertEqual((len(battle['heroes']), len(battle['monsters'])), (5, 300))
+
+        battle_state = get_battle_store().get(response.json()['id'])
+        self.assertEqual(battle_state.alive('HERO'), [hero for hero in battle_state.heroes if hero.health > 0])
+
+
+class BenchmarkSuiteTests(BattleStoreTestMixin, TestCase):
+    def test_run_and_compare(self):
+        report = suite.run(sizes=[6])
+        metrics = report['results']['6']
+        self.assertEqual(metrics['game_play_get_queries'], 1)
+        self.assertEqual(suite.compare(report, report, 0.25), [])
+
+        slower = json.loads(json.dumps(report))
+        slower['results']['6']['from_dict_us'] = metrics['from_dict_us'] * 2
+        slower['results']['6']['start_game_queries'] += 1
+        regressions = suite.compare(report, slower, 0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(any('start_game_queries' in line for line in regressions))
+
+
+@override_settings(METRICS={'ENABLED': True, 'ALLOWED_IPS': ['127.0.0.1']})
+class ServerTimingTests(BattleStoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.phase_seconds.clear()
+        metrics.request_queries.clear()
+
+    def test_phases_header_and_metrics(self):
+        create_roster(3)
+        self.client.post(reverse('start_game'))
+        battle_state = get_battle_store().get(self.client.session['battle_id'])
+        hero = battle_state.get_active_participant()
+        response = self.client.post(reverse('game_play'), {
+            'hero_id': hero.id, 'target_id': battle_state.alive('MONSTER')[0].id, 'action': 'attack'})
+        phases = {item.split(';')[0] for item in response['Server-Timing'].split(', ')}
+        self.assertTrue({'session_load', 'store_read', 'decode', 'turn', 'encode', 'store_write', 'render',
+                         'db', 'total'} <= phases)
+
+        text = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').content.decode()
+        self.assertIn('cards_phase_seconds_count{view="game_play",phase="turn"} 1', text)
+        self.assertIn('cards_request_queries_count{view="game_play"} 1', text)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+    @override_settings(METRICS={'ENABLED': False})
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('start_game')))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+@override_settings(BATTLE_ARCHIVE={'BATCH_SIZE': 3, 'FLUSH_INTERVAL': None})
+class AutoResolveTests(BattleStoreTestMixin, TestCase):
+    def test_resolve_in_one_request(self):
+        create_roster(6)
+        battle = self.client.post(reverse('battle-list'), {'ai': 'normal'}, content_type='application/json').json()
+        url = reverse('battle-resolve', args=[battle['id']])
+        self.assertEqual(self.client.post(url, {'policy': 'nope'}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, ['threat'], content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'max_turns': -3}, content_type='application/json').status_code, 400)
+        # Отклоненный запрос бой не трогает
+        self.assertEqual(get_battle_store().load(battle['id'])[1], 0)
+
+        response = self.client.post(url, {'policy': 'threat'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        # Весь бой - одна запись в хранилище
+        self.assertEqual((body['over'], body['version']), (True, 1))
+        battle_state = get_battle_store().get(battle['id'])
+        hero_events = [event for event in battle_state.log if event.actor_type == 'HERO']
+        self.assertEqual(body['summary']['hero_turns'], len(hero_events))
+        self.assertEqual(body['summary']['winner'], archive_winner(battle_state))
+        self.assertEqual(self.client.post(url, {}, content_type='application/json').status_code, 409)
+        get_battle_archive().flush()
+        self.assertEqual(Battle.objects.get().id.hex, battle['id'])
@@ -0,0 +1,172 @@
+# Cards/tournament.py
+"""Турнир Монте-Карло: каждая команда героев против каждой команды монстров.
+
+Матчи делятся на шарды фиксированного размера и считаются в ProcessPoolExecutor. Состав передается
+воркеру один раз при старте (словари CardState.to_dict), дальше воркер работает без ORM.
+У каждого шарда свой детерминированный поток random.Random(f'{seed}:{shard}'), поэтому результат
+не зависит от числа процессов и порядка выполнения шардов. Готовые шарды дописываются в JSON-lines
+файл, и прерванный турнир продолжается с места остановки.
+"""
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .battle_state import CardState
+from . import simulation
+
+Matchup = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+_heroes: List[CardState] = []
+_monsters: List[CardState] = []
+
+
+def card_label(card: CardState) -> str:
+    return f'{card.is_character_type}:{card.id}'
+
+
+def plan_matchups(n_heroes: int, n_monsters: int, team_size: int) -> List[Matchup]:
+    """Все пары (команда героев, команда монстров) в виде индексов в списках героев и монстров."""
+    hero_teams = itertools.combinations(range(n_heroes), min(team_size, n_heroes))
+    monster_teams = list(itertools.combinations(range(n_monsters), min(team_size, n_monsters)))
+    return [(heroes, monsters) for heroes in hero_teams for monsters in monster_teams]
+
+
+def _init_worker(heroes_data: List[Dict], monsters_data: List[Dict]):
+    global _heroes, _monsters
+    _heroes = [CardState.from_dict(data) for data in heroes_data]
+    _monsters = [CardState.from_dict(data) for data in monsters_data]
+
+
+def _run_shard(shard: int, matchups: Sequence[Matchup], seed: int, battles: int, exact: bool,
+               max_turns: int) -> Dict:
+    rng = random.Random(f'{seed}:{shard}')
+    results = []
+    for hero_team, monster_team in matchups:
+        roster = [_heroes[i] for i in hero_team] + [_monsters[i] for i in monster_team]
+        batch = simulation.BatchBattle(roster, battles, seed=rng.getrandbits(32), exact=exact)
+        batch.run(max_turns=max_turns)
+        results.append({
+            'heroes': list(hero_team),
+            'monsters': list(monster_team),
+            'battles': battles,
+            'heroes_won': int((batch.winner == simulation.HEROES_WIN).sum()),
+            'monsters_won': int((batch.winner == simulation.MONSTERS_WIN).sum()),
+            'turns': int(batch.turns[batch.finished].sum()),
+        })
+    return {'shard': shard, 'results': results}
+
+
+class Tournament:
+    def __init__(self, roster: Iterable[CardState], team_size: int = 1, battles: int = 100, seed: int = 0,
+                 shard_size: int = 64, workers: Optional[int] = None, results_path: Optional[str] = None,
+                 exact: bool = True, max_turns: int = 10_000):
+        roster = list(roster)
+        self.heroes = [card for card in roster if card.is_character_type == 'HERO']
+        self.monsters = [card for card in roster if card.is_character_type == 'MONSTER']
+        self.team_size = team_size
+        self.battles = battles
+        self.seed = seed
+        self.shard_size = shard_size
+        self.workers = workers or os.cpu_count()
+        self.results_path = results_path
+        self.exact = exact
+        self.max_turns = max_turns
+        self.matchups = plan_matchups(len(self.heroes), len(self.monsters), team_size)
+        self.run_key = self._run_key()
+
+    @property
+    def shards(self) -> List[Sequence[Matchup]]:
+        return [self.matchups[i:i + self.shard_size] for i in range(0, len(self.matchups), self.shard_size)]
+
+    def _run_key(self) -> Dict:
+        # Параметры, при которых сохраненные шарды можно переиспользовать
+        roster = json.dumps([card.to_dict() for card in self.heroes + self.monsters], sort_keys=True)
+        return {'seed': self.seed, 'battles': self.battles, 'team_size': self.team_size,
+                'shard_size': self.shard_size, 'exact': self.exact, 'max_turns': self.max_turns,
+                'roster': hashlib.sha1(roster.encode()).hexdigest()}
+
+    def _load_done(self) -> Dict[int, Dict]:
+        done = {}
+        if not self.results_path or not os.path.exists(self.results_path):
+            return done
+        with open(self.results_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Строка, оборванная при прерывании - шард посчитаем заново
+                    continue
+                if all(record.get(key) == value for key, value in self.run_key.items()):
+                    done[record['shard']] = record
+        return done
+
+    def run(self, progress=None) -> Dict:
+        shards = self.shards
+        done = self._load_done()
+        pending = [shard for shard in range(len(shards)) if shard not in done]
+
+        if pending:
+            results_file = open(self.results_path, 'a', encoding='utf-8') if self.results_path else None
+            try:
+                with ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=_init_worker,
+                        initargs=([card.to_dict() for card in self.heroes],
+                                  [card.to_dict() for card in self.monsters])) as executor:
+                    futures = [
+                        executor.submit(_run_shard, shard, shards[shard], self.seed, self.battles, self.exact,
+                                        self.max_turns)
+                        for shard in pending
+                    ]
+                    for future in as_completed(futures):
+                        record = future.result()
+                        record.update(self.run_key)
+                        done[record['shard']] = record
+                        if results_file:
+                            results_file.write(json.dumps(record) + '\n')
+                            results_file.flush()
+                        if progress:
+                            progress(len(done), len(shards))
+            finally:
+                if results_file:
+                    results_file.close()
+
+        return self.report([done[shard] for shard in sorted(done)])
+
+    def report(self, records: Iterable[Dict]) -> Dict:
+        """Сводный отчет по всем шардам."""
+        cards = {}
+        matchups = []
+        totals = {'battles': 0, 'heroes_won': 0, 'monsters_won': 0, 'turns': 0}
+        for record in records:
+            for result in record['results']:
+                heroes = [self.heroes[i] for i in result['heroes']]
+                monsters = [self.monsters[i] for i in result['monsters']]
+                for key in totals:
+                    totals[key] += result[key]
+                for team, won in ((heroes, result['heroes_won']), (monsters, result['monsters_won'])):
+                    for card in team:
+                        stats = cards.setdefault(card_label(card), {'name': card.name, 'battles': 0, 'won': 0})
+                        stats['battles'] += result['battles']
+                        stats['won'] += won
+                matchups.append({
+                    'heroes': [card_label(card) for card in heroes],
+                    'monsters': [card_label(card) for card in monsters],
+                    'heroes_win_rate': result['heroes_won'] / max(result['battles'], 1),
+                })
+        finished = totals['heroes_won'] + totals['monsters_won']
+        for stats in cards.values():
+            stats['win_rate'] = stats['won'] / max(stats['battles'], 1)
+        return {
+            'matchups_total': len(self.matchups),
+            'matchups_done': len(matchups),
+            'battles': totals['battles'],
+            'heroes_win_rate': totals['heroes_won'] / max(finished, 1),
+            'monsters_win_rate': totals['monsters_won'] / max(finished, 1),
+            'mean_turns': totals['turns'] / max(finished, 1),
+            'cards': cards,
+            'matchups': matchups,
+        }
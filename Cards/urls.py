@@ -1,6 +1,7 @@
 # urls.py
 from django.urls import path, include
 from . import views
+from .metrics import metrics_view
 from rest_framework import routers
 
 router = routers.DefaultRouter()
@@ -8,10 +9,17 @@ router.register(r'heroes', views.HeroViewSet)
 router.register(r'monsters', views.MonsterViewSet)
 router.register(r'skills', views.SkillViewSet)
 router.register(r'battle', views.BattleViewSet, basename='battle')
+router.register(r'history', views.BattleHistoryViewSet, basename='history')
+router.register(r'roster', views.RosterIOViewSet, basename='roster')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('create_data/', views.create_initial_data, name='create_data'),
     path('start_game/', views.start_game, name='start_game'),
     path('game_play/', views.game_play, name='game_play'),
+    path('play/state/', views.battle_status, name='play_state'),
+    path('play/act/', views.battle_act, name='play_act'),
+    path('play/monster_turn/', views.battle_monster_turn, name='play_monster_turn'),
+    path('play/events/', views.battle_events, name='play_events'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,10 +1,28 @@
 # views.py
 from django.shortcuts import render, redirect
-from .models import Hero, Monster, Skill, CharacterType
-from .battle_state import BattleState, CardState, SkillState
+from .models import Battle, BattleParticipant, CardStats, Hero, Monster, Skill, CharacterType
+from .battle_state import BattleState
+from .archive import get_battle_archive
+from .battle_feed import battle_feed
+from .battle_store import BattleConflict, get_battle_store
+from .metrics import phase
+from .roster import card_queryset, roster_modified, roster_version
+from .stats import cached_stats
+from .teams import TeamError, battle_ai, load_participants, spec_from_form
+from . import autoplay, roster_io
+import asyncio
+import json
 import logging
+import zlib
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import viewsets
-from .serializers import HeroSerializer, MonsterSerializer, SkillSerializer
+from .serializers import (BattleDetailSerializer, BattleParticipantHistorySerializer, BattleSerializer,
+                          CardStatsSerializer, HeroSerializer, MonsterSerializer, SkillSerializer)
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.request import Request
@@ -14,31 +32,587 @@ from django.urls import reverse
 logger = logging.getLogger(__name__)
 
 
-class SkillViewSet(viewsets.ModelViewSet):
-    queryset = Skill.objects.all()
+class RosterPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class RosterAPIMixin:
+    """Общее для API героев, монстров и скилов: курсорная пагинация, ?fields= и условные ответы.
+
+    ETag и Last-Modified берутся из версии состава (Cards/roster.py), которая лежит в кэше: если клиент
+    прислал актуальный If-None-Match / If-Modified-Since, ответ 304 отдается без запросов к БД - в том числе
+    без чтения сессии: аутентификация в этом случае откладывается до первого обращения к request.user.
+    """
+    pagination_class = RosterPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.request.query_params.get('fields')
+        if fields and 'skills' not in fields.split(','):
+            # Скилы не нужны - не подгружаем их
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def roster_etag(self, request):
+        # Ответ зависит от пути с параметрами (курсор, fields) и от формата (JSON или browsable API)
+        variant = f'{request.get_full_path()}|{request.accepted_renderer.format}'
+        return f'"{roster_version()}-{zlib.crc32(variant.encode()):08x}"'
+
+    def check_conditional(self, request):
+        etag, last_modified = self.roster_etag(request), int(roster_modified())
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        return etag, last_modified, response
+
+    def perform_authentication(self, request):
+        # DRF сразу загружает сессию и пользователя. Для 304 они не нужны: проверка прав, если ей нужен
+        # пользователь, сама вызовет аутентификацию через request.user
+        if self.action in ('list', 'retrieve'):
+            self._conditional = self.check_conditional(request)
+            if self._conditional[2] is not None:
+                return
+        super().perform_authentication(request)
+
+    def conditional(self, request, handler, *args, **kwargs):
+        etag, last_modified, response = getattr(self, '_conditional', None) or self.check_conditional(request)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+
+class SkillViewSet(RosterAPIMixin, viewsets.ModelViewSet):
+    queryset = Skill.objects.order_by('id')
     serializer_class = SkillSerializer
 
 
-class HeroViewSet(viewsets.ModelViewSet):
-    queryset = Hero.objects.all()
+class CardStatsMixin:
+    """Статистика карт из CardStats: /stats/ - по всем картам типа, /{id}/stats/ - по одной. Ответы кэшируются."""
+    card_type = None
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        def build():
+            queryset = CardStats.objects.filter(card_type=self.card_type).order_by('card_id')
+            return CardStatsSerializer(queryset, many=True).data
+        return Response(cached_stats(self.card_type, build))
+
+    @action(detail=True, methods=['get'], url_path='stats')
+    def card_stats(self, request, pk=None):
+        def build():
+            stats = CardStats.objects.filter(card_type=self.card_type, card_id=pk).first()
+            return CardStatsSerializer(stats or CardStats(card_type=self.card_type, card_id=int(pk))).data
+        try:
+            int(pk)
+        except ValueError:
+            return Response({"message": "id карты - число"}, status=400)
+        return Response(cached_stats(f'{self.card_type}:{pk}', build))
+
+
+class HeroViewSet(CardStatsMixin, RosterAPIMixin, viewsets.ModelViewSet):
+    queryset = card_queryset(Hero)
     serializer_class = HeroSerializer
+    card_type = CharacterType.HERO
 
 
-class MonsterViewSet(viewsets.ModelViewSet):
-    queryset = Monster.objects.all()
+class MonsterViewSet(CardStatsMixin, RosterAPIMixin, viewsets.ModelViewSet):
+    queryset = card_queryset(Monster)
     serializer_class = MonsterSerializer
+    card_type = CharacterType.MONSTER
+
+
+class RosterIOViewSet(viewsets.ViewSet):
+    """Импорт и экспорт состава наборами карт (JSON-lines или CSV, см. Cards/roster_io.py).
+
+    ?file_format=jsonl|csv - параметр ?format= занят DRF под выбор рендерера. При импорте формат
+    по умолчанию берется из расширения загруженного файла.
+    """
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_roster(self, request: Request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"message": "Нужен файл в поле file"}, status=400)
+        file_format = request.query_params.get('file_format') or upload.name.rpartition('.')[2].lower()
+        try:
+            # Файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE Django держит на диске, а читаем мы их построчно
+            counts = roster_io.import_file(upload.file, file_format)
+        except roster_io.RosterImportError as exc:
+            return Response({"message": str(exc)}, status=400)
+        return Response(counts)
+
+    @action(detail=False, url_path='export')
+    def export_roster(self, request: Request):
+        file_format = request.query_params.get('file_format', 'jsonl')
+        if file_format not in roster_io.FORMATS:
+            return Response({"message": f"Неизвестный формат {file_format}"}, status=400)
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(roster_io.export_lines(file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="roster.{file_format}"'
+        return response
+
+
+class HistoryPagination(CursorPagination):
+    # Курсор вместо номера страницы: без COUNT(*) и OFFSET, каждая страница - проход по индексу
+    ordering = '-finished_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class BattleHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """История завершенных боёв.
+
+    Фильтры: ?winner=HERO|MONSTER, ?card_type=HERO|MONSTER&card_id=N (бои карты) и вместе с картой
+    ?outcome=won|lost. Бои карты выбираются из BattleParticipant по индексу (тип, id[, исход], время).
+    """
+    pagination_class = HistoryPagination
+
+    def card_filter(self):
+        params = self.request.query_params
+        if 'card_id' not in params:
+            if 'outcome' in params:
+                raise ValidationError({'outcome': 'Исход задается только вместе с картой (card_type и card_id)'})
+            return None
+        card_type = params.get('card_type', CharacterType.HERO)
+        outcome = params.get('outcome')
+        if card_type not in CharacterType.values or outcome not in (None, 'won', 'lost'):
+            raise ValidationError({'card_type': CharacterType.values, 'outcome': ['won', 'lost']})
+        try:
+            filters = {'card_type': card_type, 'card_id': int(params['card_id'])}
+        except ValueError:
+            raise ValidationError({'card_id': 'Должно быть числом'})
+        if outcome:
+            filters['won'] = outcome == 'won'
+        return filters
+
+    def get_queryset(self):
+        if self.action == 'list':
+            card = self.card_filter()
+            if card is not None:
+                return BattleParticipant.objects.filter(**card).select_related('battle').defer('battle__battle_log')
+            queryset = Battle.objects.defer('battle_log')
+            winner = self.request.query_params.get('winner')
+            if winner:
+                queryset = queryset.filter(winner=winner)
+            return queryset
+        return Battle.objects.all()
+
+    def get_serializer_class(self):
+        if self.action != 'list':
+            return BattleDetailSerializer
+        if 'card_id' in self.request.query_params:
+            return BattleParticipantHistorySerializer
+        return BattleSerializer
+
+
+def load_battle(request):
+    """Возвращает (id боя, BattleState) для боя из сессии или (None, None)."""
+    battle_id = request.session.get('battle_id')
+    if not battle_id:
+        return None, None
+    battle_state = get_battle_store().get(battle_id)
+    if battle_state is None:
+        del request.session['battle_id']
+        return None, None
+    return battle_id, battle_state
+
+
+# Сколько боёв одной сессии помнить для /battle/: старые забываются (но остаются в хранилище до конца)
+SESSION_BATTLES = 100
+
+
+def session_battles(session) -> list:
+    """id боёв сессии, от старых к новым."""
+    return session.get('battles', [])
+
+
+def remember_battle(session, battle_id):
+    session['battles'] = (session_battles(session) + [battle_id])[-SESSION_BATTLES:]
+
+
+def forget_battle(session, battle_id):
+    battles = session_battles(session)
+    if battle_id in battles:
+        session['battles'] = [other for other in battles if other != battle_id]
+
+
+def new_battle(session, spec=None) -> tuple:
+    """Новый бой, записанный в хранилище и в список боёв сессии. Возвращает (id, бой).
+
+    spec - описание состава и уровня ИИ (Cards/teams.py), без него - команды по умолчанию (до MAX_TEAM карт
+    на сторону). Может бросить TeamError.
+    """
+    # Если первыми по инициативе ходят монстры - их ходы проводятся сразу
+    battle_state = BattleState.start(load_participants(spec), ai=battle_ai(spec))
+    battle_id = get_battle_store().create(battle_state)
+    remember_battle(session, battle_id)
+    if battle_state.is_battle_over():
+        get_battle_archive().put(battle_id, battle_state)
+    return battle_id, battle_state
+
+
+# Сколько раз повторить действие, если бой изменили параллельно
+BATTLE_RETRIES = 8
+
+
+def run_battle_action(battle_id, act, version=None):
+    """Читает бой, применяет act(battle_state) и записывает его с проверкой версии (compare-and-swap).
+
+    act возвращает текст ошибки, если действие недопустимо (тогда бой не записывается). Если запись
+    проиграла гонку, действие повторяется на свежем состоянии. version - версия, которую видел клиент:
+    если бой уже другой, сразу BattleConflict. Возвращает (бой, версия, ошибка) или None, если боя нет.
+    """
+    store = get_battle_store()
+    for _ in range(BATTLE_RETRIES):
+        loaded = store.load(battle_id)
+        if loaded is None:
+            return None
+        battle_state, current = loaded
+        if version is not None and version != current:
+            raise BattleConflict(battle_id)
+        was_over = battle_state.is_battle_over()
+        with phase('turn'):
+            error = act(battle_state)
+        if error:
+            return battle_state, current, error
+        try:
+            new_version = store.save(battle_id, battle_state, version=current)
+        except BattleConflict:
+            continue
+        # Бой закончился этим действием: в архив попадет ровно один раз - у запроса, выигравшего запись
+        if not was_over and battle_state.is_battle_over():
+            get_battle_archive().put(battle_id, battle_state)
+        battle_feed.publish(battle_id)
+        return battle_state, new_version, None
+    raise BattleConflict(battle_id)
+
+
+def hero_action(hero_id, target_id, action, skill_index=None):
+    """Ход героя и следующие за ним ходы монстров."""
+    def act(battle_state):
+        return battle_state.hero_turn(hero_id, target_id, action, skill_index)
+    return act
+
+
+def hero_payload_action(payload):
+    """hero_action по JSON-телу {hero_id, target_id, action, skill_index}."""
+    return hero_action(payload.get('hero_id'), payload.get('target_id'), payload.get('action'),
+                       payload.get('skill_index'))
+
+
+def monster_action(battle_state):
+    return battle_state.monster_turn()
 
 
 class BattleViewSet(viewsets.ViewSet):
+    """Бои сессии по id: POST /battle/ - новый бой, GET /battle/ - список, GET /battle/{id}/ - состояние,
+    POST /battle/{id}/act/ - ход героя (тело как у play/act), POST /battle/{id}/resolve/ - доиграть бой.
+    monster_turn и log работают с текущим боем страницы игры (battle_id в сессии).
+    """
+
+    def get_battle_id(self, request, pk):
+        if pk not in session_battles(request.session):
+            raise NotFound('Бой не найден')
+        return pk
+
+    def create(self, request):
+        """Тело - описание состава: {heroes: {ids, tag, budget, limit}, monsters: {...}, mode: battle|raid, ai}."""
+        if not isinstance(request.data, dict):
+            return Response({"message": "Тело запроса - JSON-объект"}, status=400)
+        try:
+            battle_id, battle_state = new_battle(request.session, request.data or None)
+        except TeamError as exc:
+            return Response({"message": str(exc)}, status=400)
+        return Response(dict(battle_payload(battle_state, 0), id=battle_id), status=201)
+
+    def list(self, request):
+        store = get_battle_store()
+        battles = []
+        for battle_id in reversed(session_battles(request.session)):
+            loaded = store.load(battle_id)
+            if loaded is None:
+                forget_battle(request.session, battle_id)
+                continue
+            battle_state, version = loaded
+            active = battle_state.get_active_participant()
+            battles.append({
+                'id': battle_id,
+                'version': version,
+                'over': battle_state.is_battle_over(),
+                'round': battle_state.round,
+                'events': len(battle_state.log),
+                'active': {'type': active.is_character_type, 'id': active.id} if active else None,
+            })
+        return Response(battles)
+
+    def retrieve(self, request, pk=None):
+        loaded = get_battle_store().load(self.get_battle_id(request, pk))
+        if loaded is None:
+            forget_battle(request.session, pk)
+            raise NotFound('Бой не найден')
+        return Response(dict(battle_payload(*loaded), id=pk))
+
+    @action(detail=True, methods=['post'])
+    def act(self, request, pk=None):
+        body, status = apply_battle_request(self.get_battle_id(request, pk), request.data, hero_payload_action)
+        return Response(body, status=status)
+
+    @action(detail=True, methods=['post'])
+    def resolve(self, request, pk=None):
+        """Доигрывает бой за героев в одном запросе: {policy, max_turns, version}.
+
+        Бой читается и записывается один раз, промежуточные ходы не сохраняются. Ответ - итоговое
+        состояние (как у retrieve) и сводка доигранной части (Cards/autoplay.py).
+        """
+        battle_id = self.get_battle_id(request, pk)
+        if not isinstance(request.data, dict):
+            return Response({"message": "Тело запроса - JSON-объект"}, status=400)
+        policy = request.data.get('policy') or autoplay.DEFAULT_POLICY
+        if not isinstance(policy, str) or policy not in autoplay.HERO_POLICIES:
+            return Response({"message": f"Политика героев - одна из {sorted(autoplay.HERO_POLICIES)}"}, status=400)
+        try:
+            max_turns = min(int(request.data.get('max_turns') or autoplay.MAX_RESOLVE_TURNS),
+                            autoplay.MAX_RESOLVE_TURNS)
+            version = request.data.get('version')
+            version = None if version is None else int(version)
+        except (TypeError, ValueError):
+            return Response({"message": "max_turns и version должны быть числами"}, status=400)
+        if max_turns < 1:
+            return Response({"message": "max_turns должен быть положительным"}, status=400)
+
+        summary = {}
+
+        def act(battle_state):
+            if battle_state.is_battle_over():
+                return 'Бой окончен'
+            summary.clear()
+            summary.update(autoplay.resolve(battle_state, policy, max_turns))
+
+        try:
+            result = run_battle_action(battle_id, act, version)
+        except BattleConflict:
+            return Response({"message": "Бой изменился, обновите состояние"}, status=409)
+        if result is None:
+            forget_battle(request.session, battle_id)
+            raise NotFound('Бой не найден')
+        battle_state, version, error = result
+        body = dict(battle_payload(battle_state, version), id=battle_id)
+        if error:
+            return Response(dict(body, message=error), status=409)
+        return Response(dict(body, summary=summary))
+
     @action(detail=False, methods=['get'])
     def monster_turn(self, request):
-        if 'battle_state' not in request.session:
+        battle_id = request.session.get('battle_id')
+        try:
+            result = run_battle_action(battle_id, monster_action) if battle_id else None
+        except BattleConflict:
+            return Response({"message": "Бой изменился, повторите запрос"}, status=409)
+        if result is None:
             return Response({"message": "Игра не начата"}, status=400)
-        battle_state = BattleState.from_dict(request.session['battle_state'])
-        battle_state.process_monster_turn()
-        request.session['battle_state'] = battle_state.to_dict()
+        battle_state, _, error = result
+        if error:
+            return Response({"message": error}, status=409)
         return Response(battle_state.to_dict())
 
+    @action(detail=False, methods=['get'])
+    def log(self, request):
+        """События боя: ?tail=K - последние K, иначе страница ?offset=&limit=."""
+        _, battle_state = load_battle(request)
+        if battle_state is None:
+            return Response({"message": "Игра не начата"}, status=400)
+        try:
+            tail = int(request.query_params.get('tail', 0))
+            offset = int(request.query_params.get('offset', 0))
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({"message": "tail, offset и limit должны быть числами"}, status=400)
+        total = len(battle_state.log)
+        if tail > 0:
+            offset = max(total - tail, 0)
+            events = battle_state.log.tail(tail)
+        else:
+            events = battle_state.log.page(max(offset, 0), max(limit, 0))
+        return Response({
+            'count': total,
+            'offset': offset,
+            'events': [dict(event.to_dict(), text=text)
+                       for event, text in zip(events, battle_state.describe(events))],
+        })
+
+
+def battle_payload(battle_state, version):
+    active = battle_state.get_active_participant()
+    return {
+        'version': version,
+        'over': battle_state.is_battle_over(),
+        'active': {'type': active.is_character_type, 'id': active.id} if active else None,
+        'events': len(battle_state.log),
+        'battle': battle_state.to_dict(with_events=False),
+    }
+
+
+def battle_delta(battle_state, version, since):
+    """Изменения боя после первых since событий: новые события с текстом и карты, которых они касаются.
+
+    Размер ответа зависит от числа новых событий, а не от длины боя и не от размера состава.
+    """
+    since = min(max(since, 0), len(battle_state.log))
+    events = battle_state.log.events(since)
+    keys = {(event.actor_type, event.actor_id) for event in events}
+    keys.update((event.target_type, event.target_id) for event in events)
+    active = battle_state.get_active_participant()
+    if active is not None:
+        keys.add(active.key)
+    cards = battle_state.cards
+    return {
+        'version': version,
+        'over': battle_state.is_battle_over(),
+        'round': battle_state.round,
+        'active': {'type': active.is_character_type, 'id': active.id} if active else None,
+        'since': since,
+        'events': len(battle_state.log),
+        'log': [dict(event.to_dict(), text=text) for event, text in zip(events, battle_state.describe(events))],
+        'cards': [cards[key].to_dict() for key in keys],
+    }
+
+
+def apply_battle_request(battle_id, payload, make_act):
+    """Действие над боем по телу JSON-запроса: версия, since и make_act(payload) - см. run_battle_request.
+
+    Возвращает (тело ответа, статус).
+    """
+    try:
+        version = payload.get('version')
+        version = None if version is None else int(version)
+        since = payload.get('since')
+        since = None if since is None else int(since)
+    except (ValueError, TypeError, AttributeError):
+        return {"message": "Тело запроса - JSON-объект, version и since - числа"}, 400
+    try:
+        result = run_battle_action(battle_id, make_act(payload), version)
+    except BattleConflict:
+        return {"message": "Бой изменился, обновите состояние"}, 409
+    if result is None:
+        return {"message": "Игра не начата"}, 400
+    battle_state, version, error = result
+    if since is None:
+        response = battle_payload(battle_state, version)
+    else:
+        response = battle_delta(battle_state, version, since)
+    if error:
+        return dict(response, message=error), 409
+    return response, 200
+
+
+async def run_battle_request(request, make_act):
+    """Общая часть асинхронных действий: бой из сессии, версия из тела запроса, ответ JSON.
+
+    make_act(payload) по телу запроса возвращает действие для run_battle_action. Если в теле есть since
+    (сколько событий боя уже у клиента), ответ - только изменения после них (battle_delta).
+
+    Работа с хранилищем уходит в пул потоков (thread_sensitive=False), поэтому запросы к разным боям
+    идут параллельно, а запросы к одному бою упорядочивает проверка версии при записи.
+    """
+    battle_id = await request.session.aget('battle_id')
+    if not battle_id:
+        return JsonResponse({"message": "Игра не начата"}, status=400)
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        payload = None
+    body, status = await sync_to_async(apply_battle_request, thread_sensitive=False)(battle_id, payload, make_act)
+    return JsonResponse(body, status=status)
+
+
+async def battle_status(request):
+    """GET: текущее состояние боя из сессии и его версия."""
+    battle_id = await request.session.aget('battle_id')
+    loaded = await sync_to_async(get_battle_store().load, thread_sensitive=False)(battle_id) if battle_id else None
+    if loaded is None:
+        return JsonResponse({"message": "Игра не начата"}, status=400)
+    return JsonResponse(battle_payload(*loaded))
+
+
+FEED_KEEPALIVE = 15.0
+
+
+def sse_message(data, event_id=None, event=None) -> str:
+    lines = [f'event: {event}'] if event else []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def battle_events(request):
+    """GET, text/event-stream: изменения боя из сессии после каждого хода (server-sent events).
+
+    Каждое сообщение - battle_delta с id = число событий боя, поэтому EventSource после переподключения
+    сам присылает Last-Event-ID и получает только пропущенное. Начальная точка - ?since=. Поток держит
+    соединение, пока бой не закончится, - нужен ASGI-сервер (Config/asgi.py).
+    """
+    battle_id = await request.session.aget('battle_id')
+    if not battle_id:
+        return JsonResponse({"message": "Игра не начата"}, status=400)
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({"message": "since - число"}, status=400)
+    load = sync_to_async(get_battle_store().load, thread_sensitive=False)
+
+    async def stream():
+        nonlocal since
+        with battle_feed.subscribe(battle_id) as changed:
+            while True:
+                changed.clear()
+                loaded = await load(battle_id)
+                if loaded is None:
+                    yield sse_message({"message": "Бой не найден"}, event='gone')
+                    return
+                battle_state, version = loaded
+                if len(battle_state.log) > since:
+                    yield sse_message(battle_delta(battle_state, version, since), event_id=len(battle_state.log))
+                    since = len(battle_state.log)
+                if battle_state.is_battle_over():
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), FEED_KEEPALIVE)
+                except TimeoutError:
+                    # Комментарий не дает прокси закрыть соединение; заодно перечитываем бой,
+                    # если ход записал другой процесс
+                    yield ': ping\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def battle_act(request):
+    """POST JSON {hero_id, target_id, action, skill_index, version}: ход героя и ответные ходы монстров."""
+    if request.method != 'POST':
+        return JsonResponse({"message": "Только POST"}, status=405)
+    return await run_battle_request(request, hero_payload_action)
+
+
+async def battle_monster_turn(request):
+    """POST JSON {version}: ход текущего монстра."""
+    if request.method != 'POST':
+        return JsonResponse({"message": "Только POST"}, status=405)
+    return await run_battle_request(request, lambda payload: monster_action)
+
 
 def create_initial_data(request):
     """Создает начальные данные (героев и монстров) если их нет."""
@@ -58,34 +632,10 @@ def create_initial_data(request):
         {"name": "Монстр 3", "health": 70, "attack": 12, "initiative": 4, 'skills': [{'name': 'Яд', 'damage': 10}]},
     ]
 
-    # Создаем все навыки
-    all_skills = {}
-    for data in heroes_data + monsters_data:
-        for skill_data in data.get('skills', []):
-            skill, created = Skill.objects.get_or_create(**skill_data)
-            all_skills[skill_data['name']] = skill
-
-    # Создаем всех героев и добавляем навыки
-    for hero_data in heroes_data:
-        hero = Hero.objects.create(
-            name=hero_data['name'],
-            health=hero_data['health'],
-            attack=hero_data['attack'],
-            initiative=hero_data['initiative'],
-        )
-        for skill_data in hero_data['skills']:
-            hero.skills.add(all_skills[skill_data['name']])
-
-    # Создаем всех монстров и добавляем навыки
-    for monster_data in monsters_data:
-        monster = Monster.objects.create(
-            name=monster_data['name'],
-            health=monster_data['health'],
-            attack=monster_data['attack'],
-            initiative=monster_data['initiative'],
-        )
-        for skill_data in monster_data.get('skills', []):
-            monster.skills.add(all_skills[skill_data['name']])
+    # Те же bulk-вставки, что и при импорте наборов карт
+    records = [{**data, 'type': CharacterType.HERO} for data in heroes_data] + [
+        {**data, 'type': CharacterType.MONSTER} for data in monsters_data]
+    roster_io.import_records(roster_io.clean_record(line, data) for line, data in enumerate(records, 1))
 
     return render(request, 'Cards/data_created.html', {'message': 'Данные успешно созданы!'})
 
@@ -93,82 +643,55 @@ def create_initial_data(request):
 def start_game(request):
     """Начинает новую игру"""
     if request.method == 'POST':
-        # Очищаем сессию
-        if 'battle_state' in request.session:
-            del request.session['battle_state']
-        # Получаем героев и монстров из БД
-        heroes = list(Hero.objects.all())
-        monsters = list(Monster.objects.all())
-
-        # Создаем BattleState
-        participants = [
-                           CardState(
-                               id=hero.id,
-                               name=hero.name,
-                               health=hero.health,
-                               attack=hero.attack,
-                               initiative=hero.initiative,
-                               active=hero.active,
-                               is_character_type=hero.is_character_type,
-                               skills=[SkillState(name=skill.name, damage=skill.damage) for skill in hero.skills.all()]
-                           ) for hero in heroes
-                       ] + [
-                           CardState(
-                               id=monster.id,
-                               name=monster.name,
-                               health=monster.health,
-                               attack=monster.attack,
-                               initiative=monster.initiative,
-                               active=monster.active,
-                               is_character_type=monster.is_character_type,
-                               skills=[SkillState(name=skill.name, damage=skill.damage) for skill in
-                                       monster.skills.all()]
-                           ) for monster in monsters
-                       ]
-        battle_state = BattleState(participants=participants, battle_log="")
+        # Команды из формы (id, метка, бюджет силы); без них - команды по умолчанию (load_participants)
+        try:
+            battle_id, battle_state = new_battle(request.session, spec_from_form(request.POST))
+        except TeamError as exc:
+            return render(request, 'Cards/start_game.html', {'message': str(exc)})
+        # Прежний бой страницы игры больше не нужен
+        if 'battle_id' in request.session:
+            old_battle_id = request.session.pop('battle_id')
+            forget_battle(request.session, old_battle_id)
+            get_battle_store().delete(old_battle_id)
 
         logger.debug(battle_state.to_dict())  # Использем наш логгер
-        # Сериализуем все данные
-        request.session['battle_state'] = battle_state.to_dict()
+        # В сессии храним только id боя, само состояние - в хранилище боёв
+        request.session['battle_id'] = battle_id
 
         return redirect('game_play')
     return render(request, 'Cards/start_game.html')
 
 
 def game_play(request):
-    if 'battle_state' not in request.session:
+    battle_id, battle_state = load_battle(request)
+    if battle_state is None:
         return redirect('start_game')
 
-    battle_state = BattleState.from_dict(request.session['battle_state'])
-
     if battle_state.is_battle_over():
-        del request.session['battle_state']
-        return render(request, 'Cards/game_play.html', {'battle': battle_state,
-                                                        'message': 'Игра окончена. Обновите страницу для новой игры.',
-                                                        'game_over': True})
-
-    current_participant = battle_state.get_active_participant()
+        get_battle_store().delete(battle_id)
+        forget_battle(request.session, battle_id)
+        del request.session['battle_id']
+        with phase('render'):
+            return render(request, 'Cards/game_play.html', {'battle': battle_state,
+                                                            'message': 'Игра окончена. Обновите страницу для новой игры.',
+                                                            'game_over': True})
 
-    if request.method == 'POST' and current_participant:
-        action = request.POST.get('action')
-        hero_id = request.POST.get('hero_id')
-        target_id = request.POST.get('target_id')
-        skill_index = request.POST.get('skill_index', None)
-
-        if current_participant.is_character_type == 'HERO' and current_participant.health > 0:
-            battle_state.process_hero_turn(hero_id, target_id, action, skill_index)
-            battle_state.handle_monster_turns()
-            request.session['battle_state'] = battle_state.to_dict()
-
-    # Начинаем новый раунд, если все персонажи сделали ход
-    if not battle_state.get_active_participant():
-        battle_state.start_new_round()
-        request.session['battle_state'] = battle_state.to_dict()
+    if request.method == 'POST':
+        act = hero_action(request.POST.get('hero_id'), request.POST.get('target_id'), request.POST.get('action'),
+                          request.POST.get('skill_index', None))
+        try:
+            # Повторный или устаревший ход (двойной клик) не пройдет проверку и просто покажет текущий бой
+            result = run_battle_action(battle_id, act)
+        except BattleConflict:
+            result = None
+        if result is not None:
+            battle_state = result[0]
 
     # Получаем участников для рендера
     participants = battle_state.participants
     current_participant = battle_state.get_active_participant()
 
-    return render(request, 'Cards/game_play.html',
-                  {'battle': battle_state, 'participants': participants,
-                   'current_participant': current_participant, 'game_over': False})
\ No newline at end of file
+    with phase('render'):
+        return render(request, 'Cards/game_play.html',
+                      {'battle': battle_state, 'participants': participants,
+                       'current_participant': current_participant, 'game_over': False})
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Cards.metrics.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,8 +60,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR,'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны кэшируются и при DEBUG; при правке шаблона runserver сбрасывает кэш сам
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -85,6 +92,65 @@ DATABASES = {
 }
 
 
+# Сессии в JSON, но BattleState внутри сессии кодируется компактным бинарным форматом (Cards/codec.py)
+
+SESSION_ENGINE = 'Cards.sessions'
+SESSION_SERIALIZER = 'Cards.codec.BattleSessionSerializer'
+
+# Замеры фаз запроса: заголовок Server-Timing и гистограммы Prometheus на /metrics/, см. Cards/metrics.py.
+# Выключенные замеры почти ничего не стоят: middleware не подключается
+
+METRICS = {
+    'ENABLED': os.environ.get('CARDS_METRICS', '1' if DEBUG else '0') == '1',
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+
+# Кэш снимка состава (см. Cards/roster.py). По умолчанию - в памяти процесса; при нескольких
+# процессах задайте ROSTER_CACHE_DIR, чтобы снимок и его версия были общими (файловый кэш)
+
+ROSTER_CACHE_DIR = os.environ.get('ROSTER_CACHE_DIR')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'roster': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': ROSTER_CACHE_DIR,
+    } if ROSTER_CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'roster',
+    },
+    # Отрисованные карты боя (см. card_list в Cards/templatetags/battle_tags.py)
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Хранилище состояний боёв (в сессии хранится только id боя), см. Cards/battle_store.py
+# LRU - кэш в памяти одного процесса и между воркерами не согласуется: значение ниже рассчитано на один
+# процесс (runserver, один воркер). При нескольких процессах-воркерах LRU_SIZE нужно выставить в 0
+
+BATTLE_STORE = {
+    'BACKEND': 'Cards.battle_store.SQLiteBattleStore',
+    'LOCATION': BASE_DIR / 'battles.sqlite3',
+    'LRU_SIZE': 1024,
+    'LRU_MAX_BYTES': 64 * 2 ** 20,
+    'IDLE_TIMEOUT': 600,
+    'TTL': 7 * 24 * 3600,
+}
+
+# Архив завершенных боёв (модели Battle и BattleParticipant): фоновая запись пачками, см. Cards/archive.py
+
+BATTLE_ARCHIVE = {
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 